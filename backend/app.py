@@ -1,17 +1,30 @@
-from flask import Flask, render_template, request, jsonify, send_from_directory, send_file
+import startup
+from flask import Flask, render_template, request, jsonify, send_from_directory, send_file, Response, url_for
 import os
 import uuid
-import logging
-import subprocess
 import shutil
-import browser_downloader  # Import the browser downloader
-
-# Set up logging
-logging.basicConfig(
-    filename='neobyte.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+import logging
+import driver_pool
+import http_client
+import extraction_cache
+import downloads
+import formats
+import transcode
+import router
+import jobs
+import workspace
+import artifact_store
+import media_cache
+import singleflight
+import bundles
+import metrics
+import request_log
+import ytdlp_profiles
+
+startup.mark('imports')
+
+# JSON lines written by a background thread, rotated by size
+request_log.configure()
 logger = logging.getLogger('neobyte')
 
 # Update paths for frontend/backend separation
@@ -20,11 +33,18 @@ app = Flask(__name__,
     static_folder=os.path.join(frontend_dir, 'static'),
     template_folder=os.path.join(frontend_dir, 'templates'))
 app.config['TITLE'] = 'NeoByte Downloader'
+# Time response bodies through to the last byte and count what was sent,
+# then log one summary line per request under its correlation ID
+app.wsgi_app = request_log.WSGIMiddleware(metrics.WSGIMiddleware(app.wsgi_app))
 
-# Path to ffmpeg from the YoutubeDownloaderApp folder
-FFMPEG_PATH = os.path.join(os.getcwd(), 'YoutubeDownloaderApp', 'ffmpeg.exe')
-if not os.path.exists(FFMPEG_PATH):
-    FFMPEG_PATH = 'ffmpeg'  # Use system ffmpeg if not found
+@app.before_request
+def tag_route():
+    """Label metrics with the route pattern rather than the raw path"""
+    request.environ['neobyte.route'] = request.url_rule.rule if request.url_rule else 'unmatched'
+
+def tag_platform(platform):
+    """Label the response's client_send stage with the platform the request downloads from"""
+    request.environ['neobyte.platform'] = platform
 
 @app.route('/')
 def index():
@@ -45,682 +65,469 @@ def twitter():
     logger.info("X download page accessed")
     return render_template('twitter.html')
 
-@app.route('/download', methods=['POST'])
-def download():
-    url = request.form.get('url')
-    download_type = request.form.get('download_type')
-    resolution = request.form.get('resolution')
+def send_artifact(artifact, work_dir, artifact_id, key=None, flight=None):
+    """Send a download, keeping it for resumed and ranged fetches during the grace period
     
-    if not url:
-        return jsonify({'error': 'Please enter a YouTube URL'}), 400
+    Also publishes the result to requests coalesced onto this one.
+    """
+    if isinstance(artifact, downloads.LiveArtifact):
+        return send_live_artifact(artifact, work_dir, artifact_id, key, flight)
     
-    # Create a temporary download directory that will be cleaned after each download
-    # This directory will only temporarily hold files during processing
-    temp_dir = os.path.join(os.getcwd(), 'downloads')
-    os.makedirs(temp_dir, exist_ok=True)
+    if artifact_store.GRACE_PERIOD > 0:
+        retained = artifact_store.store.keep(artifact_id, key, artifact.path, artifact.download_name, work_dir)
+        singleflight.group.resolve(key, flight, (artifact_id, None))
+        response = send_retained(retained)
+        # Add to the persistent cache once the client has its bytes
+        response.call_on_close(lambda: fill_media_cache(key, artifact.path, artifact.download_name))
+        return response
     
-    # Clean any existing files in the directory to prevent accumulation
-    for filename in os.listdir(temp_dir):
-        file_path = os.path.join(temp_dir, filename)
-        try:
-            if os.path.isfile(file_path):
-                os.unlink(file_path)
-        except Exception as e:
-            logger.error(f"Error cleaning temporary file {file_path}: {e}")
+    singleflight.group.resolve(key, flight, None)
+    response = send_file(
+        artifact.path,
+        as_attachment=True,
+        download_name=artifact.download_name,
+        conditional=False
+    )
     
-    # Generate a unique ID for this download
-    download_id = str(uuid.uuid4())
+    # Cache, then clean up the workspace once the cache no longer needs the file
+    def release():
+        workspace.release(work_dir)
+        logger.info(f"Removed workspace: {work_dir}")
+    response.call_on_close(lambda: fill_media_cache(key, artifact.path, artifact.download_name, then=release))
     
-    try:
-        # First try with browser downloader which bypasses bot detection
-        try:
-            logger.info(f"Attempting to download with browser downloader: {url}")
-            
-            is_audio = download_type == 'audio'
-            # Modified to use streaming download instead of temp files
-            stream, filename, error = browser_downloader.stream_with_quality(
-                url, 
-                resolution,
-                is_audio
-            )
-            
-            if stream and filename:
-                # Get original filename from the browser downloader
-                video_info = browser_downloader.get_video_info(url)
-                if video_info:
-                    title = video_info["title"]
-                    # Clean filename
-                    title = title.replace('/', '_').replace('\\', '_').replace(':', '_').replace('*', '_').replace('?', '_').replace('"', '_').replace('<', '_').replace('>', '_').replace('|', '_')
-                    original_filename = f"{title}.{'mp3' if is_audio else 'mp4'}"
-                else:
-                    original_filename = f"youtube_{download_id}.{'mp3' if is_audio else 'mp4'}"
-                
-                # Serve the file
-                response = send_file(
-                    file_path,
-                    as_attachment=True,
-                    download_name=original_filename,
-                    conditional=False
-                )
-                
-                # Clean up temp file immediately after sending
-                @response.call_on_close
-                def cleanup():
-                    try:
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
-                            logger.info(f"Removed temporary file: {file_path}")
-                    except Exception as e:
-                        logger.error(f"Error removing temporary file: {e}")
-                
-                logger.info(f"Successfully downloaded with browser downloader: {original_filename}")
-                return response
-            else:
-                logger.error(f"Browser downloader failed: {error}")
-                # Fall through to other methods
-        except Exception as browser_error:
-            logger.error(f"Browser downloader error: {str(browser_error)}")
-            # Fall through to other methods
+    return response
+
+def send_retained(retained):
+    """Serve a retained file with Range, ETag and If-Range support"""
+    response = send_file(
+        retained.path,
+        as_attachment=True,
+        download_name=retained.download_name,
+        conditional=True,
+        etag=True
+    )
+    # Clients resume or fetch ranges from this stable GET URL
+    response.headers['Content-Location'] = url_for('retained_file', artifact_id=retained.id)
+    return response
+
+def send_live_artifact(artifact, work_dir, artifact_id, key=None, flight=None):
+    """Relay a download that is still in progress, pacing the backend to the client"""
+    live = artifact.live
+    response = Response(live, mimetype=artifact.mimetype, direct_passthrough=True)
+    response.headers.set('Content-Disposition', 'attachment', filename=artifact.download_name)
+    if artifact.content_length:
+        response.headers['Content-Length'] = str(artifact.content_length)
+    
+    if artifact_store.GRACE_PERIOD > 0:
+        # Finish the download even if the client drops, so a resumed request is served from disk
+        live.cancel_on_close = False
+        artifact_store.store.keep(artifact_id, key, artifact.path, artifact.download_name, work_dir, ready=False)
+        response.headers['Content-Location'] = url_for('retained_file', artifact_id=artifact_id)
+        # Requests arriving while the file grows follow it instead of downloading again
+        singleflight.group.resolve(key, flight, (artifact_id, artifact), keep=True)
         
-        # If browser downloader failed, try with pytube
-        try:
-            from pytube import YouTube
-            import re
-            
-            # Fix for pytube age-restricted videos
-            def bypass_age_gate(url):
-                try:
-                    url = url.replace("watch?v=", "embed/")
-                    return url
-                except:
-                    return url
-                    
-            # Try to process with pytube
-            logger.info(f"Attempting to download with pytube: {url}")
-            
-            # Bypass age gate if needed
-            embed_url = bypass_age_gate(url)
-            
-            # Initialize pytube YouTube object
-            yt = YouTube(url)
-            
-            # Get video title for filename
-            video_title = yt.title
-            # Clean filename
-            video_title = re.sub(r'[\\/*?:"<>|]', "", video_title)
-            
-            # Determine file path
-            if download_type == 'audio':
-                # Audio download
-                output_file = os.path.join(temp_dir, f"{download_id}.mp3")
-                stream = yt.streams.filter(only_audio=True).first()
-                
-                # Download the file
-                file_path = stream.download(output_path=temp_dir, filename=f"{download_id}.mp4")
-                
-                # Convert to mp3 if ffmpeg is available
-                if os.path.exists(FFMPEG_PATH):
-                    try:
-                        subprocess.run([
-                            FFMPEG_PATH, '-i', file_path, 
-                            '-vn', '-ab', '192k', '-ar', '44100', '-y', 
-                            output_file
-                        ], check=True, capture_output=True)
-                        
-                        # Remove the original mp4 file
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
-                            
-                        filename = output_file
-                        original_filename = f"{video_title}.mp3"
-                    except Exception as e:
-                        logger.error(f"Error converting to MP3: {str(e)}")
-                        # If conversion fails, just use the mp4
-                        filename = file_path
-                        original_filename = f"{video_title}.mp4"
-                else:
-                    # No ffmpeg, just rename the file
-                    filename = file_path
-                    original_filename = f"{video_title}.mp4" 
+        def finalize():
+            singleflight.group.forget(key, flight)
+            if live.succeeded:
+                artifact_store.store.mark_ready(artifact_id, live.path)
+                fill_media_cache(key, live.path, artifact.download_name)
             else:
-                # Video download
-                if resolution == "highest":
-                    stream = yt.streams.get_highest_resolution()
-                elif resolution == "lowest":
-                    stream = yt.streams.filter(progressive=True).order_by('resolution').first()
-                elif resolution in ["2160p", "1440p", "1080p", "720p", "480p", "360p"]:
-                    # Extract the numeric value
-                    res_value = resolution[:-1]  # Remove 'p'
-                    # Find the closest matching resolution
-                    stream = yt.streams.filter(res=resolution, file_extension='mp4').first()
-                    if not stream:
-                        stream = yt.streams.get_highest_resolution()
-                else:
-                    stream = yt.streams.get_highest_resolution()
-                
-                # Download the file
-                filename = stream.download(output_path=temp_dir, filename=f"{download_id}.mp4")
-                original_filename = f"{video_title}.mp4"
-            
-            # Replace invalid characters in filename
-            original_filename = original_filename.replace('/', '_').replace('\\', '_').replace(':', '_').replace('*', '_').replace('?', '_').replace('"', '_').replace('<', '_').replace('>', '_').replace('|', '_')
-            
-            # Serve the file
-            response = send_file(
-                filename,
-                as_attachment=True,
-                download_name=original_filename,
-                conditional=False
-            )
-            
-            # Clean up temp file immediately after sending
-            @response.call_on_close
-            def cleanup():
-                try:
-                    if os.path.exists(filename):
-                        os.remove(filename)
-                        logger.info(f"Removed temporary file: {filename}")
-                except Exception as e:
-                    logger.error(f"Error removing temporary file: {e}")
-            
-            logger.info(f"Successfully downloaded with pytube: {original_filename}")
-            return response
-            
-        except Exception as pytube_error:
-            logger.error(f"Pytube download failed: {str(pytube_error)}")
-            logger.info("Falling back to yt-dlp with alternative options...")
-            
-            # Fallback to yt-dlp with special options to bypass bot detection
-            import yt_dlp
-            
-            # Configure yt-dlp options with bypass settings
-            output_template = os.path.join(temp_dir, f'{download_id}.%(ext)s')
-            
-            ydl_opts = {
-                'outtmpl': output_template,
-                'quiet': True,
-                'no_warnings': True,
-                'ffmpeg_location': FFMPEG_PATH,
-                # Try to bypass bot detection
-                'extractor_args': {
-                    'youtube': {
-                        'player_client': ['android', 'web'],
-                        'player_skip': ['js', 'configs', 'webpage']
-                    }
-                },
-                # Use a mobile user agent
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (Android 12; Mobile; rv:68.0) Gecko/68.0 Firefox/96.0',
-                    'Accept-Language': 'en-US,en;q=0.5'
-                }
-            }
-            
-            # Add format options
-            if download_type == 'audio':
-                ydl_opts.update({
-                    'format': 'bestaudio/best',
-                    'postprocessors': [{
-                        'key': 'FFmpegExtractAudio',
-                        'preferredcodec': 'mp3',
-                        'preferredquality': '192',
-                    }],
-                })
+                artifact_store.store.discard(artifact_id)
+        live.on_complete(finalize)
+    else:
+        singleflight.group.resolve(key, flight, None)
+        
+        # The workspace can only go once the backend has stopped writing into it
+        def finalize():
+            release = lambda: workspace.release(work_dir)
+            if live.succeeded:
+                fill_media_cache(key, live.path, artifact.download_name, then=release)
             else:
-                # Video download with resolution selection
-                if resolution == "highest":
-                    ydl_opts['format'] = 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best'
-                elif resolution == "lowest":
-                    ydl_opts['format'] = 'worstvideo[ext=mp4]+worstaudio[ext=m4a]/worst[ext=mp4]/worst'
-                elif resolution == "2160p":
-                    ydl_opts['format'] = 'bestvideo[height<=2160][ext=mp4]+bestaudio[ext=m4a]/best[height<=2160][ext=mp4]/best'
-                elif resolution == "1440p":
-                    ydl_opts['format'] = 'bestvideo[height<=1440][ext=mp4]+bestaudio[ext=m4a]/best[height<=1440][ext=mp4]/best'
-                elif resolution == "1080p":
-                    ydl_opts['format'] = 'bestvideo[height<=1080][ext=mp4]+bestaudio[ext=m4a]/best[height<=1080][ext=mp4]/best'
-                else:
-                    ydl_opts['format'] = f'bestvideo[height<={resolution[:-1]}][ext=mp4]+bestaudio[ext=m4a]/best[height<={resolution[:-1]}][ext=mp4]/best'
-            
-            # Extract and download
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # Get information and download the video
-                info = ydl.extract_info(url, download=True)
-                logger.info(f"Downloaded with yt-dlp to temporary location for immediate delivery to user")
-                
-                # Determine the output filename
-                if download_type == 'audio':
-                    filename = os.path.join(temp_dir, f"{download_id}.mp3")
-                else:
-                    filename = ydl.prepare_filename(info)
-                
-                # Ensure the file exists
-                if not os.path.exists(filename):
-                    # Try with different extension if needed
-                    possible_files = [os.path.join(temp_dir, f) for f in os.listdir(temp_dir) if f.startswith(download_id)]
-                    if possible_files:
-                        filename = possible_files[0]
-                    else:
-                        return jsonify({'error': 'Failed to download file'}), 500
-                
-                # Get original filename
-                original_filename = f"{info.get('title', 'video')}"
-                if download_type == 'audio':
-                    original_filename = f"{original_filename}.mp3"
-                else:
-                    original_filename = f"{original_filename}.mp4"
-                
-                # Replace invalid characters in filename
-                original_filename = original_filename.replace('/', '_').replace('\\', '_').replace(':', '_').replace('*', '_').replace('?', '_').replace('"', '_').replace('<', '_').replace('>', '_').replace('|', '_')
-                
-                # Serve the file directly to the user
-                response = send_file(
-                    filename,
-                    as_attachment=True,
-                    download_name=original_filename,
-                    conditional=False
-                )
-                
-                # Clean up temp file after sending (schedule deletion)
-                @response.call_on_close
-                def cleanup():
-                    try:
-                        if os.path.exists(filename):
-                            os.remove(filename)
-                    except:
-                        pass
-                
-                return response
-
-    except Exception as e:
-        error_message = f"Error downloading {url}: {str(e)}"
-        logger.error(error_message)
-        return jsonify({'error': error_message}), 500
+                release()
+        live.on_complete(finalize)
+    return response
 
-@app.route('/instagram_download', methods=['POST'])
-def instagram_download():
-    url = request.form.get('url')
+def serve_existing(key):
+    """Serve a recent or cached copy of the same media and format, if there is one"""
+    retained = artifact_store.store.lookup(key)
+    if retained:
+        logger.info(f"Serving retained download: {retained.download_name}")
+        return send_retained(retained)
     
-    if not url:
-        return jsonify({'error': 'Please enter an Instagram URL'}), 400
+    cached = media_cache.cache.get(media_cache.cache_key(key))
+    if cached:
+        logger.info(f"Serving cached download: {cached.download_name}")
+        return send_file(
+            cached.path,
+            as_attachment=True,
+            download_name=cached.download_name,
+            conditional=True,
+            etag=True
+        )
+    return None
+
+def deliver(key, run, coalesce=True):
+    """Serve key from disk if possible, otherwise run(work_dir, download_id) and send the result
     
-    # Check if the URL is from Instagram
-    if not ('instagram.com' in url or 'instagr.am' in url):
-        return jsonify({'error': 'Please enter a valid Instagram URL'}), 400
+    Concurrent requests with the same key wait for one leader instead of
+    repeating its scrape, download and transcode.
+    """
+    existing = serve_existing(key)
+    if existing:
+        return existing
     
-    # Create temp directory if it doesn't exist
-    temp_dir = os.path.join(os.getcwd(), 'temp')
-    os.makedirs(temp_dir, exist_ok=True)
+    flight, leader = singleflight.group.begin(key) if coalesce else (None, True)
+    if not leader:
+        return follow_flight(flight, key, run)
     
-    # Generate a unique ID for this download
+    # Generate a unique ID and a private scratch directory for this download
     download_id = str(uuid.uuid4())
+    work_dir = workspace.create(download_id)
     
     try:
-        # Try browser downloader first (more reliable for Instagram)
-        try:
-            logger.info(f"Attempting Instagram download with browser method: {url}")
-            
-            # Use browser downloader for Instagram content
-            file_path, error = browser_downloader.download_instagram_content(
-                url, 
-                temp_dir,
-                f"{download_id}.mp4"
-            )
-            
-            if file_path and os.path.exists(file_path):
-                # Get content info
-                content_info = browser_downloader.get_instagram_info(url)
-                if content_info and content_info.get('title'):
-                    title = content_info['title']
-                    # Clean filename
-                    title = title.replace('/', '_').replace('\\', '_').replace(':', '_').replace('*', '_').replace('?', '_').replace('"', '_').replace('<', '_').replace('>', '_').replace('|', '_')
-                    original_filename = f"{title}.mp4"
-                else:
-                    # Generate filename based on URL type
-                    if 'reel' in url.lower():
-                        original_filename = f"Instagram_Reel_{download_id[:8]}.mp4"
-                    elif 'stories' in url.lower():
-                        original_filename = f"Instagram_Story_{download_id[:8]}.mp4"
-                    else:
-                        original_filename = f"Instagram_Post_{download_id[:8]}.mp4"
-                
-                # Serve the file
-                response = send_file(
-                    file_path,
-                    as_attachment=True,
-                    download_name=original_filename,
-                    conditional=False
-                )
-                
-                # Clean up temp file after sending
-                @response.call_on_close
-                def cleanup():
-                    try:
-                        if os.path.exists(file_path):
-                            os.remove(file_path)
-                    except:
-                        pass
-                
-                logger.info(f"Successfully downloaded Instagram content: {original_filename}")
-                return response
-            
-        except Exception as browser_error:
-            logger.warning(f"Browser downloader failed: {str(browser_error)}")
-        
-        # Fallback to yt-dlp with enhanced options
-        import yt_dlp
-        
-        # Configure yt-dlp options for Instagram download with authentication support
-        output_template = os.path.join(temp_dir, f'{download_id}.%(ext)s')
-        
-        ydl_opts = {
-            'outtmpl': output_template,
-            'quiet': True,
-            'no_warnings': True,
-            'ffmpeg_location': FFMPEG_PATH,
-            'format': 'best[height<=1080]/best',  # Limit to 1080p to avoid issues
-            'extract_flat': False,
-            'ignoreerrors': True,
-            'no_check_certificate': True,
-            'user_agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'referer': 'https://www.instagram.com/',
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                'Accept-Language': 'en-us,en;q=0.5',
-                'Accept-Encoding': 'gzip,deflate',
-                'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.7',
-                'Keep-Alive': '300',
-                'Connection': 'keep-alive',
-            }
-        }
-        
-        # Extract info first to get metadata
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            logger.info(f"Downloading Instagram content from: {url}")
-            
-            try:
-                info = ydl.extract_info(url, download=True)
-            except yt_dlp.utils.ExtractorError as e:
-                if 'login' in str(e).lower() or 'private' in str(e).lower():
-                    return jsonify({
-                        'error': 'This Instagram content is private or requires login. Please try with a public post/reel.'
-                    }), 400
-                else:
-                    raise e
-            
-            if not info:
-                return jsonify({
-                    'error': 'Could not download content. The post may be private, deleted, or not accessible.'
-                }), 400
-            
-            # Determine the output filename
-            filename = ydl.prepare_filename(info)
-            
-            # Ensure the file exists
-            if not os.path.exists(filename):
-                # Try with different extension if needed
-                possible_files = [os.path.join(temp_dir, f) for f in os.listdir(temp_dir) if f.startswith(download_id)]
-                if possible_files:
-                    filename = possible_files[0]
-                else:
-                    return jsonify({'error': 'Failed to download file. Content may be protected or unavailable.'}), 500
-            
-            # Get original filename and content type
-            if 'title' in info and info['title']:
-                content_title = info['title']
-            else:
-                # Generate a title based on the type of content
-                if 'reel' in url.lower():
-                    content_title = f"Instagram_Reel_{download_id[:8]}"
-                elif 'stories' in url.lower():
-                    content_title = f"Instagram_Story_{download_id[:8]}"
-                else:
-                    content_title = f"Instagram_Post_{download_id[:8]}"
-            
-            # Get extension
-            _, ext = os.path.splitext(filename)
-            if not ext:
-                ext = '.mp4'  # Default to mp4 if no extension
-            
-            # Ensure proper extension
-            original_filename = f"{content_title}{ext}"
-            
-            # Replace invalid characters in filename
-            original_filename = original_filename.replace('/', '_').replace('\\', '_').replace(':', '_').replace('*', '_').replace('?', '_').replace('"', '_').replace('<', '_').replace('>', '_').replace('|', '_')
-            
-            # Serve the file directly to the user
-            response = send_file(
-                filename,
-                as_attachment=True,
-                download_name=original_filename,
-                conditional=False
-            )
-            
-            # Clean up temp file after sending
-            @response.call_on_close
-            def cleanup():
-                try:
-                    if os.path.exists(filename):
-                        os.remove(filename)
-                except:
-                    pass
-            
-            logger.info(f"Successfully downloaded Instagram content: {original_filename}")
-            return response
-            
+        artifact = run(work_dir, download_id)
+    except downloads.DownloadError as e:
+        workspace.release(work_dir)
+        singleflight.group.fail(key, flight, e)
+        return jsonify({'error': e.message}), e.status_code
     except Exception as e:
-        error_message = f"Error downloading Instagram content from {url}: {str(e)}"
-        logger.error(error_message)
-        
-        # Provide more specific error messages
-        if 'login' in str(e).lower():
-            return jsonify({
-                'error': 'This Instagram content requires authentication. Please try with a public post or reel.'
-            }), 400
-        elif 'private' in str(e).lower():
-            return jsonify({
-                'error': 'This Instagram account or post is private and cannot be downloaded.'
-            }), 400
-        elif 'not found' in str(e).lower():
-            return jsonify({
-                'error': 'Instagram content not found. The post may have been deleted or the URL is incorrect.'
-            }), 404
-        else:
-            return jsonify({
-                'error': 'Failed to download Instagram content. Please try again or check if the content is publicly accessible.'
-            }), 500
+        workspace.release(work_dir)
+        singleflight.group.fail(key, flight, downloads.DownloadError(str(e), 500))
+        raise
+    return send_artifact(artifact, work_dir, download_id, key, flight)
 
-@app.route('/twitter_download', methods=['POST'])
-def twitter_download():
+def follow_flight(flight, key, run):
+    """Serve a coalesced request from its leader's result"""
+    if not flight.wait():
+        logger.warning("Timed out waiting for identical download, fetching independently")
+        singleflight.group.record('fallback')
+        return deliver(key, run, coalesce=False)
+    
+    if flight.error is not None:
+        singleflight.group.record('failed')
+        return jsonify({'error': flight.error.message}), flight.error.status_code
+    
+    if flight.result:
+        artifact_id, live_artifact = flight.result
+        retained = artifact_store.store.get(artifact_id)
+        if retained and retained.ready:
+            singleflight.group.record('saved')
+            return send_retained(retained)
+        if retained and live_artifact:
+            # Tail the leader's file while it is still being written
+            singleflight.group.record('saved')
+            response = Response(live_artifact.live.follow(), mimetype=live_artifact.mimetype, direct_passthrough=True)
+            response.headers.set('Content-Disposition', 'attachment', filename=live_artifact.download_name)
+            if live_artifact.content_length:
+                response.headers['Content-Length'] = str(live_artifact.content_length)
+            return response
+    
+    # The leader's result could not be shared (relayed or already gone)
+    singleflight.group.record('fallback')
+    return deliver(key, run, coalesce=False)
+
+def fill_media_cache(key, path, download_name, then=None):
+    """Queue a finished download for the persistent cache; then() runs once the file is no longer needed"""
+    media_cache.cache.put_later(media_cache.cache_key(key), path, download_name, then=then)
+
+@app.route('/files/<artifact_id>', methods=['GET'])
+def retained_file(artifact_id):
+    """Serve a recently delivered file again, honouring Range and conditional headers"""
+    retained = artifact_store.store.get(artifact_id)
+    if not retained:
+        return jsonify({'error': 'This file is no longer available. Please download it again.'}), 404
+    if not retained.ready:
+        response = jsonify({'error': 'The file is still being downloaded'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+    return send_retained(retained)
+
+@app.route('/download', methods=['POST'])
+def download():
+    tag_platform('youtube')
     url = request.form.get('url')
+    download_type = request.form.get('download_type')
+    # '1080' and '1080p' (or a missing value and 'highest') share a label, so they share a stored result
+    resolution = formats.resolution_label(request.form.get('resolution'))
+    # Audio is served in its original container unless MP3 is asked for explicitly
+    audio_format = request.form.get('audio_format') or downloads.AUDIO_NATIVE
     
     if not url:
-        return jsonify({'error': 'Please enter an X (Twitter) URL'}), 400
+        return jsonify({'error': 'Please enter a YouTube URL'}), 400
+    if audio_format not in (downloads.AUDIO_NATIVE, downloads.AUDIO_MP3):
+        return jsonify({'error': f'Unsupported audio format: {audio_format}'}), 400
+    
+    if download_type == 'audio':
+        key = artifact_store.request_key('youtube', url, 'audio', audio_format)
+    else:
+        key = artifact_store.request_key('youtube', url, download_type or 'video', resolution)
+    
+    def run(work_dir, download_id):
+        # Browser relay first, then pytube and yt-dlp, streaming wherever possible
+        return downloads.download_youtube(url, download_type, resolution, work_dir, download_id, stream=True,
+                                          audio_format=audio_format)
     
-    # Normalize URL (handle both x.com and twitter.com)
-    if 'x.com' in url and 'twitter.com' not in url:
-        logger.info(f"Converting X URL to Twitter format: {url}")
-        url = url.replace('x.com', 'twitter.com')
+    return deliver(key, run)
+
+@app.route('/instagram_download', methods=['POST'])
+def instagram_download():
+    tag_platform('instagram')
+    url = request.form.get('url')
     
-    # Validate URL format
-    if not ('twitter.com' in url or 'x.com' in url):
-        return jsonify({'error': 'Please enter a valid X or Twitter post URL'}), 400
+    try:
+        downloads.validate_instagram_url(url)
+    except downloads.DownloadError as e:
+        return jsonify({'error': e.message}), e.status_code
     
-    # Create temp directory if it doesn't exist
-    temp_dir = os.path.join(os.getcwd(), 'temp')
-    os.makedirs(temp_dir, exist_ok=True)
+    key = artifact_store.request_key('instagram', url)
     
-    # Generate a unique ID for this download
-    download_id = str(uuid.uuid4())
+    def run(work_dir, download_id):
+        return downloads.download_instagram(url, work_dir, download_id, stream=True)
     
-    # Handle cookie file upload if provided
-    cookie_file = None
+    return deliver(key, run)
+
+def save_cookie_file(temp_dir, download_id):
+    """Save an uploaded cookies.txt, returning its path or None if none was sent"""
     if 'cookie_file' in request.files and request.files['cookie_file'].filename:
+        cookie_file = os.path.join(temp_dir, f'cookies_{download_id}.txt')
+        request.files['cookie_file'].save(cookie_file)
+        logger.info(f"Cookie file uploaded for download ID: {download_id}")
+        return cookie_file
+    return None
+
+def remove_cookie_file(cookie_file):
+    if cookie_file and os.path.exists(cookie_file):
+        try:
+            os.remove(cookie_file)
+        except:
+            pass
+
+@app.route('/twitter_download', methods=['POST'])
+def twitter_download():
+    tag_platform('twitter')
+    try:
+        url = downloads.normalize_twitter_url(request.form.get('url'))
+    except downloads.DownloadError as e:
+        return jsonify({'error': e.message}), e.status_code
+    
+    # Downloads made with a user's cookies are never shared with other requests
+    has_cookies = 'cookie_file' in request.files and request.files['cookie_file'].filename
+    key = None if has_cookies else artifact_store.request_key('twitter', url)
+    
+    def run(work_dir, download_id):
+        # Handle cookie file upload if provided
         try:
-            cookie_file = os.path.join(temp_dir, f'cookies_{download_id}.txt')
-            request.files['cookie_file'].save(cookie_file)
-            logger.info(f"Cookie file uploaded for download ID: {download_id}")
+            cookie_file = save_cookie_file(work_dir, download_id)
         except Exception as e:
             logger.error(f"Error saving cookie file: {str(e)}")
-            return jsonify({'error': 'Failed to process cookie file. Please try again.'}), 500
+            raise downloads.DownloadError('Failed to process cookie file. Please try again.', 500)
+        
+        try:
+            return downloads.download_twitter(url, work_dir, download_id, cookie_file, stream=True)
+        finally:
+            # The cookie file is only needed while yt-dlp starts up
+            remove_cookie_file(cookie_file)
+    
+    return deliver(key, run)
+
+@app.route('/zip_download', methods=['POST'])
+def zip_download():
+    """Stream a stored ZIP of a playlist, carousel or multi-video post, or of a list of URLs"""
+    urls = bundles.parse_urls(request.form)
+    
+    if not urls:
+        return jsonify({'error': 'Please enter at least one URL'}), 400
+    if len(urls) > bundles.MAX_ITEMS:
+        return jsonify({'error': f'A bundle can contain at most {bundles.MAX_ITEMS} URLs'}), 400
+    
+    bundle = bundles.Bundle(
+        urls,
+        request.form.get('download_type') or 'video',
+        request.form.get('resolution') or 'highest',
+        request.form.get('audio_format') or downloads.AUDIO_NATIVE
+    )
+    logger.info(f"Streaming ZIP bundle for {len(urls)} URL(s)")
+    response = Response(bundle, mimetype='application/zip', direct_passthrough=True)
+    response.headers.set('Content-Disposition', 'attachment', filename=f"neobyte-bundle-{uuid.uuid4().hex[:8]}.zip")
+    return response
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """Queue a download and return its job ID immediately"""
+    platform = request.form.get('platform', 'youtube')
+    url = request.form.get('url')
     
     try:
-        # Initialize yt-dlp for Twitter download
-        import yt_dlp
-        
-        # Configure yt-dlp options for Twitter download
-        output_template = os.path.join(temp_dir, f'{download_id}.%(ext)s')
-        
-        ydl_opts = {
-            'outtmpl': output_template,
-            'quiet': False,  # Enable some output for better debugging
-            'no_warnings': False,  # Show warnings for better debugging
-            'ffmpeg_location': FFMPEG_PATH,
-            'format': 'best',  # Get the best quality for Twitter
-            'cookiefile': cookie_file,  # Use cookie file if uploaded
-            'extract_flat': False,
-            'ignoreerrors': True,  # Skip any errors
-            'verbose': True  # Enable verbose output for debugging
-        }
-        
-        # Extract info first to get metadata
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            logger.info(f"Downloading X content from: {url}")
-            info = ydl.extract_info(url, download=True)
-            
-            if not info:
-                # Clean up cookie file
-                if cookie_file and os.path.exists(cookie_file):
-                    try:
-                        os.remove(cookie_file)
-                    except:
-                        pass
-                return jsonify({'error': 'Could not download content. The post may be private, not exist, or contain no media.'}), 400
-            
-            # Determine the output filename
-            filename = ydl.prepare_filename(info)
-            
-            # Ensure the file exists
-            if not os.path.exists(filename):
-                # Try with different extension if needed
-                possible_files = [os.path.join(temp_dir, f) for f in os.listdir(temp_dir) if f.startswith(download_id) and not f.startswith('cookies_')]
-                if possible_files:
-                    filename = possible_files[0]
-                else:
-                    # Clean up cookie file
-                    if cookie_file and os.path.exists(cookie_file):
-                        try:
-                            os.remove(cookie_file)
-                        except:
-                            pass
-                    return jsonify({'error': 'Failed to download file. The post may not contain downloadable media.'}), 500
-            
-            # Get original filename and content type
-            if 'title' in info and info['title']:
-                content_title = info['title']
-            else:
-                # Generate a title based on the account name if available
-                if 'uploader' in info and info['uploader']:
-                    content_title = f"X_Video_{info['uploader']}_{download_id[:6]}"
-                else:
-                    content_title = f"X_Video_{download_id[:8]}"
-            
-            # Get extension
-            _, ext = os.path.splitext(filename)
-            if not ext:
-                ext = '.mp4'  # Default to mp4 if no extension
-            
-            # Ensure proper extension
-            original_filename = f"{content_title}{ext}"
-            
-            # Replace invalid characters in filename
-            original_filename = original_filename.replace('/', '_').replace('\\', '_').replace(':', '_').replace('*', '_').replace('?', '_').replace('"', '_').replace('<', '_').replace('>', '_').replace('|', '_')
-            
-            # Log file information
-            file_size = os.path.getsize(filename)
-            logger.info(f"X content downloaded: {original_filename} ({file_size} bytes)")
-            
-            # Serve the file directly to the user
-            response = send_file(
-                filename,
-                as_attachment=True,
-                download_name=original_filename,
-                conditional=False
+        if platform == 'youtube':
+            if not url:
+                raise downloads.DownloadError('Please enter a YouTube URL', 400)
+            job = jobs.manager.submit(
+                platform, run_youtube_job, url,
+                request.form.get('download_type'), request.form.get('resolution'),
+                request.form.get('audio_format') or downloads.AUDIO_NATIVE
             )
-            
-            # Clean up temp files after sending (schedule deletion)
-            @response.call_on_close
-            def cleanup():
-                try:
-                    # Clean up downloaded file
-                    if os.path.exists(filename):
-                        os.remove(filename)
-                    
-                    # Clean up cookie file
-                    if cookie_file and os.path.exists(cookie_file):
-                        os.remove(cookie_file)
-                        
-                except Exception as e:
-                    logger.error(f"Error cleaning up temporary files: {str(e)}")
-            
-            logger.info(f"Successfully downloaded X content: {original_filename}")
-            return response
-            
-    except yt_dlp.utils.DownloadError as e:
-        error_message = str(e)
-        logger.error(f"yt-dlp download error for {url}: {error_message}")
-        
-        # Clean up cookie file if there was an error
-        if cookie_file and os.path.exists(cookie_file):
+        elif platform == 'instagram':
+            downloads.validate_instagram_url(url)
+            job = jobs.manager.submit(platform, run_instagram_job, url)
+        elif platform == 'twitter':
+            url = downloads.normalize_twitter_url(url)
+            # Keep the uploaded cookies in their own workspace until the worker is done with them
+            cookie_dir = workspace.create()
+            cookie_file = save_cookie_file(cookie_dir, str(uuid.uuid4()))
             try:
-                os.remove(cookie_file)
-            except:
-                pass
-        
-        # Handle common error cases with more user-friendly messages
-        if "Unsupported URL" in error_message:
-            return jsonify({'error': 'This URL is not supported or does not contain media content'}), 400
-        elif "requires authentication" in error_message:
-            return jsonify({'error': 'This content is private and requires authentication. Please try uploading a cookies.txt file from a browser where you are logged in.'}), 403
-        elif "not exist" in error_message or "404" in error_message:
-            return jsonify({'error': 'The requested content does not exist'}), 404
+                job = jobs.manager.submit(platform, run_twitter_job, url, cookie_dir, cookie_file)
+            except jobs.QueueFull:
+                workspace.release(cookie_dir)
+                raise
         else:
-            return jsonify({'error': f'Error downloading content: {error_message}'}), 500
+            return jsonify({'error': f'Unsupported platform: {platform}'}), 400
+    except downloads.DownloadError as e:
+        return jsonify({'error': e.message}), e.status_code
+    except jobs.QueueFull as e:
+        logger.warning(f"Rejected job submission: {str(e)}")
+        return jsonify({'error': 'The server is busy. Please try again shortly.'}), 503
+    
+    return jsonify({
+        'job_id': job.id,
+        'status': job.status,
+        'status_url': url_for('job_status', job_id=job.id),
+        'download_url': url_for('job_file', job_id=job.id)
+    }), 202
+
+def run_youtube_job(work_dir, job_id, url, download_type, resolution, audio_format):
+    return downloads.download_youtube(url, download_type, resolution, work_dir, job_id, audio_format=audio_format)
+
+def run_instagram_job(work_dir, job_id, url):
+    return downloads.download_instagram(url, work_dir, job_id)
+
+def run_twitter_job(work_dir, job_id, url, cookie_dir, cookie_file):
+    try:
+        return downloads.download_twitter(url, work_dir, job_id, cookie_file)
+    finally:
+        workspace.release(cookie_dir)
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    """Report the state of a submitted job"""
+    job = jobs.manager.get(job_id)
+    if not job:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/file', methods=['GET'])
+def job_file(job_id):
+    """Serve the artifact of a finished job"""
+    job = jobs.manager.get(job_id)
+    if not job:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    if job.status == jobs.FAILED:
+        return jsonify({'error': job.error}), job.status_code or 500
+    if job.status != jobs.FINISHED:
+        return jsonify({'error': 'Job is not finished yet', 'status': job.status}), 409
+    if not os.path.exists(job.artifact.path):
+        return jsonify({'error': 'The downloaded file is no longer available'}), 410
+    
+    # The artifact stays on disk until the job expires, so support resumed and ranged fetches
+    return send_file(
+        job.artifact.path,
+        as_attachment=True,
+        download_name=job.artifact.download_name,
+        conditional=True,
+        etag=True
+    )
+
+@app.route('/status', methods=['GET'])
+def status():
+    """Report every pool, cache and queue as JSON; the same numbers /metrics exports"""
+    return jsonify(metrics.collected_stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus metrics: stage histograms, counters, bytes and pool/cache gauges"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+for prefix, stats_fn in (
+    ('driver_pool', driver_pool.pool.stats),
+    ('http', http_client.stats),
+    ('router', router.router.stats),
+    ('transcode', transcode.pool.stats),
+    ('ytdlp', ytdlp_profiles.pool.stats),
+    ('extraction_cache', extraction_cache.cache.stats),
+    ('jobs', jobs.manager.stats),
+    ('artifacts', artifact_store.store.stats),
+    ('media_cache', media_cache.cache.stats),
+    ('singleflight', singleflight.group.stats),
+    ('workspace', workspace.stats),
+    ('startup', startup.stats),
+):
+    metrics.register_stats(prefix, stats_fn)
+
+def preload():
+    """Work every process can share, done once before serving (or before fork)"""
+    startup.preload()
+    try:
+        driver_pool.pool.driver_path()
     except Exception as e:
-        error_message = f"Error downloading X content from {url}: {str(e)}"
-        logger.error(error_message)
-        
-        # Clean up cookie file if there was an error
-        if cookie_file and os.path.exists(cookie_file):
-            try:
-                os.remove(cookie_file)
-            except:
-                pass
-                
-        return jsonify({'error': error_message}), 500
-
-@app.route('/cleanup', methods=['GET'])
-def cleanup_temp_files():
-    """Admin route to clean all temporary files"""
-    temp_dir = os.path.join(os.getcwd(), 'temp')
-    if os.path.exists(temp_dir):
-        cleaned = 0
-        for filename in os.listdir(temp_dir):
-            file_path = os.path.join(temp_dir, filename)
-            try:
-                if os.path.isfile(file_path):
-                    os.unlink(file_path)
-                    cleaned += 1
-            except Exception as e:
-                logger.error(f"Error cleaning file {file_path}: {e}")
-        return jsonify({'message': f'Cleaned {cleaned} temporary files'})
-    return jsonify({'message': 'No temporary directory found'})
+        logger.error(f"Error resolving chromedriver: {str(e)}")
+
+def prepare():
+    """One-time work before serving: load heavy backends and pre-launch browsers"""
+    preload()
+    # Sweep stale workspaces and enforce the disk quota in the background
+    workspace.start_janitor()
+    # Resolve chromedriver and pre-launch browsers before serving requests
+    try:
+        driver_pool.pool.warm()
+    except Exception as e:
+        logger.error(f"Error warming browser pool: {str(e)}")
+    startup.ready()
+
+def after_fork(workers):
+    """Per-worker setup under the preforking server, run in each worker right after fork
+
+    Workspace and media cache bookkeeping lives in process memory, so with
+    several workers each process locks a slot and gets its own directories
+    and share of the disk budgets. Browsers are launched here rather than
+    before fork, because a driver session cannot be shared between processes.
+    """
+    if workers > 1:
+        root = workspace.WORKSPACE_ROOT
+        slot = workspace.claim_slot(root)
+        # Slots past the worker count only exist while extra processes run; clear any left behind
+        for stale in workspace.unclaimed_slots(root, workers):
+            shutil.rmtree(os.path.join(root, f'worker-{stale}'), ignore_errors=True)
+            shutil.rmtree(os.path.join(media_cache.CACHE_DIR, f'worker-{stale}'), ignore_errors=True)
+        own_dir = os.path.join(root, f'worker-{slot}')
+        # Whatever the slot's previous owner left behind is no longer tracked by anyone
+        shutil.rmtree(own_dir, ignore_errors=True)
+        workspace.use_root(own_dir, workspace.QUOTA_BYTES // workers)
+        media_cache.cache.relocate(os.path.join(media_cache.CACHE_DIR, f'worker-{slot}'), media_cache.BUDGET_BYTES // workers)
+    workspace.start_janitor()
+    try:
+        driver_pool.pool.warm()
+    except Exception as e:
+        logger.error(f"Error warming browser pool: {str(e)}")
+    startup.ready()
+
+def shutdown():
+    """Release per-process resources when a worker exits"""
+    driver_pool.pool.close()
+    media_cache.cache.flush()
+
+def serve_development(host=None, port=None, debug=True):
+    """Flask's development server; startup work runs only in the process that serves
+
+    With debug on, the reloader's parent process only watches files and
+    restarts a child (WERKZEUG_RUN_MAIN=true) that handles requests, so
+    browsers are not launched twice.
+    """
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        prepare()
+        # Log application start
+        logger.info("NeoByte Downloader application started")
+    app.run(host=host, port=port, debug=debug)
+
+startup.mark('app')
 
 if __name__ == '__main__':
-    # Ensure temp directory exists
-    os.makedirs('temp', exist_ok=True)
-    
-    # Log application start
-    logger.info("NeoByte Downloader application started")
-    
-    # Run the app
-    app.run(debug=True)
\ No newline at end of file
+    serve_development()
@@ -0,0 +1,113 @@
+import os
+import time
+import logging
+import threading
+import media_ids
+import workspace
+
+logger = logging.getLogger('neobyte')
+
+# How long a delivered file stays available for resumed and ranged fetches
+GRACE_PERIOD = float(os.environ.get('NEOBYTE_ARTIFACT_GRACE_PERIOD', 600))
+
+
+class RetainedArtifact:
+    """A delivered file kept on disk so clients can resume or seek without a new download"""
+
+    def __init__(self, artifact_id, key, path, download_name, work_dir, ready=True):
+        self.id = artifact_id
+        self.key = key
+        self.path = path
+        self.download_name = download_name
+        self.work_dir = work_dir
+        self.ready = ready
+        self.expires_at = time.time() + GRACE_PERIOD
+
+    def touch(self):
+        self.expires_at = time.time() + GRACE_PERIOD
+
+
+def request_key(platform, url, *params):
+    """Key identifying the same media in the same format, or None if it cannot be shared"""
+    media_id = media_ids.canonical_media_id(url)
+    if media_id is None:
+        return None
+    return (platform, media_id) + tuple(params)
+
+
+class ArtifactStore:
+    """Registry of delivered files that are kept for a grace period"""
+
+    def __init__(self):
+        self._by_id = {}
+        self._by_key = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def keep(self, artifact_id, key, path, download_name, work_dir, ready=True):
+        """Retain a file; its workspace is released when the grace period runs out"""
+        retained = RetainedArtifact(artifact_id, key, path, download_name, work_dir, ready)
+        with self._lock:
+            self._by_id[artifact_id] = retained
+            if key is not None:
+                self._by_key[key] = artifact_id
+        return retained
+
+    def mark_ready(self, artifact_id, path=None):
+        with self._lock:
+            retained = self._by_id.get(artifact_id)
+            if retained:
+                if path:
+                    retained.path = path
+                retained.ready = True
+                retained.touch()
+
+    def get(self, artifact_id):
+        with self._lock:
+            retained = self._by_id.get(artifact_id)
+            if retained and retained.expires_at > time.time() and os.path.exists(retained.path):
+                retained.touch()
+                return retained
+        return None
+
+    def lookup(self, key):
+        """Find a ready artifact for the same media and format"""
+        if key is None:
+            return None
+        with self._lock:
+            artifact_id = self._by_key.get(key)
+        retained = self.get(artifact_id) if artifact_id else None
+        if retained and retained.ready:
+            with self._lock:
+                self.hits += 1
+            return retained
+        return None
+
+    def discard(self, artifact_id):
+        with self._lock:
+            retained = self._by_id.pop(artifact_id, None)
+            if retained and retained.key is not None and self._by_key.get(retained.key) == artifact_id:
+                del self._by_key[retained.key]
+        if retained:
+            workspace.release(retained.work_dir)
+
+    def prune(self):
+        """Release artifacts whose grace period has passed"""
+        now = time.time()
+        with self._lock:
+            # Files still being written are released by their own completion callback
+            expired = [r.id for r in self._by_id.values() if r.ready and r.expires_at <= now]
+        for artifact_id in expired:
+            self.discard(artifact_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "retained": len(self._by_id),
+                "hits": self.hits,
+                "grace_period": GRACE_PERIOD,
+            }
+
+
+store = ArtifactStore()
+workspace.register_hook(store.prune)
@@ -4,39 +4,58 @@ import logging
 import re
 import subprocess
 import json
-import requests
-from urllib.parse import urlparse, parse_qs
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
+from html import unescape
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import driver_pool
+import media_ids
+import extraction_cache
+import formats
+import segmented_download
+import http_client
+import metrics
+import cancellation
+import transcode
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("browser_downloader")
 
+# Audio containers that can be delivered as scraped, without re-encoding
+NATIVE_AUDIO_EXTENSIONS = ["m4a", "webm", "opus", "ogg"]
+
+# Relay upstream media in large chunks to keep per-chunk overhead low
+STREAM_CHUNK_SIZE = int(os.environ.get('NEOBYTE_STREAM_CHUNK_SIZE', 256 * 1024))
+
+# How long to wait for an Instagram page to request its media before giving up
+INSTAGRAM_CAPTURE_TIMEOUT = float(os.environ.get('NEOBYTE_INSTAGRAM_CAPTURE_TIMEOUT', 15))
+CAPTURE_POLL_INTERVAL = 0.1
+# Plain page fetches look like the pooled browsers so Instagram serves the same markup
+INSTAGRAM_PAGE_HEADERS = {
+    "User-Agent": driver_pool.USER_AGENT,
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
 def get_video_id(url):
     """Extract YouTube video ID from URL"""
-    if "youtu.be" in url:
-        return url.split("/")[-1].split("?")[0]
-    
-    parsed_url = urlparse(url)
-    if parsed_url.netloc in ['www.youtube.com', 'youtube.com']:
-        if parsed_url.path == '/watch':
-            return parse_qs(parsed_url.query)['v'][0]
-        elif parsed_url.path.startswith('/embed/'):
-            return parsed_url.path.split('/')[-1]
-        elif parsed_url.path.startswith('/v/'):
-            return parsed_url.path.split('/')[-1]
-    
-    # Handle shortened URLs like youtu.be
-    if parsed_url.netloc == 'youtu.be':
-        return parsed_url.path[1:]
+    return media_ids.youtube_id(url)
+
+def _video_info_key(url):
+    return (f"youtube:{get_video_id(url)}", "9xbuddy")
+
+def _with_fresh_links(fetch, *cache_keys):
+    """Run fetch(), extracting again once if a cached media URL is refused (403/404/410)
     
-    return None
+    Scraped links carry no expiry and may be bound to the client that found
+    them, so the cache's TTL alone cannot tell when they go bad.
+    """
+    try:
+        return fetch()
+    except Exception as e:
+        if not extraction_cache.is_stale_url_error(e):
+            raise
+        logger.info(f"Media URL refused with {e.response.status_code}, extracting again")
+        for key in cache_keys:
+            extraction_cache.cache.invalidate(key)
+        return fetch()
 
 def get_video_info(url):
     """Get video title and available formats without downloading"""
@@ -44,28 +63,27 @@ def get_video_info(url):
     if not video_id:
         return None
     
+    cache_key = _video_info_key(url)
+    cached = extraction_cache.cache.get(cache_key)
+    if cached:
+        logger.info(f"Extraction cache hit for {video_id}")
+        return cached
+    
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    
     try:
-        # Use a headless browser to get the video title
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-extensions")
-        chrome_options.add_argument("--disable-infobars")
-        chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36")
-        
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        
-        try:
-            # Visit 9xbuddy which doesn't have bot detection
-            driver.get(f"https://9xbuddy.xyz/process?url=https://www.youtube.com/watch?v={video_id}")
-            
-            # Wait for the title to be loaded
-            WebDriverWait(driver, 30).until(
-                EC.presence_of_element_located((By.CSS_SELECTOR, ".media-info-title"))
-            )
+        # Use a pooled headless browser to get the video title
+        with metrics.stage('extraction'), driver_pool.session() as driver:
+            with metrics.stage('page_load'):
+                # Visit 9xbuddy which doesn't have bot detection
+                driver.get(f"https://9xbuddy.xyz/process?url=https://www.youtube.com/watch?v={video_id}")
+                
+                # Wait for the title to be loaded
+                WebDriverWait(driver, 30).until(
+                    EC.presence_of_element_located((By.CSS_SELECTOR, ".media-info-title"))
+                )
             
             # Get video title
             title_element = driver.find_element(By.CSS_SELECTOR, ".media-info-title")
@@ -79,7 +97,7 @@ def get_video_info(url):
             # Get all download options
             download_items = driver.find_elements(By.CSS_SELECTOR, ".download-item")
             
-            formats = []
+            available = []
             download_links = {}
             
             for item in download_items:
@@ -94,7 +112,7 @@ def get_video_info(url):
                     
                     if download_url and "http" in download_url:
                         format_key = f"{quality}_{format_type}"
-                        formats.append({
+                        available.append({
                             "quality": quality,
                             "format": format_type,
                             "size": size,
@@ -104,22 +122,35 @@ def get_video_info(url):
                 except:
                     continue
             
-            return {
+            video_info = {
                 "title": title,
                 "video_id": video_id,
-                "formats": formats,
-                "download_links": download_links
+                "formats": available,
+                "download_links": download_links,
+                # Fetch the links as the browser that found them
+                "headers": http_client.browser_headers(driver)
             }
-        finally:
-            driver.quit()
+            if available:
+                extraction_cache.cache.put(cache_key, video_info, urls=download_links.values())
+            return video_info
     
     except Exception as e:
         logger.error(f"Error getting video info: {str(e)}")
         return None
 
-def download_video(url, format_key, output_dir, output_filename=None):
+def get_output_filename(title, format_key):
+    """Build a safe output filename from a video title and format key"""
+    # Clean title to create a safe filename
+    title = re.sub(r'[\\/*?:"<>|]', "", title)
+    # Determine extension
+    format_parts = format_key.split('_')
+    ext = format_parts[1].lower() if format_parts[1].lower() in NATIVE_AUDIO_EXTENSIONS + ["mp4", "mp3"] else "mp4"
+    return f"{title}.{ext}"
+
+def download_video(url, format_key, output_dir, output_filename=None, video_info=None):
     """Download a YouTube video using browser automation"""
-    video_info = get_video_info(url)
+    if video_info is None:
+        video_info = get_video_info(url)
     
     if not video_info or format_key not in video_info["download_links"]:
         return None, "Failed to get video information or format not available"
@@ -127,181 +158,354 @@ def download_video(url, format_key, output_dir, output_filename=None):
     download_url = video_info["download_links"][format_key]
     
     if not output_filename:
-        # Clean title to create a safe filename
-        title = re.sub(r'[\\/*?:"<>|]', "", video_info["title"])
-        # Determine extension
-        format_parts = format_key.split('_')
-        ext = "mp4" if format_parts[1] in ["MP4", "mp4"] else "mp3" if format_parts[1] in ["MP3", "mp3"] else "mp4"
-        output_filename = f"{title}.{ext}"
+        output_filename = get_output_filename(video_info["title"], format_key)
     
     output_path = os.path.join(output_dir, output_filename)
     
     try:
         logger.info(f"Downloading from URL: {download_url}")
         
-        # Download the file using requests
-        response = requests.get(download_url, stream=True)
-        response.raise_for_status()
-        
-        # Get total file size if available
-        total_size = int(response.headers.get('content-length', 0))
-        
-        # Download the file
-        with open(output_path, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+        # Download the file over parallel ranged connections where supported
+        segmented_download.download(download_url, output_path, headers=video_info.get("headers"))
         
         return output_path, None
     
     except Exception as e:
+        if extraction_cache.is_stale_url_error(e):
+            # Left to the caller, which can extract fresh links
+            raise
         logger.error(f"Error downloading video: {str(e)}")
         return None, str(e)
 
-def download_with_quality(url, quality, is_audio, output_dir, filename=None):
+def select_format(scraped, quality, is_audio, native_audio=False):
+    """Pick the scraped format that best matches the requested quality"""
+    target_format = None
+    
+    if is_audio and native_audio:
+        # Prefer the original audio track over an MP3 conversion; entries with a height are video
+        native = [
+            fmt for fmt in scraped
+            if fmt["format"].lower() in NATIVE_AUDIO_EXTENSIONS
+            and not formats.target_height(fmt.get("quality", "").split(' ')[0])
+        ]
+        native.sort(key=lambda fmt: fmt["format"].lower() != "m4a")
+        if native:
+            target_format = native[0]
+    
+    if is_audio and not target_format:
+        # Try to find an MP3 format
+        for fmt in scraped:
+            if "MP3" in fmt["format"] or "mp3" in fmt["format"]:
+                target_format = fmt
+                break
+        
+        # If no MP3, try to find an audio format
+        if not target_format:
+            for fmt in scraped:
+                if "audio" in fmt["format"].lower():
+                    target_format = fmt
+                    break
+    elif not is_audio:
+        # Same ranking as the other backends: the cheapest format at the best height the request allows
+        chosen = formats.choose(formats.scraped_candidates(scraped), quality)
+        target_format = chosen.source if chosen else None
+    
+    return target_format
+
+def download_with_quality(url, quality, is_audio, output_dir, filename=None, native_audio=False):
     """Download video with specified quality or audio"""
-    try:
+    def fetch():
         # Get video info
         video_info = get_video_info(url)
         if not video_info:
             return None, "Failed to get video information"
         
         # Determine the format to download
-        formats = video_info["formats"]
-        target_format = None
-        
-        if is_audio:
-            # Try to find an MP3 format
-            for fmt in formats:
-                if "MP3" in fmt["format"] or "mp3" in fmt["format"]:
-                    target_format = fmt
-                    break
-            
-            # If no MP3, try to find an audio format
-            if not target_format:
-                for fmt in formats:
-                    if "audio" in fmt["format"].lower():
-                        target_format = fmt
-                        break
-        else:
-            # For video, find the closest matching quality
-            quality_map = {
-                "highest": 1080,  # Default for highest
-                "1080p": 1080,
-                "720p": 720,
-                "480p": 480,
-                "360p": 360,
-                "lowest": 144    # Default for lowest
-            }
-            
-            target_quality = quality_map.get(quality, 720)  # Default to 720p if not recognized
-            
-            # Find available video qualities
-            quality_options = {}
-            for fmt in formats:
-                if "MP4" in fmt["format"] or "mp4" in fmt["format"]:
-                    # Extract numeric quality if available
-                    quality_str = fmt["quality"]
-                    if "p" in quality_str:
-                        try:
-                            q_value = int(quality_str.split("p")[0])
-                            quality_options[q_value] = fmt
-                        except:
-                            pass
-            
-            # Find the closest matching quality
-            if quality == "highest" and quality_options:
-                target_quality = max(quality_options.keys())
-            elif quality == "lowest" and quality_options:
-                target_quality = min(quality_options.keys())
-            
-            available_qualities = sorted(quality_options.keys())
-            
-            if available_qualities:
-                # Find the closest quality that doesn't exceed the target
-                suitable_qualities = [q for q in available_qualities if q <= target_quality]
-                if suitable_qualities:
-                    closest_quality = max(suitable_qualities)
-                else:
-                    closest_quality = min(available_qualities)
-                
-                target_format = quality_options[closest_quality]
+        target_format = select_format(video_info["formats"], quality, is_audio, native_audio)
         
         # If we found a suitable format, download it
         if target_format:
-            return download_video(url, target_format["key"], output_dir, filename)
+            return download_video(url, target_format["key"], output_dir, filename, video_info=video_info)
         else:
             return None, "No suitable format found for the requested quality"
     
+    try:
+        return _with_fresh_links(fetch, _video_info_key(url))
+    
     except Exception as e:
         logger.error(f"Error in download_with_quality: {str(e)}")
         return None, str(e)
 
-def download_instagram_content(url, output_dir, filename):
-    """Download Instagram content using browser automation"""
-    try:
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        chrome_options.add_argument("--disable-gpu")
-        chrome_options.add_argument("--window-size=1920,1080")
-        chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
+class MediaStream:
+    """Iterable relay of an upstream media response, closed when the client disconnects"""
+    
+    def __init__(self, response, title, chunk_size=STREAM_CHUNK_SIZE):
+        self.response = response
+        self.title = title
+        self.chunk_size = chunk_size
+        self.content_type = response.headers.get('content-type', 'application/octet-stream')
+        content_length = response.headers.get('content-length')
+        self.content_length = int(content_length) if content_length and content_length.isdigit() else None
+    
+    def __iter__(self):
+        try:
+            for chunk in self.response.iter_content(chunk_size=self.chunk_size):
+                if chunk:
+                    metrics.add_bytes('upstream', len(chunk))
+                    yield chunk
+        finally:
+            self.close()
+    
+    def close(self):
+        self.response.close()
+
+def stream_with_quality(url, quality, is_audio, native_audio=False):
+    """Scrape once and open the selected format as a stream
+    
+    Returns (stream, filename, error) where stream is a MediaStream carrying the
+    title from the same scrape.
+    """
+    def fetch():
+        video_info = get_video_info(url)
+        if not video_info:
+            return None, None, "Failed to get video information"
         
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
+        target_format = select_format(video_info["formats"], quality, is_audio, native_audio)
+        if not target_format:
+            return None, None, "No suitable format found for the requested quality"
         
+        download_url = video_info["download_links"][target_format["key"]]
+        logger.info(f"Streaming from URL: {download_url}")
+        
+        response = http_client.session.get(download_url, headers=video_info.get("headers"), stream=True)
+        try:
+            response.raise_for_status()
+        except Exception:
+            response.close()
+            raise
+        
+        filename = get_output_filename(video_info["title"], target_format["key"])
+        return MediaStream(response, video_info["title"]), filename, None
+    
+    try:
+        return _with_fresh_links(fetch, _video_info_key(url))
+    
+    except Exception as e:
+        logger.error(f"Error in stream_with_quality: {str(e)}")
+        return None, None, str(e)
+
+def _is_byte_range(url):
+    query = dict(parse_qsl(urlsplit(url).query))
+    return "bytestart" in query or "byteend" in query
+
+def _instagram_media_responses(entries, found):
+    """Collect media responses from a batch of Chrome performance log entries into found
+
+    Byte-range requests are the web player's DASH tracks: the video track has
+    no audio, so it is kept under "video" and is only usable with the "audio"
+    track. A plain video response is a complete file ("progressive").
+    """
+    for entry in entries:
         try:
+            message = json.loads(entry["message"])["message"]
+        except (KeyError, ValueError):
+            continue
+        if message.get("method") != "Network.responseReceived":
+            continue
+        response = message["params"]["response"]
+        url = response.get("url", "")
+        mime_type = response.get("mimeType", "")
+        if not url.startswith("http"):
+            continue
+        if mime_type.startswith("audio/"):
+            found.setdefault("audio", full_media_url(url))
+        elif mime_type.startswith("video/"):
+            found.setdefault("video" if _is_byte_range(url) else "progressive", full_media_url(url))
+    return found
+
+def full_media_url(url):
+    """Drop the byte range the player asked for so the whole file is fetched"""
+    parts = urlsplit(url)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k not in ("bytestart", "byteend")]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+def _instagram_page_state(driver):
+    """Media URL and title as far as the page has them right now"""
+    return driver.execute_script("""
+        var meta = function (name) {
+            var el = document.querySelector('meta[property="' + name + '"]');
+            return el ? el.getAttribute('content') : null;
+        };
+        var video = document.querySelector('video');
+        var src = video ? (video.currentSrc || video.src) : null;
+        return {
+            // blob: sources come from MediaSource and cannot be fetched
+            media_url: meta('og:video') || (src && src.indexOf('http') === 0 ? src : null),
+            title: meta('og:title') || document.title
+        };
+    """)
+
+def capture_instagram(url, timeout=INSTAGRAM_CAPTURE_TIMEOUT):
+    """Load an Instagram post once and take its media URL from the first video response
+
+    Watches Chrome's network log instead of sleeping, so the call returns as
+    soon as the player requests media (or og:video is in the page).
+    """
+    media_id = media_ids.canonical_media_id(url)
+    cache_key = (media_id, "capture")
+    if media_id:
+        cached = extraction_cache.cache.get(cache_key)
+        if cached:
+            return cached
+    
+    with metrics.stage('extraction'), driver_pool.session() as driver:
+        # Drop events left over from before this checkout
+        driver.get_log("performance")
+        with metrics.stage('page_load'):
             driver.get(url)
-            time.sleep(3)
-            
-            # Look for video elements
-            video_elements = driver.find_elements(By.TAG_NAME, "video")
-            
-            if video_elements:
-                video_url = video_elements[0].get_attribute("src")
-                if video_url:
-                    # Download the video
-                    response = requests.get(video_url, stream=True)
-                    if response.status_code == 200:
-                        output_path = os.path.join(output_dir, filename)
-                        with open(output_path, 'wb') as f:
-                            for chunk in response.iter_content(chunk_size=8192):
-                                f.write(chunk)
-                        return output_path, None
-            
-            return None, "No video content found"
-            
-        finally:
-            driver.quit()
+        
+        deadline = time.monotonic() + timeout
+        found = {}
+        while True:
+            # og:video (or a plain <video> src) is a complete file, so it wins over anything in the network log
+            state = _instagram_page_state(driver) or {}
+            _instagram_media_responses(driver.get_log("performance"), found)
+            media_url = state.get("media_url") or found.get("progressive")
+            audio_url = None
+            if not media_url and "video" in found and "audio" in found and transcode.available():
+                # DASH tracks are muxed after download
+                media_url, audio_url = found["video"], found["audio"]
+            if media_url or time.monotonic() >= deadline:
+                break
+            cancellation.check()
+            time.sleep(CAPTURE_POLL_INTERVAL)
+        
+        if not media_url:
+            if "video" in found:
+                logger.info(f"Only separate DASH tracks for {url} and no way to mux them; skipping the browser capture")
+            else:
+                logger.info(f"No Instagram media response within {timeout:.0f}s for {url}")
+            return None
+        
+        info = {
+            "media_url": media_url,
+            "audio_url": audio_url,
+            "title": clean_instagram_title(state.get("title")),
+            "headers": http_client.browser_headers(driver),
+        }
+    if media_id:
+        extraction_cache.cache.put(cache_key, info, urls=[u for u in (media_url, audio_url) if u])
+    return info
+
+def _meta_tags(html):
+    """content of every <meta property=...> / <meta name=...> tag, first occurrence wins"""
+    tags = {}
+    for tag in re.findall(r"<meta\b[^>]*>", html, re.IGNORECASE):
+        attrs = {k.lower(): unescape(v) for k, v in re.findall(r'([\w:-]+)\s*=\s*"([^"]*)"', tag)}
+        key = attrs.get("property") or attrs.get("name")
+        if key and "content" in attrs:
+            tags.setdefault(key.lower(), attrs["content"])
+    return tags
+
+def _embedded_video_url(html):
+    """Video URL from the post JSON Instagram embeds in its script tags"""
+    for pattern in (r'"video_versions"\s*:\s*\[\s*\{[^\]]*?"url"\s*:\s*"((?:[^"\\]|\\.)*)"',
+                    r'"video_url"\s*:\s*"((?:[^"\\]|\\.)*)"'):
+        match = re.search(pattern, html)
+        if match:
+            try:
+                return json.loads(f'"{match.group(1)}"')
+            except ValueError:
+                continue
+    return None
+
+def _html_title(html):
+    match = re.search(r"<title[^>]*>(.*?)</title>", html, re.IGNORECASE | re.DOTALL)
+    return unescape(match.group(1)).strip() if match else None
+
+def clean_instagram_title(title):
+    title = (title or "").replace(" • Instagram", "").strip()
+    return title or None
+
+def extract_instagram_http(url):
+    """Media URL and title from the page's OpenGraph tags or embedded JSON, without a browser
+
+    Returns None when the page has neither (login wall, private post, or a
+    markup change), so the caller can escalate to the browser.
+    """
+    media_id = media_ids.canonical_media_id(url)
+    cache_key = (media_id, "http")
+    if media_id:
+        cached = extraction_cache.cache.get(cache_key)
+        if cached:
+            return cached
+    
+    headers = dict(INSTAGRAM_PAGE_HEADERS, Referer="https://www.instagram.com/")
+    with metrics.stage('extraction'):
+        response = http_client.session.get(url, headers=headers)
+    if response.status_code != 200:
+        logger.info(f"Instagram page returned {response.status_code} for {url}")
+        return None
+    
+    if "charset" not in response.headers.get("Content-Type", ""):
+        # requests assumes Latin-1 without a charset; Instagram pages are UTF-8
+        response.encoding = "utf-8"
+    html = response.text
+    tags = _meta_tags(html)
+    media_url = tags.get("og:video:secure_url") or tags.get("og:video") or _embedded_video_url(html)
+    if not media_url or not media_url.startswith("http"):
+        return None
+    
+    info = {
+        "media_url": media_url,
+        "title": clean_instagram_title(tags.get("og:title") or _html_title(html)),
+        "headers": {"User-Agent": INSTAGRAM_PAGE_HEADERS["User-Agent"], "Referer": response.url},
+    }
+    if media_id:
+        extraction_cache.cache.put(cache_key, info, urls=[media_url])
+    return info
+
+def _download_dash_tracks(info, output_path):
+    """Fetch separate video and audio tracks and mux them into output_path without re-encoding"""
+    video_path = f"{output_path}.video"
+    audio_path = f"{output_path}.audio"
+    try:
+        segmented_download.download(info["media_url"], video_path, headers=info["headers"])
+        segmented_download.download(info["audio_url"], audio_path, headers=info["headers"])
+        transcode.pool.run(video_path, output_path, transcode.mux_args(audio_path))
+    finally:
+        for path in (video_path, audio_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+def download_instagram_content(url, output_dir, filename, extract=capture_instagram):
+    """Download Instagram content found by extract (browser capture by default); returns (path, title, error)"""
+    output_path = os.path.join(output_dir, filename)
+    
+    def fetch():
+        info = extract(url)
+        if not info:
+            return None, None, "No video content found"
+        
+        if info.get("audio_url"):
+            _download_dash_tracks(info, output_path)
+        else:
+            segmented_download.download(info["media_url"], output_path, headers=info["headers"])
+        return output_path, info["title"], None
+    
+    try:
+        media_id = media_ids.canonical_media_id(url)
+        return _with_fresh_links(fetch, (media_id, "capture"), (media_id, "http"))
             
     except Exception as e:
-        return None, str(e)
+        return None, None, str(e)
 
 def get_instagram_info(url):
     """Get Instagram content information"""
     try:
-        chrome_options = Options()
-        chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage")
-        
-        service = Service(ChromeDriverManager().install())
-        driver = webdriver.Chrome(service=service, options=chrome_options)
-        
-        try:
-            driver.get(url)
-            time.sleep(2)
-            
-            # Try to get title from meta tags
-            title_element = driver.find_element(By.TAG_NAME, "title")
-            title = title_element.get_attribute("textContent") if title_element else "Instagram Content"
-            
-            return {"title": title.replace(" • Instagram", "").strip()}
-            
-        finally:
-            driver.quit()
+        info = capture_instagram(url)
+        return {"title": info["title"] or "Instagram Content"} if info else None
             
     except Exception as e:
         logger.error(f"Error getting Instagram info: {str(e)}")
-        return None
\ No newline at end of file
+        return None
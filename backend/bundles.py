@@ -0,0 +1,232 @@
+import os
+import json
+import queue
+import logging
+import zipfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import downloads
+import formats
+import media_ids
+import transcode
+import workspace
+import ytdlp_profiles
+
+logger = logging.getLogger('neobyte')
+
+# Parallel downloads per bundle when a list of URLs is given
+WORKERS = int(os.environ.get('NEOBYTE_BUNDLE_WORKERS', 3))
+MAX_ITEMS = int(os.environ.get('NEOBYTE_BUNDLE_MAX_ITEMS', 200))
+CHUNK_SIZE = 256 * 1024
+MANIFEST_NAME = 'manifest.json'
+
+_DONE = object()
+
+
+class _Sink:
+    """Write-only, unseekable file that ZipFile writes into and the response drains"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class _ManifestLogger:
+    """yt-dlp logger that records per-item failures instead of aborting the playlist"""
+
+    def __init__(self, source, results):
+        self.source = source
+        self.results = results
+
+    def debug(self, msg):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def warning(self, msg):
+        logger.warning(f"Bundle item warning: {msg}")
+
+    def error(self, msg):
+        self.results.put(('error', self.source, msg))
+
+
+def parse_urls(form):
+    """Collect URLs from repeated urls fields or a newline separated list"""
+    urls = []
+    for value in form.getlist('urls') + form.getlist('url'):
+        urls.extend(line.strip() for line in value.splitlines() if line.strip())
+    return urls
+
+
+class Bundle:
+    """Downloads a set of items in the background and streams them out as a stored ZIP
+
+    Each finished file is appended to the archive and deleted from the
+    workspace, so neither the whole archive nor all items need to exist at
+    once. Failures are collected into manifest.json, the last archive entry.
+    """
+
+    def __init__(self, urls, download_type='video', resolution='highest', audio_format=downloads.AUDIO_NATIVE):
+        self.urls = urls
+        self.download_type = download_type
+        self.resolution = resolution
+        self.audio_format = audio_format
+        self.work_dir = workspace.create()
+        self.results = queue.Queue()
+        self.cancelled = threading.Event()
+        self._closed = False
+        self._producer = threading.Thread(target=self._produce, name='neobyte-bundle', daemon=True)
+
+    def _produce(self):
+        try:
+            if len(self.urls) == 1:
+                self._download_collection(self.urls[0])
+            else:
+                self._download_list()
+        except Exception as e:
+            logger.error(f"Bundle download failed: {str(e)}")
+            self.results.put(('error', None, str(e)))
+        finally:
+            self.results.put(_DONE)
+
+    def _download_collection(self, url):
+        """Expand a playlist, carousel or multi-video post and add each entry as it finishes"""
+        import yt_dlp
+
+        def check_cancelled(status):
+            if self.cancelled.is_set():
+                raise yt_dlp.utils.DownloadCancelled('Client disconnected')
+
+        def finished(path):
+            self.results.put(('file', url, path, None))
+
+        job = {
+            'outtmpl': os.path.join(self.work_dir, '%(playlist_index&{} - |)s%(title).80B [%(id)s].%(ext)s'),
+            'ignoreerrors': True,
+            'playlistend': MAX_ITEMS,
+            'logger': _ManifestLogger(url, self.results),
+            'progress_hooks': [check_cancelled],
+            'post_hooks': [finished],
+            **downloads.ytdlp_format_options(self.download_type, self.resolution, self.audio_format),
+        }
+        profile = media_ids.platform(url)
+        # The platform's headers and referer; other sites get the shared defaults
+        ydl_opts = ytdlp_profiles.options(profile, **job) if profile in ytdlp_profiles.PROFILES else {**ytdlp_profiles.BASE_OPTIONS, **job}
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+            if isinstance(ydl_opts['format'], formats.YtdlpSelector):
+                # Entries that need a video/audio merge are merged here when ffmpeg is available
+                ydl.format_selector = ydl_opts['format'].bind(ydl, transcode.available())
+            ydl.download([url])
+
+    def _download_list(self):
+        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+            for index, url in enumerate(self.urls, 1):
+                executor.submit(self._download_one, index, url)
+
+    def _download_one(self, index, url):
+        if self.cancelled.is_set():
+            return
+        item_id = f"{index:03d}"
+        item_dir = os.path.join(self.work_dir, item_id)
+        os.makedirs(item_dir, exist_ok=True)
+        try:
+            platform = media_ids.platform(url)
+            if platform == 'youtube':
+                artifact = downloads.download_youtube(
+                    url, self.download_type, self.resolution, item_dir, item_id, audio_format=self.audio_format
+                )
+            elif platform == 'instagram':
+                artifact = downloads.download_instagram(url, item_dir, item_id)
+            elif platform == 'twitter':
+                artifact = downloads.download_twitter(url, item_dir, item_id)
+            else:
+                raise downloads.DownloadError('Unsupported URL', 400)
+            self.results.put(('file', url, artifact.path, f"{item_id} - {artifact.download_name}"))
+        except downloads.DownloadError as e:
+            self.results.put(('error', url, e.message))
+        except Exception as e:
+            logger.error(f"Bundle item {url} failed: {str(e)}")
+            self.results.put(('error', url, str(e)))
+
+    def __iter__(self):
+        self._producer.start()
+        sink = _Sink()
+        manifest = []
+        names = set()
+        try:
+            with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as archive:
+                while True:
+                    result = self.results.get()
+                    if result is _DONE:
+                        break
+                    if result[0] == 'error':
+                        _, url, message = result
+                        manifest.append({'url': url, 'status': 'failed', 'error': message})
+                        continue
+
+                    _, url, path, name = result
+                    name = _unique_name(downloads.clean_filename(name or os.path.basename(path)), names)
+                    yield from self._add_file(archive, sink, path, name)
+                    manifest.append({'url': url, 'status': 'ok', 'file': name})
+
+                archive.writestr(MANIFEST_NAME, json.dumps({'items': manifest}, indent=2))
+            yield sink.drain()
+            failed = sum(1 for item in manifest if item['status'] == 'failed')
+            logger.info(f"Bundle sent with {len(manifest) - failed} files and {failed} failures")
+        finally:
+            self.close()
+
+    def _add_file(self, archive, sink, path, name):
+        info = zipfile.ZipInfo.from_file(path, name)
+        info.compress_type = zipfile.ZIP_STORED
+        try:
+            with open(path, 'rb') as src, archive.open(info, 'w') as dest:
+                while True:
+                    chunk = src.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    dest.write(chunk)
+                    yield sink.drain()
+            yield sink.drain()
+        finally:
+            # The bytes are on their way to the client; free the disk now
+            os.remove(path)
+
+    def close(self):
+        """Stop starting new items and release the workspace once the producer exits"""
+        if self._closed:
+            return
+        self._closed = True
+        self.cancelled.set()
+
+        def release():
+            self._producer.join()
+            workspace.release(self.work_dir)
+
+        if self._producer.is_alive():
+            threading.Thread(target=release, daemon=True).start()
+        else:
+            workspace.release(self.work_dir)
+
+
+def _unique_name(name, names):
+    base, ext = os.path.splitext(name)
+    candidate = name
+    counter = 2
+    while candidate in names or candidate == MANIFEST_NAME:
+        candidate = f"{base} ({counter}){ext}"
+        counter += 1
+    names.add(candidate)
+    return candidate
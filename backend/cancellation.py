@@ -0,0 +1,88 @@
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger('neobyte')
+
+_local = threading.local()
+
+
+class Cancelled(Exception):
+    """Raised inside a backend whose work is no longer wanted"""
+
+
+class CancelToken:
+    """Cancellation and progress signal shared by the threads working on one backend attempt
+
+    Backends never receive the token directly; it is bound to the worker
+    thread and picked up by check()/progress() in their progress callbacks and
+    by guard() around resources such as browser sessions.
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self.progressing = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def cancel(self):
+        with self._lock:
+            if self.cancelled:
+                return
+            self.cancelled = True
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception as e:
+                logger.warning(f"Error cancelling backend work: {str(e)}")
+
+    def add(self, fn):
+        with self._lock:
+            if not self.cancelled:
+                self._callbacks.append(fn)
+                return True
+        fn()
+        return False
+
+    def remove(self, fn):
+        with self._lock:
+            if fn in self._callbacks:
+                self._callbacks.remove(fn)
+
+
+def current():
+    return getattr(_local, 'token', None)
+
+
+def bind(token):
+    """Make token the current thread's token; used when a backend hands work to another thread"""
+    _local.token = token
+
+
+def check():
+    """Raise Cancelled if the current thread's attempt has been abandoned"""
+    token = current()
+    if token is not None and token.cancelled:
+        raise Cancelled('Backend attempt cancelled')
+
+
+def progress():
+    """Note that media bytes are flowing, then check for cancellation"""
+    token = current()
+    if token is not None:
+        token.progressing.set()
+    check()
+
+
+@contextmanager
+def guard(fn):
+    """Run fn (e.g. quit a browser) if the current attempt is cancelled inside the block"""
+    token = current()
+    if token is not None:
+        token.add(fn)
+    try:
+        yield
+    finally:
+        if token is not None:
+            token.remove(fn)
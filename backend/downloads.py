@@ -0,0 +1,668 @@
+import os
+import re
+import logging
+import browser_downloader
+import media_ids
+import extraction_cache
+import formats
+import streaming
+import transcode
+import http_client
+import router
+import cancellation
+import metrics
+import ytdlp_profiles
+
+logger = logging.getLogger('neobyte')
+
+FFMPEG_PATH = transcode.FFMPEG_PATH
+
+# Audio delivery modes: the original track as-is, or re-encoded to MP3 on request
+AUDIO_NATIVE = 'native'
+AUDIO_MP3 = 'mp3'
+
+
+class DownloadError(Exception):
+    """A user-facing download failure carrying the HTTP status to report"""
+
+    def __init__(self, message, status_code=500):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class Artifact:
+    """A finished file on disk and the name the client should save it as"""
+
+    def __init__(self, path, download_name):
+        self.path = path
+        self.download_name = download_name
+
+
+class LiveArtifact(Artifact):
+    """An artifact that is relayed to the client while the backend is still writing it"""
+
+    def __init__(self, path, download_name, live, content_length=None, mimetype=None):
+        super().__init__(path, download_name)
+        self.live = live
+        self.content_length = content_length
+        self.mimetype = mimetype or 'application/octet-stream'
+
+
+def clean_filename(name):
+    """Replace characters that are invalid in filenames"""
+    return name.replace('/', '_').replace('\\', '_').replace(':', '_').replace('*', '_').replace('?', '_').replace('"', '_').replace('<', '_').replace('>', '_').replace('|', '_')
+
+
+def find_output_file(temp_dir, download_id):
+    """Locate a download whose extension differs from what yt-dlp predicted"""
+    possible_files = [os.path.join(temp_dir, f) for f in os.listdir(temp_dir) if f.startswith(download_id) and not f.startswith('cookies_')]
+    return possible_files[0] if possible_files else None
+
+
+def discard_artifact(artifact):
+    """Stop a result that lost a hedged race; its files go with the workspace"""
+    if isinstance(artifact, LiveArtifact):
+        artifact.live.close()
+
+
+def _pytube_progress(stream, chunk, bytes_remaining):
+    metrics.add_bytes('upstream', len(chunk))
+    cancellation.progress()
+
+
+def _transfer(fn, *args, **kwargs):
+    """Run a backend's download call, timed as the upstream_transfer stage"""
+    with metrics.stage('upstream_transfer'):
+        return fn(*args, **kwargs)
+
+
+def _download_resolved(ydl, info):
+    """Download a result resolved with extract_info(download=False) and return its final info
+
+    process_info only takes a single video; carousels and multi-video posts
+    come back as playlists and go through process_ie_result instead.
+    """
+    if info.get('_type', 'video') == 'video':
+        _transfer(ydl.process_info, info)
+        return info
+    return _transfer(ydl.process_ie_result, info, download=True)
+
+
+def is_content_error(error):
+    """True for failures about the requested content, which another backend would hit too"""
+    return isinstance(error, DownloadError) and error.status_code < 500
+
+
+def audio_mimetype(ext):
+    return 'audio/mp4' if ext == 'm4a' else 'audio/mpeg' if ext == 'mp3' else f'audio/{ext}'
+
+
+def download_youtube(url, download_type, resolution, temp_dir, download_id, use_browser=True, stream=False,
+                     audio_format=AUDIO_NATIVE):
+    """Download a YouTube video or audio track, trying each backend in turn
+
+    With stream=True, the browser relay and single-file pytube/yt-dlp formats
+    come back as a LiveArtifact, which can be sent while the download is still
+    in progress. Audio is delivered in its
+    original m4a/webm container unless audio_format is AUDIO_MP3.
+    """
+    if not url:
+        raise DownloadError('Please enter a YouTube URL', 400)
+    if audio_format not in (AUDIO_NATIVE, AUDIO_MP3):
+        raise DownloadError(f'Unsupported audio format: {audio_format}', 400)
+    resolution = formats.resolution_label(resolution)
+
+    attempts = []
+    if use_browser:
+        attempts.append(('browser', lambda: _youtube_browser(url, download_type, resolution, temp_dir, f"{download_id}-browser", stream, audio_format)))
+    attempts.append(('pytube', lambda: _youtube_pytube(url, download_type, resolution, temp_dir, download_id, stream, audio_format)))
+    # yt-dlp gets its own file prefix so a hedged pytube attempt in the same workspace cannot collide with it
+    attempts.append(('ytdlp', lambda: _youtube_ytdlp(url, download_type, resolution, temp_dir, f"{download_id}-ytdlp", stream, audio_format)))
+
+    try:
+        # Healthiest, fastest backend first; broken ones are skipped while their circuit is open
+        return router.router.run('youtube', attempts, is_final=is_content_error, discard=discard_artifact)
+
+    except DownloadError:
+        raise
+    except Exception as e:
+        error_message = f"Error downloading {url}: {str(e)}"
+        logger.error(error_message)
+        raise DownloadError(error_message, 500)
+
+
+def _youtube_browser(url, download_type, resolution, temp_dir, download_id, stream=False, audio_format=AUDIO_NATIVE):
+    try:
+        logger.info(f"Attempting to download with browser downloader: {url}")
+        is_audio = download_type == 'audio'
+        native_audio = audio_format == AUDIO_NATIVE
+        if stream:
+            media_stream, filename, error = browser_downloader.stream_with_quality(url, resolution, is_audio, native_audio)
+            if media_stream and filename:
+                # The filename comes from the same scrape that produced the stream
+                original_filename = clean_filename(filename)
+                # Relay through the workspace like pytube and yt-dlp, so coalesced and resumed requests can read the file
+                live = streaming.LiveDownload(os.path.join(temp_dir, f"{download_id}{os.path.splitext(filename)[1]}"), media_stream.content_length)
+                live.start(lambda: _transfer(live.write_from, media_stream))
+                logger.info(f"Streaming with browser downloader: {original_filename}")
+                return LiveArtifact(live.path, original_filename, live, media_stream.content_length, media_stream.content_type)
+            logger.error(f"Browser downloader failed: {error}")
+            return None
+        file_path, error = browser_downloader.download_with_quality(url, resolution, is_audio, temp_dir, native_audio=native_audio)
+        if file_path and os.path.exists(file_path):
+            original_filename = clean_filename(os.path.basename(file_path))
+            logger.info(f"Successfully downloaded with browser downloader: {original_filename}")
+            return Artifact(file_path, original_filename)
+        logger.error(f"Browser downloader failed: {error}")
+    except Exception as browser_error:
+        logger.error(f"Browser downloader error: {str(browser_error)}")
+    return None
+
+
+def _youtube_pytube(url, download_type, resolution, temp_dir, download_id, stream_output=False, audio_format=AUDIO_NATIVE):
+    from pytube import YouTube
+
+    # Try to process with pytube
+    logger.info(f"Attempting to download with pytube: {url}")
+
+    # Initialize pytube YouTube object
+    yt = YouTube(url, on_progress_callback=_pytube_progress)
+
+    # Get video title for filename
+    with metrics.stage('extraction'):
+        video_title = yt.title
+    # Clean filename
+    video_title = re.sub(r'[\\/*?:"<>|]', "", video_title)
+
+    # Determine file path
+    if download_type == 'audio' and audio_format == AUDIO_MP3:
+        # MP3 download
+        output_file = os.path.join(temp_dir, f"{download_id}.mp3")
+        stream = yt.streams.filter(only_audio=True).first()
+
+        if transcode.available():
+            # Encode while downloading rather than after
+            from pytube import request as pytube_request
+            artifact = _pipe_to_mp3(
+                lambda: pytube_request.stream(stream.url),
+                output_file, f"{video_title}.mp3", stream_output
+            )
+            if artifact:
+                return artifact
+
+        # Download the file
+        file_path = _transfer(stream.download, output_path=temp_dir, filename=f"{download_id}.mp4")
+
+        # Convert to mp3 if ffmpeg is available
+        if transcode.available():
+            try:
+                transcode.pool.run(file_path, output_file)
+
+                # Remove the original mp4 file
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+                filename = output_file
+                original_filename = f"{video_title}.mp3"
+            except Exception as e:
+                logger.error(f"Error converting to MP3: {str(e)}")
+                # If conversion fails, just use the mp4
+                filename = file_path
+                original_filename = f"{video_title}.mp4"
+        else:
+            # No ffmpeg, just rename the file
+            filename = file_path
+            original_filename = f"{video_title}.mp4"
+    else:
+        ext = 'mp4'
+        mimetype = None
+        if download_type == 'audio':
+            # Native audio track, delivered without re-encoding; m4a plays almost everywhere
+            audio_streams = yt.streams.filter(only_audio=True)
+            stream = audio_streams.filter(subtype='mp4').order_by('abr').desc().first() or audio_streams.order_by('abr').desc().first()
+            ext = 'm4a' if stream.subtype == 'mp4' else stream.subtype
+            mimetype = audio_mimetype(ext)
+        else:
+            # pytube cannot merge, so pick among its progressive (audio and video) streams
+            chosen = formats.choose(formats.pytube_candidates(yt.streams), resolution)
+            if not chosen:
+                raise DownloadError(f"No progressive stream for {url}", 500)
+            target = formats.target_height(resolution)
+            if target and chosen.height < target:
+                # Progressive streams stop at 720p; leave higher resolutions to a backend that can merge
+                logger.info(f"pytube has nothing above {chosen.height}p for {url}, {resolution} requested")
+                return None
+            stream = chosen.source
+            logger.info(f"Selected pytube stream {stream.itag}: {chosen}")
+
+        original_filename = f"{video_title}.{ext}"
+
+        if stream_output:
+            # Relay the file while pytube writes it
+            live = streaming.LiveDownload(os.path.join(temp_dir, f"{download_id}.{ext}"), stream.filesize)
+            yt.register_on_progress_callback(live.pytube_callback)
+            live.start(lambda: _transfer(stream.download, output_path=temp_dir, filename=f"{download_id}.{ext}"))
+            logger.info(f"Streaming with pytube: {original_filename}")
+            return LiveArtifact(live.path, clean_filename(original_filename), live, stream.filesize, mimetype or stream.mime_type)
+
+        # Download the file
+        filename = _transfer(stream.download, output_path=temp_dir, filename=f"{download_id}.{ext}")
+
+    logger.info(f"Successfully downloaded with pytube: {original_filename}")
+    return Artifact(filename, clean_filename(original_filename))
+
+
+class _ResponseChunks:
+    """A streamed response's body as chunks, closed once drained or on close()"""
+
+    def __init__(self, response):
+        self.response = response
+
+    def __iter__(self):
+        try:
+            yield from self.response.iter_content(transcode.CHUNK_SIZE)
+        finally:
+            self.close()
+
+    def close(self):
+        self.response.close()
+
+
+def _open_http_chunks(url, headers=None):
+    """Open url as a chunk source for _pipe_to_mp3; an error status raises instead of being encoded"""
+    response = http_client.session.get(url, headers=headers, stream=True)
+    try:
+        response.raise_for_status()
+    except Exception:
+        response.close()
+        raise
+    return _ResponseChunks(response)
+
+
+def _pipe_to_mp3(open_source, output_file, original_filename, stream_output=False):
+    """Transcode bytes to MP3 as they download; None if the pipeline could not produce a file
+
+    open_source returns an iterable of input chunks; it is opened here, so a
+    failed request falls back rather than failing the relay. With
+    stream_output the encoded output is relayed to the client while ffmpeg is
+    still writing it.
+    """
+    original_filename = clean_filename(original_filename)
+    try:
+        source = open_source()
+        if stream_output:
+            live = streaming.LiveDownload(output_file)
+            live.start(lambda: transcode.pool.run(source, output_file, live=live))
+            logger.info(f"Streaming MP3 while transcoding: {original_filename}")
+            return LiveArtifact(output_file, original_filename, live, None, 'audio/mpeg')
+        transcode.pool.run(source, output_file)
+        logger.info(f"Transcoded to MP3 while downloading: {original_filename}")
+        return Artifact(output_file, original_filename)
+    except Exception as e:
+        logger.warning(f"Pipelined transcode failed, falling back to download then convert: {str(e)}")
+        if os.path.exists(output_file):
+            os.remove(output_file)
+        return None
+
+
+def _start_ytdlp_stream(ydl, url, media_id, profile, job):
+    """Resolve formats and, if a single progressive file was chosen, start relaying it
+
+    Returns (live, info); live is None when a merge or transcode is required or
+    the result is a playlist, in which case the caller downloads info with
+    _download_resolved.
+    """
+    info = extraction_cache.extract_info(ydl, url, media_id, profile, download=False)
+    if not streaming.can_stream_ytdlp(info, ydl.params):
+        return None, info
+
+    # Write straight to the final name so the file can be read while it grows
+    live = streaming.LiveDownload(ydl.prepare_filename(info))
+    background = ytdlp_profiles.pool.acquire(profile, **job, nopart=True, fixup='never', progress_hooks=[live.ytdlp_hook])
+
+    def run():
+        ok = False
+        try:
+            _transfer(background.process_info, info)
+            ok = True
+        finally:
+            ytdlp_profiles.pool.release(background, discard=not ok)
+            cookie_file = job.get('cookiefile')
+            if cookie_file and os.path.exists(cookie_file):
+                # Closing the private instance saved the user's cookies back after the request removed them
+                os.remove(cookie_file)
+
+    live.start(run)
+    return live, info
+
+
+def ytdlp_format_options(download_type, resolution, audio_format=AUDIO_NATIVE):
+    """yt-dlp 'format' (and, for MP3, postprocessor) options for a download type and resolution"""
+    if download_type == 'audio' and audio_format == AUDIO_NATIVE:
+        # Best original audio track, no postprocessing
+        return {'format': 'bestaudio[ext=m4a]/bestaudio/best'}
+    if download_type == 'audio':
+        return {
+            'format': 'bestaudio/best',
+            'postprocessors': [{
+                'key': 'FFmpegExtractAudio',
+                'preferredcodec': 'mp3',
+                'preferredquality': '192',
+            }],
+        }
+    # Ranked by estimated cost, so a progressive file wins over a video/audio merge when it meets the resolution;
+    # a pair chosen only because nothing else exists is still merged into an .mp4
+    return {'format': formats.YtdlpSelector(resolution), 'merge_output_format': formats.VIDEO_CONTAINER}
+
+
+def _youtube_ytdlp(url, download_type, resolution, temp_dir, download_id, stream=False, audio_format=AUDIO_NATIVE):
+    # Fallback to yt-dlp with the bot detection bypass profile
+    output_template = os.path.join(temp_dir, f'{download_id}.%(ext)s')
+
+    ydl_opts = {'outtmpl': output_template}
+
+    ydl_opts.update(ytdlp_format_options(download_type, resolution, audio_format))
+
+    # Extract and download
+    with ytdlp_profiles.pool.session('youtube', **ydl_opts) as ydl:
+        media_id = media_ids.canonical_media_id(url)
+        if download_type == 'audio' and audio_format == AUDIO_MP3 and transcode.available():
+            # Feed the selected audio format straight into ffmpeg instead of FFmpegExtractAudio
+            info = extraction_cache.extract_info(ydl, url, media_id, 'youtube', download=False)
+            if info.get('url') and info.get('protocol') in ('http', 'https'):
+                artifact = _pipe_to_mp3(
+                    lambda: _open_http_chunks(info['url'], info.get('http_headers')),
+                    os.path.join(temp_dir, f"{download_id}.mp3"),
+                    f"{info.get('title', 'video')}.mp3", stream
+                )
+                if artifact:
+                    return artifact
+            info = _download_resolved(ydl, info)
+        elif stream:
+            live, info = _start_ytdlp_stream(ydl, url, media_id, 'youtube', ydl_opts)
+            if live:
+                if download_type == 'audio':
+                    ext = info.get('ext') or 'm4a'
+                    mimetype = audio_mimetype(ext)
+                else:
+                    ext = info.get('ext') or 'mp4'
+                    mimetype = f'video/{ext}'
+                original_filename = clean_filename(f"{info.get('title', 'video')}.{ext}")
+                logger.info(f"Streaming with yt-dlp: {original_filename}")
+                return LiveArtifact(live.path, original_filename, live, info.get('filesize'), mimetype)
+            info = _download_resolved(ydl, info)
+        else:
+            # Get information and download the video
+            info = extraction_cache.extract_info(ydl, url, media_id, 'youtube')
+        logger.info(f"Downloaded with yt-dlp to temporary location for immediate delivery to user")
+
+        # Determine the output filename
+        if download_type == 'audio' and audio_format == AUDIO_MP3:
+            filename = os.path.join(temp_dir, f"{download_id}.mp3")
+        else:
+            filename = ydl.prepare_filename(info)
+
+        # Ensure the file exists
+        if not os.path.exists(filename):
+            # Try with different extension if needed
+            filename = find_output_file(temp_dir, download_id)
+            if not filename:
+                raise DownloadError('Failed to download file', 500)
+
+        # Get original filename, with the extension yt-dlp actually produced
+        original_filename = f"{info.get('title', 'video')}"
+        if download_type == 'audio' and audio_format == AUDIO_MP3:
+            original_filename = f"{original_filename}.mp3"
+        else:
+            original_filename = f"{original_filename}{os.path.splitext(filename)[1] or '.mp4'}"
+
+        return Artifact(filename, clean_filename(original_filename))
+
+
+def validate_instagram_url(url):
+    if not url:
+        raise DownloadError('Please enter an Instagram URL', 400)
+
+    # Check if the URL is from Instagram
+    if not ('instagram.com' in url or 'instagr.am' in url):
+        raise DownloadError('Please enter a valid Instagram URL', 400)
+
+
+def instagram_fallback_title(url, download_id):
+    """Generate a title based on the type of Instagram content"""
+    if 'reel' in url.lower():
+        return f"Instagram_Reel_{download_id[:8]}"
+    elif 'stories' in url.lower():
+        return f"Instagram_Story_{download_id[:8]}"
+    return f"Instagram_Post_{download_id[:8]}"
+
+
+def download_instagram(url, temp_dir, download_id, stream=False):
+    """Download an Instagram post, reel or story"""
+    validate_instagram_url(url)
+
+    # A plain page fetch is enough for most public posts; the browser and yt-dlp are escalations
+    attempts = [
+        ('http', lambda: _instagram_page(url, temp_dir, f"{download_id}-http", browser_downloader.extract_instagram_http)),
+        ('browser', lambda: _instagram_page(url, temp_dir, download_id, browser_downloader.capture_instagram)),
+        ('ytdlp', lambda: _instagram_ytdlp(url, temp_dir, f"{download_id}-ytdlp", stream)),
+    ]
+
+    try:
+        return router.router.run('instagram', attempts, is_final=is_content_error, discard=discard_artifact)
+
+    except DownloadError:
+        raise
+    except Exception as e:
+        error_message = f"Error downloading Instagram content from {url}: {str(e)}"
+        logger.error(error_message)
+
+        # Provide more specific error messages
+        if 'login' in str(e).lower():
+            raise DownloadError('This Instagram content requires authentication. Please try with a public post or reel.', 400)
+        elif 'private' in str(e).lower():
+            raise DownloadError('This Instagram account or post is private and cannot be downloaded.', 400)
+        elif 'not found' in str(e).lower():
+            raise DownloadError('Instagram content not found. The post may have been deleted or the URL is incorrect.', 404)
+        else:
+            raise DownloadError('Failed to download Instagram content. Please try again or check if the content is publicly accessible.', 500)
+
+
+def _instagram_page(url, temp_dir, download_id, extract):
+    # Find the media URL on the post page (over plain HTTP or in the browser) and fetch it directly
+    try:
+        logger.info(f"Attempting Instagram download with {extract.__name__}: {url}")
+
+        file_path, title, error = browser_downloader.download_instagram_content(
+            url,
+            temp_dir,
+            f"{download_id}.mp4",
+            extract=extract
+        )
+
+        if file_path and os.path.exists(file_path):
+            # The title comes from the same page load as the media URL
+            if title:
+                original_filename = f"{clean_filename(title)}.mp4"
+            else:
+                # Generate filename based on URL type
+                original_filename = f"{instagram_fallback_title(url, download_id)}.mp4"
+
+            logger.info(f"Successfully downloaded Instagram content: {original_filename}")
+            return Artifact(file_path, original_filename)
+
+        if error:
+            logger.info(f"{extract.__name__} found no Instagram media: {error}")
+    except Exception as page_error:
+        logger.warning(f"{extract.__name__} failed: {str(page_error)}")
+    return None
+
+
+def _instagram_ytdlp(url, temp_dir, download_id, stream=False):
+    # Fallback to yt-dlp with the Instagram profile
+    output_template = os.path.join(temp_dir, f'{download_id}.%(ext)s')
+    ydl_opts = {'outtmpl': output_template}
+
+    # Extract info first to get metadata
+    with ytdlp_profiles.pool.session('instagram', **ydl_opts) as ydl:
+        logger.info(f"Downloading Instagram content from: {url}")
+
+        # Login walls and rate limits hit yt-dlp's anonymous requests more often than a browser,
+        # so its errors are left to the router as backend failures rather than final content errors;
+        # download_instagram turns them into a user-facing message if every backend fails
+        media_id = media_ids.canonical_media_id(url)
+        if stream:
+            live, info = _start_ytdlp_stream(ydl, url, media_id, 'instagram', ydl_opts)
+            if live:
+                original_filename = clean_filename(f"{info.get('title') or instagram_fallback_title(url, download_id)}.{info.get('ext') or 'mp4'}")
+                logger.info(f"Streaming Instagram content: {original_filename}")
+                return LiveArtifact(live.path, original_filename, live, info.get('filesize'), 'video/mp4')
+            if info:
+                info = _download_resolved(ydl, info)
+        else:
+            info = extraction_cache.extract_info(ydl, url, media_id, 'instagram')
+
+        if not info:
+            # ignoreerrors swallows yt-dlp's login and rate-limit errors into an empty result
+            logger.info(f"yt-dlp returned no Instagram content for {url}")
+            return None
+
+        # Determine the output filename
+        filename = ydl.prepare_filename(info)
+
+        # Ensure the file exists
+        if not os.path.exists(filename):
+            # Try with different extension if needed
+            filename = find_output_file(temp_dir, download_id)
+            if not filename:
+                raise DownloadError('Failed to download file. Content may be protected or unavailable.', 500)
+
+        # Get original filename and content type
+        if 'title' in info and info['title']:
+            content_title = info['title']
+        else:
+            content_title = instagram_fallback_title(url, download_id)
+
+        # Get extension
+        _, ext = os.path.splitext(filename)
+        if not ext:
+            ext = '.mp4'  # Default to mp4 if no extension
+
+        # Ensure proper extension
+        original_filename = clean_filename(f"{content_title}{ext}")
+
+        logger.info(f"Successfully downloaded Instagram content: {original_filename}")
+        return Artifact(filename, original_filename)
+
+
+def normalize_twitter_url(url):
+    """Validate an X/Twitter URL and rewrite x.com links to twitter.com"""
+    if not url:
+        raise DownloadError('Please enter an X (Twitter) URL', 400)
+
+    # Normalize URL (handle both x.com and twitter.com)
+    if 'x.com' in url and 'twitter.com' not in url:
+        logger.info(f"Converting X URL to Twitter format: {url}")
+        url = url.replace('x.com', 'twitter.com')
+
+    # Validate URL format
+    if not ('twitter.com' in url or 'x.com' in url):
+        raise DownloadError('Please enter a valid X or Twitter post URL', 400)
+
+    return url
+
+
+def download_twitter(url, temp_dir, download_id, cookie_file=None, stream=False):
+    """Download media from an X/Twitter post; the caller owns cookie_file"""
+    # yt-dlp is the only Twitter backend, so there is nothing to route
+    with metrics.context(platform='twitter', backend='ytdlp'):
+        return _twitter_ytdlp(url, temp_dir, download_id, cookie_file, stream)
+
+
+def _twitter_ytdlp(url, temp_dir, download_id, cookie_file=None, stream=False):
+    url = normalize_twitter_url(url)
+
+    # Initialize yt-dlp for Twitter download
+    import yt_dlp
+
+    try:
+        # Configure yt-dlp options for Twitter download
+        output_template = os.path.join(temp_dir, f'{download_id}.%(ext)s')
+
+        # The cookie file, if uploaded, gets a private yt-dlp instance
+        ydl_opts = {'outtmpl': output_template, 'cookiefile': cookie_file}
+
+        # Extract info first to get metadata
+        with ytdlp_profiles.pool.session('twitter', **ydl_opts) as ydl:
+            logger.info(f"Downloading X content from: {url}")
+            # Results fetched with a user's cookies are private to that request
+            media_id = None if cookie_file else media_ids.canonical_media_id(url)
+            if stream:
+                live, info = _start_ytdlp_stream(ydl, url, media_id, 'twitter', ydl_opts)
+                if live:
+                    original_filename = clean_filename(f"{info.get('title') or f'X_Video_{download_id[:8]}'}.{info.get('ext') or 'mp4'}")
+                    logger.info(f"Streaming X content: {original_filename}")
+                    return LiveArtifact(live.path, original_filename, live, info.get('filesize'), 'video/mp4')
+                if info:
+                    info = _download_resolved(ydl, info)
+            else:
+                info = extraction_cache.extract_info(ydl, url, media_id, 'twitter')
+
+            if not info:
+                raise DownloadError('Could not download content. The post may be private, not exist, or contain no media.', 400)
+
+            # Determine the output filename
+            filename = ydl.prepare_filename(info)
+
+            # Ensure the file exists
+            if not os.path.exists(filename):
+                # Try with different extension if needed
+                filename = find_output_file(temp_dir, download_id)
+                if not filename:
+                    raise DownloadError('Failed to download file. The post may not contain downloadable media.', 500)
+
+            # Get original filename and content type
+            if 'title' in info and info['title']:
+                content_title = info['title']
+            else:
+                # Generate a title based on the account name if available
+                if 'uploader' in info and info['uploader']:
+                    content_title = f"X_Video_{info['uploader']}_{download_id[:6]}"
+                else:
+                    content_title = f"X_Video_{download_id[:8]}"
+
+            # Get extension
+            _, ext = os.path.splitext(filename)
+            if not ext:
+                ext = '.mp4'  # Default to mp4 if no extension
+
+            # Ensure proper extension
+            original_filename = clean_filename(f"{content_title}{ext}")
+
+            # Log file information
+            file_size = os.path.getsize(filename)
+            logger.info(f"X content downloaded: {original_filename} ({file_size} bytes)")
+
+            logger.info(f"Successfully downloaded X content: {original_filename}")
+            return Artifact(filename, original_filename)
+
+    except DownloadError:
+        raise
+    except yt_dlp.utils.DownloadError as e:
+        error_message = str(e)
+        logger.error(f"yt-dlp download error for {url}: {error_message}")
+
+        # Handle common error cases with more user-friendly messages
+        if "Unsupported URL" in error_message:
+            raise DownloadError('This URL is not supported or does not contain media content', 400)
+        elif "requires authentication" in error_message:
+            raise DownloadError('This content is private and requires authentication. Please try uploading a cookies.txt file from a browser where you are logged in.', 403)
+        elif "not exist" in error_message or "404" in error_message:
+            raise DownloadError('The requested content does not exist', 404)
+        else:
+            raise DownloadError(f'Error downloading content: {error_message}', 500)
+    except Exception as e:
+        error_message = f"Error downloading X content from {url}: {str(e)}"
+        logger.error(error_message)
+        raise DownloadError(error_message, 500)
@@ -0,0 +1,248 @@
+import os
+import time
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+import cancellation
+import metrics
+
+logger = logging.getLogger("driver_pool")
+
+# Pool sizing can be tuned per deployment without touching the code
+POOL_SIZE = int(os.environ.get('NEOBYTE_DRIVER_POOL_SIZE', 2))
+MAX_USES = int(os.environ.get('NEOBYTE_DRIVER_MAX_USES', 50))
+CHECKOUT_TIMEOUT = float(os.environ.get('NEOBYTE_DRIVER_CHECKOUT_TIMEOUT', 60))
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36"
+
+
+class PoolExhausted(Exception):
+    """Raised when no driver could be checked out before the timeout"""
+
+
+def build_chrome_options():
+    """Headless Chrome options shared by every pooled session"""
+    # Selenium loads on first use so processes that never open a browser skip it
+    from selenium.webdriver.chrome.options import Options
+
+    chrome_options = Options()
+    chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--disable-gpu")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("--disable-extensions")
+    chrome_options.add_argument("--disable-infobars")
+    chrome_options.add_argument("--window-size=1920,1080")
+    chrome_options.add_argument(f"--user-agent={USER_AGENT}")
+    # Every wait after navigation is explicit, so don't block on images and subframes
+    chrome_options.page_load_strategy = "eager"
+    # Network events are read back through the performance log to spot media requests
+    chrome_options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    chrome_options.add_experimental_option("perfLoggingPrefs", {"enableNetwork": True, "enablePage": False})
+    return chrome_options
+
+
+class DriverPool:
+    """Bounded pool of pre-launched headless Chrome drivers"""
+
+    def __init__(self, max_size=POOL_SIZE, max_uses=MAX_USES):
+        self.max_size = max(1, max_size)
+        self.max_uses = max(1, max_uses)
+        self._driver_path = None
+        self._idle = []
+        self._uses = {}
+        self._created = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        # Counters reported through stats()
+        self._checkouts = 0
+        self._saturated_checkouts = 0
+        self._recycled = 0
+        self._launch_failures = 0
+
+    def driver_path(self):
+        """Resolve the chromedriver binary once and reuse it for every launch"""
+        if self._driver_path is None:
+            from webdriver_manager.chrome import ChromeDriverManager
+
+            self._driver_path = ChromeDriverManager().install()
+            logger.info(f"Resolved chromedriver at {self._driver_path}")
+        return self._driver_path
+
+    def _launch(self):
+        from selenium import webdriver
+        from selenium.webdriver.chrome.service import Service
+
+        with metrics.stage('driver_startup'):
+            service = Service(self.driver_path())
+            driver = webdriver.Chrome(service=service, options=build_chrome_options())
+        self._uses[id(driver)] = 0
+        return driver
+
+    def _quit(self, driver):
+        self._uses.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.warning(f"Error quitting driver: {str(e)}")
+
+    def _is_healthy(self, driver):
+        try:
+            driver.execute_script("return 1")
+            return True
+        except Exception:
+            return False
+
+    def _reset(self, driver):
+        """Clear per-job state so the next checkout starts from a blank session"""
+        handles = driver.window_handles
+        for handle in handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(handles[0])
+        driver.delete_all_cookies()
+        driver.get("about:blank")
+        # Performance log entries pile up in the driver until read
+        driver.get_log("performance")
+
+    def warm(self, count=None):
+        """Pre-launch drivers so the first requests do not pay Chrome startup"""
+        count = self.max_size if count is None else min(count, self.max_size)
+        self.driver_path()
+        while True:
+            with self._lock:
+                if self._created >= count:
+                    return
+                self._created += 1
+            try:
+                driver = self._launch()
+            except Exception as e:
+                with self._lock:
+                    self._created -= 1
+                    self._launch_failures += 1
+                logger.error(f"Error pre-launching driver: {str(e)}")
+                return
+            with self._available:
+                self._idle.append(driver)
+                self._available.notify()
+
+    def acquire(self, timeout=CHECKOUT_TIMEOUT):
+        """Check a driver out of the pool, launching one if there is spare capacity"""
+        deadline = time.monotonic() + timeout
+        with self._available:
+            self._checkouts += 1
+            if not self._idle and self._created >= self.max_size:
+                self._saturated_checkouts += 1
+                logger.warning(f"Driver pool saturated ({self._in_use}/{self.max_size} in use, {self._waiting} waiting)")
+            while not self._idle and self._created >= self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolExhausted(f"No browser session available after {timeout} seconds")
+                self._waiting += 1
+                try:
+                    self._available.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            if self._idle:
+                driver = self._idle.pop()
+                self._in_use += 1
+            else:
+                driver = None
+                self._created += 1
+                self._in_use += 1
+
+        if driver is not None and self._is_healthy(driver):
+            return driver
+
+        if driver is not None:
+            logger.warning("Discarding unhealthy driver from pool")
+            self._recycled += 1
+            self._quit(driver)
+
+        try:
+            return self._launch()
+        except Exception:
+            with self._available:
+                self._created -= 1
+                self._in_use -= 1
+                self._launch_failures += 1
+                self._available.notify()
+            raise
+
+    def release(self, driver, discard=False):
+        """Return a driver to the pool, recycling it if it is worn out or broken"""
+        uses = self._uses.get(id(driver), 0) + 1
+        self._uses[id(driver)] = uses
+
+        if not discard and uses < self.max_uses:
+            try:
+                self._reset(driver)
+            except Exception as e:
+                logger.warning(f"Error resetting driver, recycling it: {str(e)}")
+                discard = True
+        else:
+            discard = True
+
+        if discard:
+            self._recycled += 1
+            self._quit(driver)
+
+        with self._available:
+            self._in_use -= 1
+            if discard:
+                self._created -= 1
+            else:
+                self._idle.append(driver)
+            self._available.notify()
+
+    @contextmanager
+    def session(self, timeout=CHECKOUT_TIMEOUT):
+        """Context manager wrapping acquire/release"""
+        driver = self.acquire(timeout)
+        discard = False
+        try:
+            # An abandoned hedged attempt quits its browser, which aborts any pending wait
+            with cancellation.guard(driver.quit):
+                yield driver
+        except Exception:
+            # The page may be left in an unknown state, so only keep the driver if it still responds
+            discard = not self._is_healthy(driver)
+            raise
+        finally:
+            self.release(driver, discard=discard)
+
+    def stats(self):
+        """Snapshot of pool occupancy and saturation counters"""
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "created": self._created,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "checkouts": self._checkouts,
+                "saturated_checkouts": self._saturated_checkouts,
+                "recycled": self._recycled,
+                "launch_failures": self._launch_failures,
+            }
+
+    def close(self):
+        """Quit every idle driver; drivers still checked out are quit on release"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+            self.max_uses = 0
+        for driver in idle:
+            self._quit(driver)
+
+
+pool = DriverPool()
+atexit.register(pool.close)
+
+
+def session(timeout=CHECKOUT_TIMEOUT):
+    """Check out a pooled driver for the duration of a with-block"""
+    return pool.session(timeout)
@@ -0,0 +1,162 @@
+import os
+import copy
+import time
+import logging
+import threading
+import metrics
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs
+
+logger = logging.getLogger("extraction_cache")
+
+MAX_ENTRIES = int(os.environ.get('NEOBYTE_EXTRACTION_CACHE_SIZE', 512))
+DEFAULT_TTL = float(os.environ.get('NEOBYTE_EXTRACTION_CACHE_TTL', 3600))
+# Expire entries a little before the CDN does so a cached URL is never handed out stale
+EXPIRY_MARGIN = float(os.environ.get('NEOBYTE_EXTRACTION_CACHE_MARGIN', 300))
+# Responses to a media URL that mean it has expired or is bound to another client, so extracting again may help
+STALE_STATUSES = (403, 404, 410)
+
+
+def url_expiry(url):
+    """Return the unix expiry embedded in a signed CDN URL, if any"""
+    try:
+        parsed = urlparse(url)
+    except Exception:
+        return None
+
+    query = parse_qs(parsed.query)
+    expiries = []
+    # googlevideo.com and most signed URLs
+    for key in ('expire', 'Expires', 'expires'):
+        if key in query and query[key][0].isdigit():
+            expiries.append(int(query[key][0]))
+    # Instagram/Facebook CDN encodes the expiry in hex
+    if 'oe' in query:
+        try:
+            expiries.append(int(query['oe'][0], 16))
+        except ValueError:
+            pass
+    # googlevideo path-style parameters: /videoplayback/expire/<ts>/...
+    parts = parsed.path.split('/')
+    if 'expire' in parts:
+        index = parts.index('expire')
+        if index + 1 < len(parts) and parts[index + 1].isdigit():
+            expiries.append(int(parts[index + 1]))
+
+    return min(expiries) if expiries else None
+
+
+def ttl_for_urls(urls, default_ttl=DEFAULT_TTL):
+    """TTL bounded by the earliest signed-URL expiry among the given URLs"""
+    ttl = default_ttl
+    now = time.time()
+    for url in urls:
+        if not url:
+            continue
+        expiry = url_expiry(url)
+        if expiry is not None:
+            ttl = min(ttl, expiry - now - EXPIRY_MARGIN)
+    return ttl
+
+
+def is_stale_url_error(error):
+    """True when fetching an extracted media URL failed because of the URL itself"""
+    response = getattr(error, 'response', None)
+    return response is not None and response.status_code in STALE_STATUSES
+
+
+class ExtractionCache:
+    """Thread-safe LRU cache of extraction results with per-entry expiry"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, default_ttl=DEFAULT_TTL):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Return a copy of the cached value, or None on miss or expiry"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Callers (yt-dlp in particular) mutate what they are given
+        return copy.deepcopy(value)
+
+    def put(self, key, value, urls=()):
+        """Store a value, expiring it before any signed URL it contains"""
+        ttl = ttl_for_urls(urls, self.default_ttl)
+        if ttl <= 0:
+            return
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        """Drop an entry whose URLs stopped working before their expiry"""
+        with self._lock:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+cache = ExtractionCache()
+
+
+def format_urls(info):
+    """Collect every direct media URL from a yt-dlp info dict"""
+    urls = [info.get('url')]
+    for fmt in info.get('formats') or []:
+        urls.append(fmt.get('url'))
+    return [u for u in urls if u]
+
+
+def extract_info(ydl, url, media_id, profile, download=True):
+    """yt-dlp extract_info that reuses a cached extractor result for known media IDs
+
+    The raw (unprocessed) extractor result is cached, so format selection and the
+    download itself still follow the options of the YoutubeDL instance in use.
+    """
+    key = (media_id, 'yt-dlp', profile)
+    ie_result = cache.get(key) if media_id is not None else None
+    if ie_result is None:
+        with metrics.stage('extraction'):
+            ie_result = ydl.extract_info(url, download=False, process=False)
+        if not ie_result:
+            return ie_result
+        # Only single videos are safe to cache; playlists may carry lazy entry generators
+        if media_id is not None and ie_result.get('_type', 'video') == 'video':
+            cache.put(key, ie_result, urls=format_urls(ie_result))
+    else:
+        logger.info(f"Extraction cache hit for {media_id}")
+
+    if not download:
+        return ydl.process_ie_result(ie_result, download=False)
+    with metrics.stage('upstream_transfer'):
+        return ydl.process_ie_result(ie_result, download=True)
@@ -0,0 +1,210 @@
+import os
+import re
+
+# Rough rates used to put bytes, merging and transcoding on one scale (seconds of work)
+DOWNLOAD_RATE = float(os.environ.get('NEOBYTE_FORMAT_DOWNLOAD_RATE', 4 * 1024 * 1024))
+TRANSCODE_RATE = float(os.environ.get('NEOBYTE_FORMAT_TRANSCODE_RATE', 1024 * 1024))
+# A merge waits for both streams before ffmpeg can start, so nothing can be relayed early
+MERGE_SECONDS = float(os.environ.get('NEOBYTE_FORMAT_MERGE_SECONDS', 5))
+
+# Video is delivered as .mp4; audio in these containers merges into it without re-encoding
+VIDEO_CONTAINER = 'mp4'
+MERGEABLE_AUDIO = ('m4a', 'mp4')
+
+# Typical bitrates (kbit/s) by height and a typical length, for formats that report no size
+TYPICAL_KBPS = {144: 100, 240: 250, 360: 500, 480: 1000, 720: 2500, 1080: 4500, 1440: 9000, 2160: 18000}
+TYPICAL_DURATION = 300
+
+_RESOLUTION = re.compile(r'^(\d{2,4})(?:p\d*)?$')
+_SIZE = re.compile(r'([\d.]+)\s*([KMG]?i?B)', re.IGNORECASE)
+_SIZE_UNITS = {'b': 1, 'kb': 1000, 'kib': 1024, 'mb': 1000 ** 2, 'mib': 1024 ** 2, 'gb': 1000 ** 3, 'gib': 1024 ** 3}
+
+
+def target_height(resolution):
+    """Height cap for a resolution label: None for 'highest' (or anything unrecognised), 0 for 'lowest'"""
+    if resolution == 'lowest':
+        return 0
+    match = _RESOLUTION.match(str(resolution or '').strip().lower())
+    return int(match.group(1)) if match else None
+
+
+def resolution_label(resolution):
+    """Canonical label ('highest', 'lowest' or '720p') so equivalent requests share a cache key"""
+    height = target_height(resolution)
+    return 'highest' if height is None else 'lowest' if height == 0 else f"{height}p"
+
+
+def typical_size(height, duration=None):
+    kbps = TYPICAL_KBPS[min(TYPICAL_KBPS, key=lambda h: abs(h - (height or 360)))]
+    return kbps * 125 * (duration or TYPICAL_DURATION)
+
+
+def parse_size(text):
+    """Bytes from a label such as '12.3 MB'; None when there is no size in it"""
+    match = _SIZE.search(text or '')
+    if not match:
+        return None
+    try:
+        return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()])
+    except (ValueError, KeyError):
+        return None
+
+
+class Candidate:
+    """One way to deliver a video: a single progressive file, or a video stream plus an audio stream to merge"""
+
+    def __init__(self, source, height, size=None, merge=False, transcode=False, audio=None, duration=None):
+        self.source = source
+        self.height = height
+        self.size = size
+        self.duration = duration
+        self.merge = merge
+        self.transcode = transcode
+        self.audio = audio
+
+    def cost(self):
+        """Estimated seconds to get this candidate to the client as an .mp4"""
+        size = self.size or typical_size(self.height, self.duration)
+        seconds = size / DOWNLOAD_RATE
+        if self.merge:
+            seconds += MERGE_SECONDS
+        if self.transcode:
+            seconds += size / TRANSCODE_RATE
+        return seconds
+
+    def __repr__(self):
+        kind = 'merge' if self.merge else 'progressive'
+        return f"Candidate({self.height}p {kind}, {self.size or 'unknown'} bytes, cost {self.cost():.1f}s)"
+
+
+def choose(candidates, resolution):
+    """Cheapest candidate at the resolution the request can get
+
+    Candidates that would need converting to reach an .mp4 are only considered
+    when there is nothing else, since no backend converts video. The
+    resolution to aim for is the highest available at or below the requested
+    cap (the lowest available for 'lowest', or when everything is above the
+    cap). A single mp4 file at that height always beats a video/audio pair,
+    however the estimates compare, since it needs no second fetch or merge;
+    otherwise the cheapest candidate wins.
+    """
+    candidates = [c for c in candidates if c.height]
+    if not candidates:
+        return None
+    candidates = [c for c in candidates if not c.transcode] or candidates
+    target = target_height(resolution)
+    heights = {c.height for c in candidates}
+    allowed = [h for h in heights if target is None or h <= target]
+    wanted = min(heights) if target == 0 or not allowed else max(allowed)
+    at_height = [c for c in candidates if c.height == wanted]
+    progressive = [c for c in at_height if c.audio is None and not c.transcode]
+    return min(progressive or at_height, key=Candidate.cost)
+
+
+def _ytdlp_size(fmt, duration=None):
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if not size and fmt.get('tbr') and duration:
+        size = fmt['tbr'] * 125 * duration
+    return size
+
+
+def ytdlp_duration(formats):
+    """Media length implied by a format reporting both a size and a bitrate
+
+    Format selectors only see the formats, not the info dict's duration.
+    """
+    for fmt in formats:
+        size = fmt.get('filesize') or fmt.get('filesize_approx')
+        if size and fmt.get('tbr'):
+            return size / (fmt['tbr'] * 125)
+    return None
+
+
+def ytdlp_candidates(formats, can_merge=True, duration=None):
+    """Candidates from yt-dlp format dicts; video-only formats are paired with the best fitting audio
+
+    Formats without a size are estimated from their bitrate over duration
+    (inferred from the other formats when not given).
+    """
+    duration = duration or ytdlp_duration(formats)
+    videos = [f for f in formats if f.get('vcodec') != 'none' and f.get('height')]
+    audios = [f for f in formats if f.get('vcodec') == 'none' and f.get('acodec') not in (None, 'none')]
+    candidates = []
+    for fmt in videos:
+        # Segmented (HLS/DASH) downloads are joined afterwards and cannot be relayed while they run
+        segmented = fmt.get('protocol') not in (None, 'http', 'https')
+        if fmt.get('acodec') != 'none':
+            candidates.append(Candidate(
+                fmt, fmt['height'], _ytdlp_size(fmt, duration), merge=segmented,
+                transcode=fmt.get('ext') != VIDEO_CONTAINER, duration=duration
+            ))
+        elif can_merge and audios:
+            fitting = [a for a in audios if a.get('ext') in MERGEABLE_AUDIO] or audios
+            # Audio quality is not what is being traded, so take the best track that fits
+            audio = max(fitting, key=lambda a: a.get('abr') or a.get('tbr') or 0)
+            video_size = _ytdlp_size(fmt, duration) or typical_size(fmt['height'], duration)
+            audio_size = _ytdlp_size(audio, duration) or 0
+            candidates.append(Candidate(
+                fmt, fmt['height'], video_size + audio_size, merge=True,
+                transcode=fmt.get('ext') != VIDEO_CONTAINER or audio.get('ext') not in MERGEABLE_AUDIO,
+                audio=audio, duration=duration
+            ))
+    return candidates
+
+
+class YtdlpSelector:
+    """Callable for yt-dlp's 'format' option that picks with choose() instead of a format string
+
+    The profile pool binds it to the YoutubeDL instance running the job,
+    which builds the merged format when video and audio come separately. An
+    unbound selector only picks single files.
+    """
+
+    def __init__(self, resolution, ydl=None, can_merge=False):
+        self.resolution = resolution_label(resolution)
+        self.ydl = ydl
+        self.can_merge = can_merge and ydl is not None
+
+    def bind(self, ydl, can_merge=True):
+        return YtdlpSelector(self.resolution, ydl, can_merge)
+
+    def __call__(self, ctx):
+        formats = ctx['formats']
+        chosen = choose(ytdlp_candidates(formats, self.can_merge), self.resolution)
+        if chosen is None:
+            # Nothing with a known height (e.g. audio-only posts); yt-dlp sorts best last
+            if formats:
+                yield formats[-1]
+        elif chosen.audio is None:
+            yield chosen.source
+        else:
+            yield from self.ydl.build_format_selector(f"{chosen.source['format_id']}+{chosen.audio['format_id']}")(ctx)
+
+    def __repr__(self):
+        return f"YtdlpSelector({self.resolution!r})"
+
+
+def pytube_candidates(streams):
+    """Candidates from pytube streams; pytube cannot merge, so only progressive streams qualify"""
+    candidates = []
+    for stream in streams.filter(progressive=True):
+        height = target_height(stream.resolution)
+        if height:
+            candidates.append(Candidate(
+                stream, height, stream.filesize_approx,
+                transcode=stream.subtype != VIDEO_CONTAINER
+            ))
+    return candidates
+
+
+def scraped_candidates(formats):
+    """Candidates from the download site's format list ({'quality': '720p', 'format': 'MP4', 'size': '12 MB'})"""
+    candidates = []
+    for fmt in formats:
+        height = target_height(fmt.get('quality', '').split(' ')[0])
+        if height:
+            candidates.append(Candidate(
+                fmt, height, parse_size(fmt.get('size')),
+                transcode=VIDEO_CONTAINER not in fmt.get('format', '').lower()
+            ))
+    return candidates
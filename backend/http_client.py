@@ -0,0 +1,105 @@
+import os
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger('neobyte')
+
+# Distinct hosts to keep keep-alive pools for
+POOL_HOSTS = int(os.environ.get('NEOBYTE_HTTP_POOL_HOSTS', 16))
+# Connections per host; sized for job workers times download segments
+POOL_PER_HOST = int(os.environ.get('NEOBYTE_HTTP_POOL_PER_HOST', 32))
+CONNECT_TIMEOUT = float(os.environ.get('NEOBYTE_HTTP_CONNECT_TIMEOUT', 10))
+READ_TIMEOUT = float(os.environ.get('NEOBYTE_HTTP_READ_TIMEOUT', 60))
+RETRIES = int(os.environ.get('NEOBYTE_HTTP_RETRIES', 3))
+BACKOFF_FACTOR = float(os.environ.get('NEOBYTE_HTTP_BACKOFF', 0.5))
+# Longest a server's Retry-After may hold up a retry; longer values are cut to this
+MAX_RETRY_AFTER = float(os.environ.get('NEOBYTE_HTTP_MAX_RETRY_AFTER', 10))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+
+class PooledSession(requests.Session):
+    """requests.Session that always applies a timeout, so a stalled CDN cannot hang a worker"""
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', TIMEOUT)
+        return super().request(method, url, **kwargs)
+
+
+class BoundedRetry(Retry):
+    """Retry that honours Retry-After only up to MAX_RETRY_AFTER seconds"""
+
+    def get_retry_after(self, response):
+        retry_after = super().get_retry_after(response)
+        return None if retry_after is None else min(retry_after, MAX_RETRY_AFTER)
+
+
+def build_session(pool_hosts=POOL_HOSTS, pool_per_host=POOL_PER_HOST, retries=RETRIES):
+    """Create a keep-alive session with bounded per-host pools and retry with backoff"""
+    retry = BoundedRetry(
+        total=retries,
+        connect=retries,
+        read=retries,
+        status=retries,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    # Streamed responses hold their connection for a whole client transfer, and the
+    # wait for a free pooled connection has no timeout, so never block on the pool:
+    # past pool_per_host a request opens an extra connection that is closed after use
+    adapter = HTTPAdapter(
+        pool_connections=pool_hosts,
+        pool_maxsize=pool_per_host,
+        max_retries=retry,
+        pool_block=False,
+    )
+    s = PooledSession()
+    s.mount('http://', adapter)
+    s.mount('https://', adapter)
+    return s
+
+
+def browser_headers(driver):
+    """Copy the scraping browser's identity and cookies so media fetches look like the same client
+
+    Cookies go into the shared session's jar (scoped to their own domains);
+    the returned headers should be passed with requests for links found on
+    the page.
+    """
+    headers = {}
+    try:
+        headers['User-Agent'] = driver.execute_script("return navigator.userAgent")
+        headers['Referer'] = driver.current_url
+        for cookie in driver.get_cookies():
+            session.cookies.set(
+                cookie['name'],
+                cookie['value'],
+                domain=cookie.get('domain', ''),
+                path=cookie.get('path', '/'),
+            )
+    except Exception as e:
+        logger.warning(f"Could not copy browser headers: {str(e)}")
+    return {k: v for k, v in headers.items() if v}
+
+
+def stats():
+    """Shared HTTP client settings and how many hosts have open pools"""
+    hosts = set()
+    for adapter in set(session.adapters.values()):
+        hosts.update(key.key_host for key in list(adapter.poolmanager.pools.keys()))
+    return {
+        "hosts": len(hosts),
+        "pool_hosts": POOL_HOSTS,
+        "pool_per_host": POOL_PER_HOST,
+        "timeout": list(TIMEOUT),
+        "retries": RETRIES,
+        "max_retry_after": MAX_RETRY_AFTER,
+    }
+
+
+session = build_session()
@@ -0,0 +1,131 @@
+import os
+import time
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from downloads import DownloadError
+import workspace
+
+logger = logging.getLogger('neobyte')
+
+WORKERS = int(os.environ.get('NEOBYTE_JOB_WORKERS', 4))
+# Jobs waiting beyond this are rejected instead of queueing without bound
+QUEUE_LIMIT = int(os.environ.get('NEOBYTE_JOB_QUEUE_LIMIT', 64))
+# How long a finished job and its artifact stay fetchable
+RETENTION = float(os.environ.get('NEOBYTE_JOB_RETENTION', 3600))
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+
+
+class QueueFull(Exception):
+    """Raised when the job queue is at capacity"""
+
+
+class Job:
+    """State of one submitted download"""
+
+    def __init__(self, platform):
+        self.id = str(uuid.uuid4())
+        self.platform = platform
+        self.status = QUEUED
+        self.work_dir = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.artifact = None
+        self.error = None
+        self.status_code = None
+
+    def to_dict(self):
+        data = {
+            'job_id': self.id,
+            'platform': self.platform,
+            'status': self.status,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+        }
+        if self.artifact:
+            data['filename'] = self.artifact.download_name
+            data['size'] = os.path.getsize(self.artifact.path) if os.path.exists(self.artifact.path) else None
+        if self.error:
+            data['error'] = self.error
+        return data
+
+
+class JobManager:
+    """Runs download jobs on a bounded worker pool off the request threads"""
+
+    def __init__(self, workers=WORKERS, queue_limit=QUEUE_LIMIT, retention=RETENTION):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='neobyte-job')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, platform, fn, *args, **kwargs):
+        """Queue fn(work_dir, job_id, *args, **kwargs), which must return an Artifact"""
+        self.prune()
+        job = Job(platform)
+        with self._lock:
+            pending = sum(1 for j in self._jobs.values() if j.status in (QUEUED, RUNNING))
+            if pending >= self.queue_limit:
+                raise QueueFull(f"{pending} jobs already pending")
+            self._jobs[job.id] = job
+        job.work_dir = workspace.create(job.id)
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        logger.info(f"Queued {platform} job {job.id}")
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = RUNNING
+        job.started_at = time.time()
+        try:
+            job.artifact = fn(job.work_dir, job.id, *args, **kwargs)
+            job.status = FINISHED
+            logger.info(f"Job {job.id} finished: {job.artifact.download_name}")
+        except DownloadError as e:
+            job.error = e.message
+            job.status_code = e.status_code
+            job.status = FAILED
+            logger.error(f"Job {job.id} failed: {e.message}")
+        except Exception as e:
+            job.error = str(e)
+            job.status_code = 500
+            job.status = FAILED
+            logger.error(f"Job {job.id} failed: {str(e)}")
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def prune(self):
+        """Forget finished jobs past their retention and delete their files"""
+        cutoff = time.time() - self.retention
+        with self._lock:
+            expired = [j for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            workspace.release(job.work_dir)
+
+    def stats(self):
+        with self._lock:
+            counts = {QUEUED: 0, RUNNING: 0, FINISHED: 0, FAILED: 0}
+            for job in self._jobs.values():
+                counts[job.status] += 1
+        counts['workers'] = self.workers
+        counts['queue_limit'] = self.queue_limit
+        return counts
+
+
+manager = JobManager()
+# Let the janitor expire finished jobs even when no new jobs are submitted
+workspace.register_hook(manager.prune)
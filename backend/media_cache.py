@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import workspace
+
+logger = logging.getLogger('neobyte')
+
+CACHE_DIR = os.environ.get('NEOBYTE_MEDIA_CACHE_DIR', os.path.join(os.getcwd(), 'media_cache'))
+# Total bytes of cached media to keep; 0 disables the cache
+BUDGET_BYTES = int(os.environ.get('NEOBYTE_MEDIA_CACHE_BYTES', 20 * 1024 ** 3))
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class CachedMedia:
+    """A cache hit: the stored file and the name to deliver it as"""
+
+    def __init__(self, path, download_name):
+        self.path = path
+        self.download_name = download_name
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _copy_with_digest(src_path, dst_path):
+    digest = hashlib.sha256()
+    with open(src_path, 'rb') as src, open(dst_path, 'wb') as dst:
+        while True:
+            chunk = src.read(COPY_CHUNK_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+            dst.write(chunk)
+        dst.flush()
+        os.fsync(dst.fileno())
+    return digest.hexdigest()
+
+
+def cache_key(request_key):
+    """Flatten a (platform, media_id, *format params) key into the index key"""
+    if request_key is None:
+        return None
+    return '|'.join(str(part) for part in request_key)
+
+
+class MediaCache:
+    """Content-addressed store of finished downloads, evicted LRU within a byte budget
+
+    Files live under objects/<hash[:2]>/<sha256><ext>; index.json maps each
+    request key to its object and survives restarts. Writes go to a temp file
+    and are renamed into place, so a crash never leaves a partial object.
+    """
+
+    def __init__(self, root=CACHE_DIR, budget_bytes=BUDGET_BYTES):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.index_path = os.path.join(root, 'index.json')
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._filler = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if self.enabled:
+            self._load()
+
+    def relocate(self, root, budget_bytes):
+        """Switch to another cache directory and budget, e.g. a per-worker one after fork"""
+        with self._lock:
+            self.root = root
+            self.budget_bytes = budget_bytes
+            self.index_path = os.path.join(root, 'index.json')
+            self._entries = {}
+            self._dirty = False
+        if self.enabled:
+            self._load()
+
+    @property
+    def enabled(self):
+        return self.budget_bytes > 0
+
+    def _object_path(self, digest, ext):
+        return os.path.join(self.root, 'objects', digest[:2], f"{digest}{ext}")
+
+    def _load(self):
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            entries = {}
+        except Exception as e:
+            logger.error(f"Media cache index unreadable, starting empty: {str(e)}")
+            entries = {}
+        # Drop entries whose object disappeared while we were down
+        self._entries = {
+            key: entry for key, entry in entries.items()
+            if os.path.exists(self._object_path(entry['hash'], entry['ext']))
+        }
+        self._remove_unreferenced()
+        logger.info(f"Loaded media cache index with {len(self._entries)} entries")
+
+    def _remove_unreferenced(self):
+        """Delete objects and partial writes the index does not know about, which no budget would ever count"""
+        referenced = {self._object_path(entry['hash'], entry['ext']) for entry in self._entries.values()}
+        removed = 0
+        for directory in (os.path.join(self.root, 'objects'), os.path.join(self.root, 'tmp')):
+            for dirpath, _, filenames in os.walk(directory):
+                for name in filenames:
+                    path = os.path.join(dirpath, name)
+                    if path in referenced:
+                        continue
+                    try:
+                        os.remove(path)
+                        removed += 1
+                    except OSError as e:
+                        logger.warning(f"Could not remove unreferenced cache object: {str(e)}")
+        if removed:
+            logger.info(f"Removed {removed} unreferenced media cache files")
+
+    def _save_locked(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.index_path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.index_path)
+        self._dirty = False
+
+    def flush(self):
+        """Persist access times recorded since the last write"""
+        with self._lock:
+            if self._dirty:
+                self._save_locked()
+
+    def get(self, key):
+        if not self.enabled or key is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                path = self._object_path(entry['hash'], entry['ext'])
+                if os.path.exists(path):
+                    entry['last_access'] = time.time()
+                    self._dirty = True
+                    self.hits += 1
+                    return CachedMedia(path, entry['download_name'])
+                del self._entries[key]
+                self._dirty = True
+            self.misses += 1
+        return None
+
+    def put(self, key, src_path, download_name):
+        """Store a finished download under its content hash, hard-linking it when possible"""
+        if not self.enabled or key is None or not os.path.exists(src_path):
+            return None
+        size = os.path.getsize(src_path)
+        if size > self.budget_bytes:
+            return None
+
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        tmp_path = os.path.join(tmp_dir, uuid.uuid4().hex)
+        try:
+            try:
+                # Same filesystem: share the download's inode instead of copying its bytes
+                os.link(src_path, tmp_path)
+            except OSError:
+                digest = _copy_with_digest(src_path, tmp_path)
+            else:
+                digest = _file_digest(tmp_path)
+
+            ext = os.path.splitext(download_name)[1] or os.path.splitext(src_path)[1]
+            object_path = self._object_path(digest, ext)
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            if os.path.exists(object_path):
+                # Same bytes already stored under another key
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, object_path)
+        except Exception as e:
+            logger.error(f"Error adding {download_name} to media cache: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+
+        with self._lock:
+            self._entries[key] = {
+                'hash': digest,
+                'ext': ext,
+                'size': size,
+                'download_name': download_name,
+                'last_access': time.time(),
+            }
+            self._evict_locked()
+            self._save_locked()
+        logger.info(f"Cached {download_name} ({size} bytes)")
+        return CachedMedia(object_path, download_name)
+
+    def put_later(self, key, src_path, download_name, then=None):
+        """put() on a background thread, so a request thread never waits on hashing a large file
+
+        then() runs once the source file is no longer needed, e.g. to remove
+        the workspace holding it. Fills run one at a time.
+        """
+        if not self.enabled or key is None:
+            if then:
+                then()
+            return
+
+        def fill():
+            try:
+                self.put(key, src_path, download_name)
+            except Exception as e:
+                logger.error(f"Error filling media cache: {str(e)}")
+            finally:
+                if then:
+                    then()
+
+        with self._lock:
+            if self._filler is None:
+                self._filler = ThreadPoolExecutor(max_workers=1, thread_name_prefix='neobyte-media-cache')
+            filler = self._filler
+        filler.submit(fill)
+
+    def _object_sizes_locked(self):
+        # Several keys may share one object; count its bytes once
+        objects = {}
+        for entry in self._entries.values():
+            objects[(entry['hash'], entry['ext'])] = entry['size']
+        return objects
+
+    def _evict_locked(self):
+        objects = self._object_sizes_locked()
+        total = sum(objects.values())
+        for key, entry in sorted(self._entries.items(), key=lambda item: item[1]['last_access']):
+            if total <= self.budget_bytes:
+                break
+            del self._entries[key]
+            self.evictions += 1
+            obj = (entry['hash'], entry['ext'])
+            if any((e['hash'], e['ext']) == obj for e in self._entries.values()):
+                continue
+            total -= objects[obj]
+            try:
+                os.remove(self._object_path(*obj))
+            except OSError as e:
+                logger.warning(f"Could not remove evicted cache object: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": sum(self._object_sizes_locked().values()),
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+cache = MediaCache()
+# Persist access times periodically rather than on every hit
+workspace.register_hook(cache.flush)
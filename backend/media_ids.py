@@ -0,0 +1,99 @@
+import re
+from urllib.parse import urlparse, parse_qs
+
+YOUTUBE_HOSTS = {
+    'youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com',
+    'youtube-nocookie.com', 'www.youtube-nocookie.com',
+}
+INSTAGRAM_HOSTS = {'instagram.com', 'www.instagram.com', 'm.instagram.com', 'instagr.am', 'www.instagr.am'}
+TWITTER_HOSTS = {
+    'twitter.com', 'www.twitter.com', 'mobile.twitter.com',
+    'x.com', 'www.x.com', 'mobile.x.com',
+}
+
+YOUTUBE_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+# Path prefixes that carry the video ID as the next path segment
+YOUTUBE_PATH_PREFIXES = ('embed', 'v', 'shorts', 'live', 'e')
+INSTAGRAM_PATH_PREFIXES = ('p', 'reel', 'reels', 'tv')
+
+
+def _parse(url):
+    url = (url or '').strip()
+    if '://' not in url:
+        url = f"https://{url}"
+    parsed = urlparse(url)
+    return parsed, parsed.netloc.lower().split(':')[0], [p for p in parsed.path.split('/') if p]
+
+
+def youtube_id(url):
+    """Extract a YouTube video ID from watch, short, shorts, embed, live and mobile URLs"""
+    parsed, host, parts = _parse(url)
+
+    if host in ('youtu.be', 'www.youtu.be'):
+        candidate = parts[0] if parts else None
+    elif host in YOUTUBE_HOSTS:
+        if parts and parts[0] == 'watch':
+            candidate = parse_qs(parsed.query).get('v', [None])[0]
+        elif len(parts) >= 2 and parts[0] in YOUTUBE_PATH_PREFIXES:
+            candidate = parts[1]
+        else:
+            candidate = None
+    else:
+        return None
+
+    if candidate and YOUTUBE_ID_RE.match(candidate):
+        return candidate
+    return None
+
+
+def instagram_id(url):
+    """Extract an Instagram post/reel shortcode, or a story ID"""
+    parsed, host, parts = _parse(url)
+    if host not in INSTAGRAM_HOSTS:
+        return None
+
+    if len(parts) >= 2 and parts[0] in INSTAGRAM_PATH_PREFIXES:
+        return parts[1]
+    # /<user>/p/<code>/ and /<user>/reel/<code>/
+    if len(parts) >= 3 and parts[1] in INSTAGRAM_PATH_PREFIXES:
+        return parts[2]
+    # /stories/<user>/<story id>/
+    if len(parts) >= 3 and parts[0] == 'stories':
+        return f"story_{parts[2]}"
+    return None
+
+
+def twitter_id(url):
+    """Extract a tweet status ID from twitter.com or x.com URLs"""
+    parsed, host, parts = _parse(url)
+    if host not in TWITTER_HOSTS:
+        return None
+
+    for i, part in enumerate(parts[:-1]):
+        if part in ('status', 'statuses') and parts[i + 1].isdigit():
+            return parts[i + 1]
+    return None
+
+
+def canonical_media_id(url):
+    """Normalize a media URL to a platform-qualified ID such as 'youtube:dQw4w9WgXcQ'
+
+    Returns None when the URL is not a single recognizable media item.
+    """
+    for platform, extractor in (('youtube', youtube_id), ('instagram', instagram_id), ('twitter', twitter_id)):
+        media_id = extractor(url)
+        if media_id:
+            return f"{platform}:{media_id}"
+    return None
+
+
+def platform(url):
+    """Name the platform a URL belongs to, including playlist and profile URLs"""
+    _, host, _ = _parse(url)
+    if host in YOUTUBE_HOSTS or host in ('youtu.be', 'www.youtu.be'):
+        return 'youtube'
+    if host in INSTAGRAM_HOSTS:
+        return 'instagram'
+    if host in TWITTER_HOSTS:
+        return 'twitter'
+    return None
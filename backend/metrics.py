@@ -0,0 +1,294 @@
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger('neobyte')
+
+# Seconds; spans quick cache hits up to multi-minute downloads
+DEFAULT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+_local = threading.local()
+_metrics = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _key(self, labels):
+        # Labels the caller leaves out fall back to the current stage context, then 'none'
+        context = current_labels()
+        return tuple(str(labels.get(name, context.get(name, 'none'))) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def _render_sample(self, key, value):
+        counts, total = value
+        lines = [
+            f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', _format_value(bound))])} {count}"
+            for bound, count in zip(self.buckets, counts)
+        ]
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {counts[-1]}")
+        return lines
+
+
+STAGE_SECONDS = Histogram(
+    'neobyte_stage_duration_seconds',
+    'Time spent in each pipeline stage',
+    ('stage', 'platform', 'backend', 'outcome'),
+)
+STAGES_IN_FLIGHT = Gauge(
+    'neobyte_stages_in_flight',
+    'Pipeline stages currently running',
+    ('stage', 'platform', 'backend'),
+)
+BACKEND_ATTEMPTS = Counter(
+    'neobyte_backend_attempts_total',
+    'Download attempts per backend and outcome',
+    ('platform', 'backend', 'outcome'),
+)
+TRANSFER_BYTES = Counter(
+    'neobyte_transfer_bytes_total',
+    'Bytes fetched from upstream or sent to clients',
+    ('direction',),
+)
+HTTP_REQUESTS = Counter(
+    'neobyte_http_requests_total',
+    'HTTP requests by route, method and status',
+    ('route', 'method', 'status'),
+)
+HTTP_IN_FLIGHT = Gauge(
+    'neobyte_http_requests_in_flight',
+    'Requests being handled, including response bodies still streaming',
+)
+
+
+def current_labels():
+    return getattr(_local, 'labels', {})
+
+
+def bind(labels):
+    """Adopt another thread's labels; used where work moves to a helper thread"""
+    _local.labels = dict(labels)
+
+
+@contextmanager
+def context(**labels):
+    """Tag stages observed in this thread (e.g. platform and backend) until the block exits
+
+    Besides labels the context may carry a 'trace' that collects the same
+    stage timings and byte counts for a single request's log line.
+    """
+    previous = current_labels()
+    _local.labels = dict(previous, **labels)
+    try:
+        yield
+    finally:
+        _local.labels = previous
+
+
+@contextmanager
+def stage(name, **labels):
+    """Time a pipeline stage into neobyte_stage_duration_seconds"""
+    start = time.monotonic()
+    outcome = 'error'
+    STAGES_IN_FLIGHT.inc(stage=name, **labels)
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        STAGES_IN_FLIGHT.dec(stage=name, **labels)
+        observe_stage(name, time.monotonic() - start, outcome, **labels)
+
+
+def observe_stage(name, seconds, outcome, **labels):
+    """Record a stage timed by the caller, e.g. one that cannot be wrapped in a with block"""
+    STAGE_SECONDS.observe(seconds, stage=name, outcome=outcome, **labels)
+    trace = current_labels().get('trace')
+    if trace is not None:
+        trace.add_stage(name, seconds, labels)
+
+
+def add_bytes(direction, amount):
+    if amount:
+        TRANSFER_BYTES.inc(amount, direction=direction)
+        trace = current_labels().get('trace')
+        if trace is not None:
+            trace.add_bytes(direction, amount)
+
+
+def register_stats(prefix, fn):
+    """Expose every numeric value of a stats() dict as a neobyte_<prefix>_<key> gauge, and the dict on /status"""
+    _collectors.append((prefix, fn))
+
+
+def collected_stats():
+    """Every registered stats() dict by prefix, nested values included"""
+    result = {}
+    for prefix, fn in _collectors:
+        try:
+            result[prefix] = fn()
+        except Exception as e:
+            logger.warning(f"Error collecting {prefix} stats: {str(e)}")
+            result[prefix] = {"error": str(e)}
+    return result
+
+
+def _collect_stats():
+    lines = []
+    for prefix, fn in _collectors:
+        try:
+            stats = fn()
+        except Exception as e:
+            logger.warning(f"Error collecting {prefix} stats: {str(e)}")
+            continue
+        for key, value in sorted(stats.items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = f"neobyte_{prefix}_{key}"
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {_format_value(value)}")
+    return lines
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    lines.extend(_collect_stats())
+    return '\n'.join(lines) + '\n'
+
+
+class WSGIMiddleware:
+    """Times response bodies until the server closes them and counts the bytes sent
+
+    Flask's own hooks fire before a streamed body is sent, so the client_send
+    stage and client byte counts are measured here instead.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        status_holder = {}
+
+        def capture(status, headers, exc_info=None):
+            status_holder['status'] = status.split(' ', 1)[0]
+            status_holder['length'] = next((v for k, v in headers if k.lower() == 'content-length'), None)
+            return start_response(status, headers, exc_info)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            body = self.app(environ, capture)
+        except Exception:
+            HTTP_IN_FLIGHT.dec()
+            raise
+
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None and isinstance(body, file_wrapper):
+            # Keep the server's sendfile path; count the declared length instead of timing the send
+            HTTP_IN_FLIGHT.dec()
+            self._record(environ, status_holder)
+            length = status_holder.get('length')
+            add_bytes('client', int(length) if length and length.isdigit() else 0)
+            return body
+        return self._wrap(body, environ, status_holder)
+
+    def _record(self, environ, status_holder):
+        route = environ.get('neobyte.route', 'unmatched')
+        HTTP_REQUESTS.inc(route=route, method=environ.get('REQUEST_METHOD'), status=status_holder.get('status', '000'))
+        return route
+
+    def _wrap(self, body, environ, status_holder):
+        start = time.monotonic()
+        sent = 0
+        outcome = 'error'
+        try:
+            for chunk in body:
+                sent += len(chunk)
+                yield chunk
+            outcome = 'ok'
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+            HTTP_IN_FLIGHT.dec()
+            self._record(environ, status_holder)
+            # The route is already on neobyte_http_requests_total; the platform is whatever the handler tagged
+            observe_stage('client_send', time.monotonic() - start, outcome,
+                          platform=environ.get('neobyte.platform', 'none'), backend='none')
+            add_bytes('client', sent)
@@ -0,0 +1,300 @@
+import os
+import re
+import json
+import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import metrics
+import startup
+
+logger = logging.getLogger('neobyte.requests')
+
+# Where log lines go; '-' writes to stderr instead of a file
+LOG_FILE = os.environ.get('NEOBYTE_LOG_FILE', 'neobyte.log')
+# Production runs at INFO or WARNING; DEBUG also turns on yt-dlp's verbose output
+LOG_LEVEL = logging.getLevelName(os.environ.get('NEOBYTE_LOG_LEVEL', 'INFO').upper())
+if not isinstance(LOG_LEVEL, int):
+    LOG_LEVEL = logging.INFO
+MAX_BYTES = int(os.environ.get('NEOBYTE_LOG_MAX_BYTES', 10 * 1024 * 1024))
+BACKUP_COUNT = int(os.environ.get('NEOBYTE_LOG_BACKUPS', 5))
+YTDLP_VERBOSE = LOG_LEVEL <= logging.DEBUG
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Incoming IDs are reused so a proxy's ID follows the request; anything else is replaced
+_VALID_REQUEST_ID = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+# Libraries that log every connection or request at INFO
+NOISY_LOGGERS = ('werkzeug', 'urllib3', 'selenium', 'WDM')
+
+_listener = None
+_handler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; the request summary adds its fields at the top level"""
+
+    def format(self, record):
+        entry = {
+            "time": time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, 'request_id', None),
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _ContextFilter(logging.Filter):
+    """Stamp records with the request ID while still on the thread that logged them"""
+
+    def filter(self, record):
+        trace = current()
+        record.request_id = trace.request_id if trace else None
+        return True
+
+
+class YtdlpLogger:
+    """Routes yt-dlp's output into our logs; its debug chatter only shows at DEBUG"""
+
+    def __init__(self):
+        self.logger = logging.getLogger('yt_dlp')
+
+    def debug(self, msg):
+        self.logger.debug(msg)
+
+    def info(self, msg):
+        self.logger.debug(msg)
+
+    def warning(self, msg):
+        self.logger.warning(msg)
+
+    def error(self, msg):
+        self.logger.error(msg)
+
+
+ytdlp_logger = YtdlpLogger()
+
+
+class SharedRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler for a file several worker processes append to
+
+    Whichever process sees the file reach MAX_BYTES rotates it while holding
+    an exclusive lock on <file>.lock, so backups are shifted once. The others
+    notice the file was moved, as WatchedFileHandler does, and reopen it.
+    """
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, **kwargs)
+        self._identity = None
+
+    def _open(self):
+        stream = super()._open()
+        stat = os.fstat(stream.fileno())
+        self._identity = (stat.st_dev, stat.st_ino)
+        return stream
+
+    def _reopen_if_moved(self):
+        if self.stream is None:
+            return
+        try:
+            stat = os.stat(self.baseFilename)
+            moved = (stat.st_dev, stat.st_ino) != self._identity
+        except FileNotFoundError:
+            moved = True
+        if moved:
+            self.stream.close()
+            self.stream = None
+
+    def emit(self, record):
+        self._reopen_if_moved()
+        super().emit(record)
+
+    def doRollover(self):
+        import fcntl
+
+        with open(f"{self.baseFilename}.lock", 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Another process may have rotated while this one waited for the lock
+            self._reopen_if_moved()
+            try:
+                size = os.path.getsize(self.baseFilename)
+            except FileNotFoundError:
+                size = 0
+            if size >= self.maxBytes:
+                super().doRollover()
+            elif self.stream is None:
+                self.stream = self._open()
+
+
+def configure():
+    """Send all logging through a queue to a background thread that writes rotating JSON lines
+
+    Request threads only enqueue records, so a slow disk never holds up a download.
+    """
+    global _handler
+    if _handler is not None:
+        return
+    if LOG_FILE == '-':
+        output = logging.StreamHandler()
+    else:
+        output = _file_handler()
+
+    _handler = QueueHandler(queue.SimpleQueue())
+    _handler.addFilter(_ContextFilter())
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_handler)
+    for name in NOISY_LOGGERS:
+        logging.getLogger(name).setLevel(max(LOG_LEVEL, logging.WARNING))
+
+    _start_listener(output)
+    # Flush what is still queued on shutdown
+    atexit.register(lambda: _listener.stop())
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_after_fork)
+
+
+def _file_handler():
+    return SharedRotatingFileHandler(LOG_FILE, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, encoding='utf-8', delay=True)
+
+
+def _start_listener(output):
+    global _listener
+    output.setFormatter(JsonFormatter())
+    _listener = QueueListener(_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def _after_fork():
+    """The writer thread does not survive fork, so a preforked worker starts its own
+
+    Several processes now append to the same file; SharedRotatingFileHandler
+    lets whichever of them fills it rotate it for all.
+    """
+    _handler.queue = queue.SimpleQueue()
+    if LOG_FILE == '-':
+        output = logging.StreamHandler()
+    else:
+        output = _file_handler()
+    _start_listener(output)
+
+
+def current():
+    """The trace of the request the current thread is working for, if any"""
+    return metrics.current_labels().get('trace')
+
+
+class RequestTrace:
+    """Collects backend attempts, stage timings and byte counts for one request
+
+    Bound into the metrics context, so helper threads that adopt the
+    request's labels (segment workers, live downloads, hedged attempts)
+    report into the same trace.
+    """
+
+    def __init__(self, request_id, environ):
+        self.request_id = request_id
+        self.environ = environ
+        self.start = time.monotonic()
+        self.status = None
+        self.attempts = []
+        self.stages = {}
+        self.bytes = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, name, seconds, labels):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0) + seconds
+
+    def add_bytes(self, direction, amount):
+        with self._lock:
+            self.bytes[direction] = self.bytes.get(direction, 0) + amount
+
+    def add_attempt(self, platform, backend, ok, latency):
+        with self._lock:
+            self.attempts.append({"platform": platform, "backend": backend, "ok": ok, "seconds": round(latency, 3)})
+
+    def to_dict(self, outcome):
+        with self._lock:
+            winner = next((a for a in reversed(self.attempts) if a["ok"]), None)
+            return {
+                "method": self.environ.get('REQUEST_METHOD'),
+                "path": self.environ.get('PATH_INFO'),
+                "route": self.environ.get('neobyte.route', 'unmatched'),
+                "status": self.status,
+                "outcome": outcome,
+                "duration": round(time.monotonic() - self.start, 3),
+                "platform": winner["platform"] if winner else None,
+                "backend": winner["backend"] if winner else None,
+                "attempts": list(self.attempts),
+                "stages": {name: round(seconds, 3) for name, seconds in self.stages.items()},
+                "bytes": dict(self.bytes),
+            }
+
+
+def _request_id(environ):
+    incoming = environ.get('HTTP_X_REQUEST_ID', '')
+    return incoming if _VALID_REQUEST_ID.match(incoming) else uuid.uuid4().hex
+
+
+class WSGIMiddleware:
+    """Gives each request a correlation ID and logs one JSON summary line once its response is done
+
+    Sits outside metrics.WSGIMiddleware so the summary includes the client_send
+    stage and the bytes sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        trace = RequestTrace(_request_id(environ), environ)
+        environ['neobyte.request_id'] = trace.request_id
+        previous = metrics.current_labels()
+        metrics.bind(dict(previous, trace=trace))
+
+        def capture(status, headers, exc_info=None):
+            trace.status = int(status.split(' ', 1)[0])
+            return start_response(status, list(headers) + [(REQUEST_ID_HEADER, trace.request_id)], exc_info)
+
+        try:
+            body = self.app(environ, capture)
+        except Exception:
+            self._finish(trace, previous, 'error')
+            raise
+
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None and isinstance(body, file_wrapper):
+            # Leave sendfile bodies alone; the inner middleware has already counted their length
+            self._finish(trace, previous, 'ok')
+            return body
+        return self._wrap(body, trace, previous)
+
+    def _wrap(self, body, trace, previous):
+        # Anything that stops iteration early without an error is the client going away
+        outcome = 'aborted'
+        try:
+            for chunk in body:
+                yield chunk
+            outcome = 'ok'
+        except Exception:
+            outcome = 'error'
+            raise
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+            self._finish(trace, previous, outcome)
+
+    def _finish(self, trace, previous, outcome):
+        if outcome == 'ok' and trace.status and trace.status >= 400:
+            outcome = 'error' if trace.status >= 500 else 'rejected'
+        fields = trace.to_dict(outcome)
+        startup.first_request(fields['route'], fields['duration'])
+        logger.info(f"{fields['method']} {fields['path']} {fields['status']} {outcome}", extra={'fields': fields})
+        metrics.bind(previous)
@@ -0,0 +1,285 @@
+import os
+import time
+import logging
+import queue
+import threading
+from collections import deque
+import cancellation
+import metrics
+import request_log
+
+logger = logging.getLogger('neobyte')
+
+# Recent attempts kept per backend and platform
+WINDOW = int(os.environ.get('NEOBYTE_ROUTER_WINDOW', 50))
+# Consecutive failures that open a backend's circuit
+FAILURE_THRESHOLD = int(os.environ.get('NEOBYTE_ROUTER_FAILURE_THRESHOLD', 3))
+# How long an open circuit skips the backend before letting one trial request through
+COOLDOWN = float(os.environ.get('NEOBYTE_ROUTER_COOLDOWN', 120))
+# Seconds to wait for the first backend to start delivering media before starting the next in parallel; 0 disables hedging
+HEDGE_DELAY = float(os.environ.get('NEOBYTE_HEDGE_DELAY', 10))
+# Floor for the success rate when estimating cost, so a bad backend sorts last instead of dividing by zero
+MIN_SUCCESS_RATE = 0.05
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class AllBackendsFailed(Exception):
+    """Every backend was skipped or returned nothing"""
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class BackendHealth:
+    """Rolling outcomes and circuit breaker state for one backend on one platform"""
+
+    def __init__(self, window=WINDOW):
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    @property
+    def success_rate(self):
+        if not self.outcomes:
+            return None
+        return sum(1 for ok, _ in self.outcomes if ok) / len(self.outcomes)
+
+    def latency(self, fraction):
+        return percentile([latency for _, latency in self.outcomes], fraction)
+
+    def expected_cost(self):
+        """Seconds we expect to spend per success; 0 with no history so untried backends keep their default place"""
+        if not self.outcomes:
+            return 0
+        return self.latency(0.5) / max(self.success_rate, MIN_SUCCESS_RATE)
+
+    def available(self, now):
+        if self.state == OPEN and now - self.opened_at >= COOLDOWN:
+            self.state = HALF_OPEN
+            self.trial_in_flight = False
+        if self.state == HALF_OPEN:
+            # Only one request probes a recovering backend
+            return not self.trial_in_flight
+        return self.state == CLOSED
+
+    def record(self, ok, latency, now):
+        self.outcomes.append((ok, latency))
+        self.trial_in_flight = False
+        if ok:
+            self.consecutive_failures = 0
+            self.state = CLOSED
+            return False
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= FAILURE_THRESHOLD:
+            self.state = OPEN
+            self.opened_at = now
+            return True
+        return False
+
+    def to_dict(self):
+        return {
+            "state": self.state,
+            "samples": len(self.outcomes),
+            "success_rate": self.success_rate,
+            "latency_p50": self.latency(0.5),
+            "latency_p95": self.latency(0.95),
+            "consecutive_failures": self.consecutive_failures,
+        }
+
+
+class Router:
+    """Orders backends per platform by observed health and skips those with an open circuit"""
+
+    def __init__(self):
+        self._health = {}
+        self._lock = threading.Lock()
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def _get(self, platform, backend):
+        key = (platform, backend)
+        if key not in self._health:
+            self._health[key] = BackendHealth()
+        return self._health[key]
+
+    def order(self, platform, backends):
+        """Backends worth trying, cheapest expected cost first; the default order breaks ties"""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [b for b in backends if self._get(platform, b).available(now)]
+            return sorted(candidates, key=lambda b: self._get(platform, b).expected_cost())
+
+    def record(self, platform, backend, ok, latency):
+        metrics.BACKEND_ATTEMPTS.inc(platform=platform, backend=backend, outcome='ok' if ok else 'failed')
+        trace = request_log.current()
+        if trace is not None:
+            trace.add_attempt(platform, backend, ok, latency)
+        with self._lock:
+            opened = self._get(platform, backend).record(ok, latency, time.monotonic())
+        if opened:
+            logger.warning(f"Circuit opened for {backend} on {platform}; skipping it for {COOLDOWN:.0f}s")
+
+    def run(self, platform, attempts, is_final=None, discard=None, hedge_delay=HEDGE_DELAY):
+        """Try (name, fn) attempts in health order until one returns a result
+
+        A None result or an exception counts as a failure and moves on to the
+        next backend. is_final(error) may mark errors that are about the content
+        rather than the backend; those are not counted and stop further
+        backends from being tried, though attempts already racing are allowed
+        to finish and the error is raised only if none of them succeeds.
+        With a positive hedge_delay, a backend that has not started delivering
+        media by then gets the next one raced against it; losers are cancelled
+        and any result they still produce is passed to discard.
+        """
+        fns = dict(attempts)
+        order = self.order(platform, [name for name, _ in attempts])
+        if not order:
+            # Everything is cooling down; trying anyway beats failing without an attempt
+            order = [name for name, _ in attempts]
+        if hedge_delay > 0 and len(order) > 1:
+            return self._run_hedged(platform, order, fns, is_final, discard, hedge_delay)
+        last_error = None
+
+        for name in order:
+            with self._lock:
+                health = self._get(platform, name)
+                if health.state == HALF_OPEN:
+                    health.trial_in_flight = True
+            start = time.monotonic()
+            try:
+                with metrics.context(platform=platform, backend=name):
+                    result = fns[name]()
+            except Exception as e:
+                if is_final and is_final(e):
+                    with self._lock:
+                        health.trial_in_flight = False
+                    raise
+                self.record(platform, name, False, time.monotonic() - start)
+                logger.error(f"{name} failed for {platform}: {str(e)}")
+                last_error = e
+                continue
+            ok = result is not None
+            self.record(platform, name, ok, time.monotonic() - start)
+            if ok:
+                return result
+            logger.info(f"{name} returned nothing for {platform}, trying next backend")
+
+        if last_error is not None:
+            raise last_error
+        raise AllBackendsFailed(f"No backend could download this {platform} content")
+
+    def _run_hedged(self, platform, order, fns, is_final, discard, hedge_delay):
+        results = queue.Queue()
+        running = {}
+        pending = list(order)
+        last_error = None
+        final_error = None
+
+        def launch():
+            name = pending.pop(0)
+            token = cancellation.CancelToken()
+            running[name] = token
+            labels = dict(metrics.current_labels(), platform=platform, backend=name)
+            with self._lock:
+                health = self._get(platform, name)
+                if health.state == HALF_OPEN:
+                    health.trial_in_flight = True
+
+            def attempt():
+                cancellation.bind(token)
+                metrics.bind(labels)
+                start = time.monotonic()
+                try:
+                    results.put((name, fns[name](), None, time.monotonic() - start))
+                except Exception as e:
+                    results.put((name, None, e, time.monotonic() - start))
+
+            threading.Thread(target=attempt, name=f'neobyte-{platform}-{name}', daemon=True).start()
+
+        def abandon():
+            with self._lock:
+                for name in running:
+                    # A cancelled trial proves nothing either way, so the next request may probe again
+                    self._get(platform, name).trial_in_flight = False
+            for token in running.values():
+                token.cancel()
+            if running:
+                threading.Thread(target=self._reap, args=(results, len(running), discard), daemon=True).start()
+
+        launch()
+        while running:
+            # Hedge only while nothing running has started delivering media
+            hedging = pending and not any(t.progressing.is_set() for t in running.values())
+            try:
+                name, result, error, latency = results.get(timeout=hedge_delay if hedging else None)
+            except queue.Empty:
+                logger.info(f"No media from {', '.join(running)} for {platform} after {hedge_delay:.0f}s, hedging with {pending[0]}")
+                with self._lock:
+                    self.hedges += 1
+                launch()
+                continue
+
+            running.pop(name)
+            if error is not None and is_final and is_final(error):
+                with self._lock:
+                    self._get(platform, name).trial_in_flight = False
+                if not running:
+                    raise error
+                # Attempts already running may still get the content; start nothing new and raise only if they fail
+                logger.info(f"{name} reported a content error for {platform}, waiting for {', '.join(running)}")
+                final_error = error
+                pending.clear()
+                continue
+            ok = error is None and result is not None
+            self.record(platform, name, ok, latency)
+            if ok:
+                if name != order[0]:
+                    with self._lock:
+                        self.hedge_wins += 1
+                abandon()
+                return result
+            if error is not None:
+                logger.error(f"{name} failed for {platform}: {str(error)}")
+                last_error = error
+            else:
+                logger.info(f"{name} returned nothing for {platform}, trying next backend")
+            if not running and pending:
+                launch()
+
+        if final_error is not None:
+            raise final_error
+        if last_error is not None:
+            raise last_error
+        raise AllBackendsFailed(f"No backend could download this {platform} content")
+
+    def _reap(self, results, count, discard):
+        """Collect abandoned attempts and throw away anything they still produced"""
+        for _ in range(count):
+            name, result, error, _ = results.get()
+            if result is not None and discard:
+                logger.info(f"Discarding late result from cancelled {name} attempt")
+                discard(result)
+
+    def stats(self):
+        with self._lock:
+            result = {}
+            for (platform, backend), health in self._health.items():
+                result.setdefault(platform, {})[backend] = health.to_dict()
+            result['hedging'] = {
+                "delay": HEDGE_DELAY,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+            }
+            return result
+
+
+router = Router()
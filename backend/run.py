@@ -1,10 +1,89 @@
 """
 NeoByte Downloader - Main Entry Point
+
+    python run.py                 development server (reloader and debugger)
+    python run.py --production    preforking multi-worker server (gunicorn; Linux/macOS)
+
+Production settings are read from the environment; see "Production Deployment"
+in the top-level README.md.
 """
 
 import os
-from backend.app import app
+import sys
+
+PRODUCTION = '--production' in sys.argv[1:] or os.environ.get('NEOBYTE_SERVER') == 'production'
+
+HOST = os.environ.get('NEOBYTE_HOST', '0.0.0.0')
+PORT = int(os.environ.get('PORT', 5000))
+# Each worker runs its own browser pool and ffmpeg slots, so scale threads before workers
+WORKERS = int(os.environ.get('NEOBYTE_WORKERS', 2))
+# Requests mostly wait on upstream and client sockets, so one worker can carry many
+THREADS = int(os.environ.get('NEOBYTE_THREADS', 32))
+# Worker heartbeat timeout; with threaded workers it does not cap how long a response streams
+TIMEOUT = int(os.environ.get('NEOBYTE_TIMEOUT', 120))
+# How long in-flight downloads may run on after a reload (HUP) or shutdown (TERM)
+GRACEFUL_TIMEOUT = int(os.environ.get('NEOBYTE_GRACEFUL_TIMEOUT', 600))
+KEEPALIVE = int(os.environ.get('NEOBYTE_KEEPALIVE', 5))
+# Replace a worker after this many requests (0 = never), bounding leaks in long-lived browsers
+MAX_REQUESTS = int(os.environ.get('NEOBYTE_MAX_REQUESTS', 0))
+
+
+def serve_development():
+    import app as neobyte
+    neobyte.serve_development(HOST, PORT)
+
+
+def serve_production():
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        sys.exit("Production mode needs gunicorn (pip install -r requirements.txt), which runs on Linux and macOS")
+
+    # ffmpeg slots are per process; share the cores between workers unless set explicitly
+    os.environ.setdefault('NEOBYTE_TRANSCODE_WORKERS', str(max(1, (os.cpu_count() or 2) // WORKERS)))
+
+    # Import and warm everything once in the master; workers inherit it copy-on-write
+    import app as neobyte
+    neobyte.preload()
+
+    def post_fork(server, worker):
+        # Each worker locks its own directory slot, so a draining worker and its replacement never share one
+        neobyte.after_fork(WORKERS)
+
+    def worker_exit(server, worker):
+        neobyte.shutdown()
+
+    settings = {
+        'bind': f"{HOST}:{PORT}",
+        'workers': WORKERS,
+        'worker_class': 'gthread',
+        'threads': THREADS,
+        'timeout': TIMEOUT,
+        'graceful_timeout': GRACEFUL_TIMEOUT,
+        'keepalive': KEEPALIVE,
+        'max_requests': MAX_REQUESTS,
+        'max_requests_jitter': MAX_REQUESTS // 10,
+        'preload_app': True,
+        'proc_name': 'neobyte',
+        # request_log already writes one line per request
+        'accesslog': None,
+        'post_fork': post_fork,
+        'worker_exit': worker_exit,
+    }
+
+    class NeoByteServer(BaseApplication):
+        def load_config(self):
+            for key, value in settings.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return neobyte.app
+
+    NeoByteServer().run()
+
 
 if __name__ == '__main__':
-    port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=True) 
\ No newline at end of file
+    if PRODUCTION:
+        serve_production()
+    else:
+        serve_development()
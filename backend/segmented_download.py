@@ -0,0 +1,157 @@
+import os
+import time
+import logging
+import threading
+import http_client
+import cancellation
+import metrics
+
+logger = logging.getLogger("segmented_download")
+
+# Parallel connections per download
+SEGMENTS = int(os.environ.get('NEOBYTE_SEGMENTS', 4))
+# Bytes fetched per ranged request
+SEGMENT_SIZE = int(os.environ.get('NEOBYTE_SEGMENT_SIZE', 8 * 1024 * 1024))
+# Read/write granularity within a segment or single stream
+CHUNK_SIZE = int(os.environ.get('NEOBYTE_DOWNLOAD_CHUNK_SIZE', 256 * 1024))
+SEGMENT_RETRIES = int(os.environ.get('NEOBYTE_SEGMENT_RETRIES', 3))
+TIMEOUT = http_client.TIMEOUT
+
+
+class RangeNotSupported(Exception):
+    """The server ignored a Range request part way through a segmented download"""
+
+
+def probe(session, url, headers):
+    """Ask for the first byte to learn the total size and whether ranges work
+
+    Returns (total_size, supports_ranges, response). The response is left open
+    when the server ignored the range, so its body can be used directly.
+    """
+    probe_headers = dict(headers or {}, Range='bytes=0-0')
+    response = session.get(url, headers=probe_headers, stream=True, timeout=TIMEOUT)
+    response.raise_for_status()
+
+    if response.status_code == 206:
+        content_range = response.headers.get('content-range', '')
+        response.close()
+        total = content_range.rsplit('/', 1)[-1]
+        if total.isdigit():
+            return int(total), True, None
+        return None, False, None
+
+    total = response.headers.get('content-length')
+    return (int(total) if total and total.isdigit() else None), False, response
+
+
+def _stream_to_file(response, output_path, chunk_size):
+    written = 0
+    with open(output_path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            if chunk:
+                cancellation.progress()
+                metrics.add_bytes('upstream', len(chunk))
+                f.write(chunk)
+                written += len(chunk)
+    return written
+
+
+def _fetch_segment(session, url, headers, output_path, start, end, chunk_size, retries):
+    """Fetch bytes start..end inclusive into place, resuming after partial failures"""
+    position = start
+    attempt = 0
+    with open(output_path, 'r+b') as f:
+        while position <= end:
+            try:
+                segment_headers = dict(headers or {}, Range=f'bytes={position}-{end}')
+                with session.get(url, headers=segment_headers, stream=True, timeout=TIMEOUT) as response:
+                    response.raise_for_status()
+                    if response.status_code != 206:
+                        raise RangeNotSupported(f"Expected 206 for bytes {position}-{end}, got {response.status_code}")
+                    f.seek(position)
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if not chunk:
+                            continue
+                        cancellation.progress()
+                        metrics.add_bytes('upstream', len(chunk))
+                        # Never write past the segment, even if the server over-delivers
+                        chunk = chunk[:end - position + 1]
+                        f.write(chunk)
+                        position += len(chunk)
+                        if position > end:
+                            break
+                if position <= end:
+                    raise IOError(f"Connection closed at byte {position} of segment ending {end}")
+            except (RangeNotSupported, cancellation.Cancelled):
+                raise
+            except Exception as e:
+                attempt += 1
+                if attempt > retries:
+                    raise
+                logger.warning(f"Retrying segment at byte {position} ({attempt}/{retries}): {str(e)}")
+                time.sleep(min(2 ** attempt * 0.5, 8))
+
+
+def download(url, output_path, headers=None, session=None, segments=SEGMENTS,
+             segment_size=SEGMENT_SIZE, chunk_size=CHUNK_SIZE, retries=SEGMENT_RETRIES):
+    """Download url to output_path over several ranged connections when the server allows it
+
+    Falls back to a single stream when ranges are not supported or the file is
+    too small to benefit. Returns the number of bytes written.
+    """
+    with metrics.stage('upstream_transfer'):
+        return _download(url, output_path, headers, session, segments, segment_size, chunk_size, retries)
+
+
+def _download(url, output_path, headers, session, segments, segment_size, chunk_size, retries):
+    session = session or http_client.session
+    total, supports_ranges, response = probe(session, url, headers)
+
+    if response is not None or not supports_ranges or total is None or total < 2 * segment_size or segments < 2:
+        if response is None:
+            response = session.get(url, headers=headers, stream=True, timeout=TIMEOUT)
+            response.raise_for_status()
+        with response:
+            return _stream_to_file(response, output_path, chunk_size)
+
+    # Preallocate so each worker can write its ranges in place
+    with open(output_path, 'wb') as f:
+        f.truncate(total)
+
+    ranges = [(start, min(start + segment_size, total) - 1) for start in range(0, total, segment_size)]
+    lock = threading.Lock()
+    errors = []
+    token = cancellation.current()
+    labels = metrics.current_labels()
+
+    def worker():
+        cancellation.bind(token)
+        metrics.bind(labels)
+        while True:
+            with lock:
+                if not ranges or errors:
+                    return
+                start, end = ranges.pop(0)
+            try:
+                _fetch_segment(session, url, headers, output_path, start, end, chunk_size, retries)
+            except Exception as e:
+                with lock:
+                    errors.append(e)
+                return
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(min(segments, len(ranges)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        if isinstance(errors[0], RangeNotSupported):
+            logger.warning("Server stopped honouring ranges, retrying as a single stream")
+            with session.get(url, headers=headers, stream=True, timeout=TIMEOUT) as response:
+                response.raise_for_status()
+                return _stream_to_file(response, output_path, chunk_size)
+        raise errors[0]
+
+    logger.info(f"Downloaded {total} bytes in {len(threads)} parallel segments")
+    return total
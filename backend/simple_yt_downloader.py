@@ -1,8 +1,11 @@
 import os
 import sys
+import queue
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
-from threading import Thread
+from threading import Thread, Lock
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import formats
 try:
     from pytube import YouTube, Playlist
 except ImportError:
@@ -15,8 +18,8 @@ class YoutubeDownloader:
     def __init__(self, root):
         self.root = root
         self.root.title("Simple YouTube Downloader")
-        self.root.geometry("800x500")
-        self.root.minsize(800, 500)
+        self.root.geometry("800x700")
+        self.root.minsize(800, 600)
         
         # Set theme colors
         self.bg_color = "#333333"
@@ -25,7 +28,14 @@ class YoutubeDownloader:
         
         self.root.config(bg=self.bg_color)
         
+        # Worker threads hand UI updates to the Tk thread through this queue
+        self.ui_queue = queue.Queue()
+        # Bytes per playlist item, for the aggregate progress bar
+        self.progress_lock = Lock()
+        self.item_bytes = {}
+        
         self.setup_ui()
+        self.process_ui_queue()
     
     def setup_ui(self):
         # URL Frame
@@ -75,6 +85,14 @@ class YoutubeDownloader:
         res_dropdown = ttk.Combobox(res_frame, textvariable=self.resolution, values=res_options, state="readonly", width=10)
         res_dropdown.pack(side="left")
         
+        # Playlist concurrency
+        workers_label = tk.Label(res_frame, text="Parallel Downloads:", bg=self.bg_color, fg=self.fg_color, font=("Arial", 12))
+        workers_label.pack(side="left", padx=(20, 10))
+        
+        self.concurrency = tk.IntVar(value=4)
+        workers_spinbox = tk.Spinbox(res_frame, from_=1, to=16, textvariable=self.concurrency, width=4, state="readonly")
+        workers_spinbox.pack(side="left")
+        
         # Output directory selection
         dir_frame = tk.Frame(options_frame, bg=self.bg_color)
         dir_frame.pack(fill="x", pady=5)
@@ -109,6 +127,16 @@ class YoutubeDownloader:
         self.results_frame = tk.Frame(self.root, bg=self.bg_color)
         self.results_frame.pack(fill="both", expand=True, padx=20, pady=10)
         
+        # One row per video with its own status and progress
+        self.items_tree = ttk.Treeview(self.results_frame, columns=("video", "status", "progress"), show="headings", height=8)
+        self.items_tree.heading("video", text="Video")
+        self.items_tree.heading("status", text="Status")
+        self.items_tree.heading("progress", text="Progress")
+        self.items_tree.column("video", width=440)
+        self.items_tree.column("status", width=140)
+        self.items_tree.column("progress", width=140)
+        self.items_tree.pack(fill="x", pady=(0, 10))
+        
         self.result_text = tk.Text(self.results_frame, bg="#222222", fg=self.fg_color, font=("Arial", 10), bd=0, highlightthickness=1, highlightbackground="#666666")
         self.result_text.pack(fill="both", expand=True)
         self.result_text.insert("1.0", "* Simple YouTube Downloader ready to use\n* Enter a YouTube URL and click DOWNLOAD\n")
@@ -123,21 +151,56 @@ class YoutubeDownloader:
         if directory:
             self.output_dir.set(directory)
     
+    def call_in_ui(self, fn, *args):
+        """Run fn on the Tk thread; widgets must not be touched from workers"""
+        self.ui_queue.put((fn, args))
+    
+    def process_ui_queue(self):
+        while True:
+            try:
+                fn, args = self.ui_queue.get_nowait()
+            except queue.Empty:
+                break
+            fn(*args)
+        self.root.after(100, self.process_ui_queue)
+    
     def log_message(self, message):
+        self.call_in_ui(self._append_log, message)
+    
+    def _append_log(self, message):
         self.result_text.config(state="normal")
         self.result_text.insert("end", f"{message}\n")
         self.result_text.see("end")
         self.result_text.config(state="disabled")
-        
-    def progress_callback(self, stream, chunk, bytes_remaining):
-        total_size = stream.filesize
-        bytes_downloaded = total_size - bytes_remaining
-        percentage = (bytes_downloaded / total_size) * 100
-        self.progress_var.set(percentage)
-        
-        # Update status text
-        progress_text = f"Downloading: {percentage:.1f}% of {self.format_size(total_size)}"
-        self.status_var.set(progress_text)
+    
+    def set_item(self, item, video=None, status=None, progress=None):
+        """Update one video's row"""
+        def update():
+            if video is not None:
+                self.items_tree.set(item, "video", video)
+            if status is not None:
+                self.items_tree.set(item, "status", status)
+            if progress is not None:
+                self.items_tree.set(item, "progress", progress)
+        self.call_in_ui(update)
+        
+    def progress_callback(self, item):
+        """Build a pytube progress callback that feeds one row and the aggregate bar"""
+        def callback(stream, chunk, bytes_remaining):
+            total_size = stream.filesize
+            bytes_downloaded = total_size - bytes_remaining
+            self.set_item(item, progress=f"{(bytes_downloaded / total_size) * 100:.1f}%")
+            
+            with self.progress_lock:
+                self.item_bytes[item] = (bytes_downloaded, total_size)
+                done = sum(downloaded for downloaded, _ in self.item_bytes.values())
+                total = sum(size for _, size in self.item_bytes.values())
+            
+            # Aggregate across all workers; videos not yet started are not counted
+            percentage = (done / total) * 100 if total else 0
+            self.call_in_ui(self.progress_var.set, percentage)
+            self.call_in_ui(self.status_var.set, f"Downloading: {self.format_size(done)} of {self.format_size(total)}")
+        return callback
         
     def format_size(self, size_bytes):
         if size_bytes < 1024:
@@ -149,10 +212,11 @@ class YoutubeDownloader:
         else:
             return f"{size_bytes/(1024*1024*1024):.1f} GB"
         
-    def download_complete(self, stream, file_path):
-        self.status_var.set("Download completed!")
-        self.progress_var.set(100)
-        self.log_message(f"✓ Download completed: {os.path.basename(file_path)}")
+    def download_complete(self, item):
+        def callback(stream, file_path):
+            self.set_item(item, status="Completed", progress="100%")
+            self.log_message(f"✓ Download completed: {os.path.basename(file_path)}")
+        return callback
         
     def start_download(self):
         url = self.url_var.get().strip()
@@ -163,17 +227,21 @@ class YoutubeDownloader:
         download_type = self.download_type.get()
         resolution = self.resolution.get()
         output_dir = self.output_dir.get()
+        concurrency = self.concurrency.get()
         
         # Reset progress
         self.progress_var.set(0)
         self.status_var.set("Starting download...")
+        self.items_tree.delete(*self.items_tree.get_children())
+        with self.progress_lock:
+            self.item_bytes = {}
         
         # Start download in a separate thread
-        download_thread = Thread(target=self.download_video, args=(url, download_type, resolution, output_dir))
+        download_thread = Thread(target=self.download_video, args=(url, download_type, resolution, output_dir, concurrency))
         download_thread.daemon = True
         download_thread.start()
     
-    def download_video(self, url, download_type, resolution, output_dir):
+    def download_video(self, url, download_type, resolution, output_dir, concurrency=1):
         try:
             # Check if it's a playlist
             if "playlist" in url or "&list=" in url and not ("&index=" in url):
@@ -181,25 +249,61 @@ class YoutubeDownloader:
                 try:
                     playlist = Playlist(url)
                     self.log_message(f"Playlist: {playlist.title}")
-                    self.log_message(f"Videos to download: {len(playlist.video_urls)}")
-                    
-                    for video_url in playlist.video_urls:
-                        self.log_message(f"Processing: {video_url}")
-                        self.download_single_video(video_url, download_type, resolution, output_dir)
+                    video_urls = list(playlist.video_urls)
+                    self.log_message(f"Videos to download: {len(video_urls)}")
+                    self.download_playlist(video_urls, download_type, resolution, output_dir, concurrency)
                 except Exception as e:
                     self.log_message(f"Error with playlist: {str(e)}")
             else:
                 # Single video download
-                self.download_single_video(url, download_type, resolution, output_dir)
+                item = self.add_item(url)
+                self.download_single_video(url, download_type, resolution, output_dir, item)
+                self.call_in_ui(self.status_var.set, "Download completed!")
+                self.call_in_ui(self.progress_var.set, 100)
                 
         except Exception as e:
-            self.status_var.set("Error during download")
+            self.call_in_ui(self.status_var.set, "Error during download")
             self.log_message(f"Error: {str(e)}")
-            messagebox.showerror("Download Error", str(e))
+            self.call_in_ui(messagebox.showerror, "Download Error", str(e))
+    
+    def add_item(self, url):
+        """Create a status row for a video; returns its id immediately"""
+        with self.progress_lock:
+            item = f"item{len(self.item_bytes)}"
+            self.item_bytes[item] = (0, 0)
+        self.call_in_ui(lambda: self.items_tree.insert("", "end", iid=item, values=(url, "Queued", "0%")))
+        return item
+    
+    def download_playlist(self, video_urls, download_type, resolution, output_dir, concurrency):
+        """Download playlist items on a bounded pool; a failed item does not stop the rest"""
+        items = {self.add_item(video_url): video_url for video_url in video_urls}
+        completed = 0
+        failed = 0
+        
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+            futures = {
+                executor.submit(self.download_single_video, video_url, download_type, resolution, output_dir, item): item
+                for item, video_url in items.items()
+            }
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    completed += 1
+                except Exception:
+                    # Already logged and marked on the item's row
+                    failed += 1
+        
+        summary = f"Playlist finished: {completed} downloaded, {failed} failed"
+        self.log_message(summary)
+        self.call_in_ui(self.status_var.set, summary)
+        if not failed:
+            self.call_in_ui(self.progress_var.set, 100)
     
-    def download_single_video(self, url, download_type, resolution, output_dir):
+    def download_single_video(self, url, download_type, resolution, output_dir, item):
         try:
-            yt = YouTube(url, on_progress_callback=self.progress_callback, on_complete_callback=self.download_complete)
+            self.set_item(item, status="Starting")
+            yt = YouTube(url, on_progress_callback=self.progress_callback(item), on_complete_callback=self.download_complete(item))
+            self.set_item(item, video=yt.title, status="Downloading")
             self.log_message(f"Title: {yt.title}")
             self.log_message(f"Author: {yt.author}")
             self.log_message(f"Length: {yt.length} seconds")
@@ -218,21 +322,19 @@ class YoutubeDownloader:
             else:
                 # Download video
                 self.log_message("Downloading video...")
-                if resolution == "highest":
-                    stream = yt.streams.filter(progressive=True).get_highest_resolution()
-                elif resolution == "lowest":
-                    stream = yt.streams.filter(progressive=True).get_lowest_resolution()
-                else:
-                    # Try to get the requested resolution, fall back to highest available
-                    stream = yt.streams.filter(progressive=True, resolution=resolution).first()
-                    if not stream:
-                        self.log_message(f"Resolution {resolution} not available, using highest available...")
-                        stream = yt.streams.filter(progressive=True).get_highest_resolution()
+                # Same selection as the web app: the best progressive stream the requested resolution allows
+                chosen = formats.choose(formats.pytube_candidates(yt.streams), resolution)
+                if not chosen:
+                    raise Exception("No downloadable video stream found")
+                stream = chosen.source
+                if formats.target_height(resolution) not in (None, 0, chosen.height):
+                    self.log_message(f"Resolution {resolution} not available, using {stream.resolution}...")
                 
                 self.log_message(f"Selected stream: {stream.resolution}, {stream.mime_type}")
                 stream.download(output_path=output_dir)
                 
         except Exception as e:
+            self.set_item(item, status="Failed")
             self.log_message(f"Error downloading {url}: {str(e)}")
             raise
 
@@ -0,0 +1,101 @@
+import os
+import logging
+import threading
+
+logger = logging.getLogger('neobyte')
+
+# How long a follower waits for the leader before doing the work itself
+FOLLOWER_TIMEOUT = float(os.environ.get('NEOBYTE_SINGLEFLIGHT_TIMEOUT', 600))
+
+
+class Flight:
+    """One in-flight download that concurrent identical requests can share"""
+
+    def __init__(self):
+        self.result = None
+        self.error = None
+        self.followers = 0
+        self._done = threading.Event()
+
+    @property
+    def resolved(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=FOLLOWER_TIMEOUT):
+        return self._done.wait(timeout)
+
+
+class SingleFlight:
+    """Coalesces concurrent requests with the same key onto a single leader"""
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+        self.saved = 0
+        self.failures_shared = 0
+        self.fallbacks = 0
+
+    def begin(self, key):
+        """Return (flight, is_leader); a None key is never coalesced"""
+        if key is None:
+            return None, True
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                self.followers += 1
+                return flight, False
+            flight = Flight()
+            self._flights[key] = flight
+            self.leaders += 1
+            return flight, True
+
+    def resolve(self, key, flight, result, keep=False):
+        """Publish the leader's result; keep=True leaves the flight joinable until forget()"""
+        if flight is None:
+            return
+        flight.result = result
+        flight._done.set()
+        if not keep:
+            self.forget(key, flight)
+
+    def fail(self, key, flight, error):
+        """Publish the leader's failure to every follower"""
+        if flight is None:
+            return
+        flight.error = error
+        flight._done.set()
+        self.forget(key, flight)
+        if flight.followers:
+            logger.info(f"Leader failure shared with {flight.followers} waiting requests")
+
+    def forget(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def record(self, outcome):
+        """Count how a follower was served: 'saved', 'failed' or 'fallback'"""
+        with self._lock:
+            if outcome == 'saved':
+                self.saved += 1
+            elif outcome == 'failed':
+                self.failures_shared += 1
+            else:
+                self.fallbacks += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._flights),
+                "leaders": self.leaders,
+                "followers": self.followers,
+                "saved": self.saved,
+                "failures_shared": self.failures_shared,
+                "fallbacks": self.fallbacks,
+            }
+
+
+group = SingleFlight()
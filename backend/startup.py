@@ -0,0 +1,63 @@
+import os
+import time
+import logging
+import importlib
+import threading
+
+logger = logging.getLogger('neobyte')
+
+# Heavy backends imported once before serving instead of by the first request that needs them;
+# set to an empty string to keep everything lazy (e.g. for scripts and quick restarts)
+PRELOAD = [name.strip() for name in os.environ.get('NEOBYTE_PRELOAD', 'yt_dlp,pytube,selenium.webdriver').split(',') if name.strip()]
+
+# app.py imports this module first, so phases are measured from the start of the app import
+_started = time.monotonic()
+_phases = {}
+_preloaded = {}
+_first_requests = {}
+_lock = threading.Lock()
+
+
+def mark(phase):
+    """Record how long after startup a phase finished; later marks of the same phase are ignored"""
+    with _lock:
+        return _phases.setdefault(phase, round(time.monotonic() - _started, 3))
+
+
+def preload(modules=None):
+    """Import optional backends now; ones that are not installed are skipped"""
+    for name in PRELOAD if modules is None else modules:
+        start = time.monotonic()
+        try:
+            module = importlib.import_module(name)
+            if name == 'yt_dlp':
+                # The extractor registry is built on first YoutubeDL(), not on import
+                module.YoutubeDL({'quiet': True}).close()
+        except ImportError as e:
+            logger.warning(f"Could not preload {name}: {str(e)}")
+            continue
+        with _lock:
+            _preloaded[name] = round(time.monotonic() - start, 3)
+    mark('preload')
+
+
+def first_request(route, seconds):
+    """Keep the latency of the first request to each route, which pays for anything still lazy"""
+    with _lock:
+        _first_requests.setdefault(route, round(seconds, 3))
+
+
+def ready():
+    """Mark the process ready to serve and log the startup report"""
+    mark('ready')
+    report = stats()
+    preloaded = ', '.join(f"{name} {seconds:.2f}s" for name, seconds in report['preloaded'].items()) or 'nothing'
+    logger.info(f"Ready in {report['ready_seconds']:.2f}s (imports {report.get('imports_seconds', 0):.2f}s, preloaded {preloaded})")
+
+
+def stats():
+    with _lock:
+        result = {f"{phase}_seconds": seconds for phase, seconds in _phases.items()}
+        result['preloaded'] = dict(_preloaded)
+        result['first_requests'] = dict(_first_requests)
+        return result
@@ -0,0 +1,223 @@
+import os
+import time
+import logging
+import threading
+import cancellation
+import metrics
+
+logger = logging.getLogger('neobyte')
+
+CHUNK_SIZE = int(os.environ.get('NEOBYTE_STREAM_CHUNK_SIZE', 256 * 1024))
+# How far the backend may run ahead of a slow client before it is paused
+MAX_AHEAD = int(os.environ.get('NEOBYTE_STREAM_MAX_AHEAD', 64 * 1024 * 1024))
+# How long to wait for the first bytes before committing to the streaming response
+START_TIMEOUT = float(os.environ.get('NEOBYTE_STREAM_START_TIMEOUT', 60))
+POLL_INTERVAL = 0.25
+
+
+class StreamCancelled(Exception):
+    """Raised inside the backend's progress callback once the client has gone away"""
+
+
+class LiveDownload:
+    """Relay a file to the client while a backend is still writing it
+
+    The backend reports progress through update() (or the pytube/yt-dlp
+    adapters below). When it gets more than max_ahead bytes ahead of the
+    client, update() blocks, which pauses the download until the client
+    catches up. If the client disconnects the download is cancelled, unless
+    cancel_on_close is False, in which case it runs to completion so the file
+    can be kept for a resumed request.
+    """
+
+    def __init__(self, path, total_bytes=None, chunk_size=CHUNK_SIZE, max_ahead=MAX_AHEAD):
+        self.path = path
+        self.total_bytes = total_bytes
+        self.chunk_size = chunk_size
+        self.max_ahead = max_ahead
+        self.written = 0
+        self.sent = 0
+        self.error = None
+        self.done = False
+        self.closed = False
+        self.cancel_on_close = True
+        self.started = threading.Event()
+        self._cond = threading.Condition()
+        self._on_complete = []
+
+    # Producer side
+
+    def update(self, written, total_bytes=None, path=None):
+        cancellation.progress()
+        with self._cond:
+            if path:
+                self.path = path
+            if total_bytes:
+                self.total_bytes = total_bytes
+            self.written = written
+            self.started.set()
+            self._cond.notify_all()
+            while not self.closed and self.written - self.sent > self.max_ahead:
+                self._cond.wait(POLL_INTERVAL)
+            if self.closed and self.cancel_on_close:
+                raise StreamCancelled("Client disconnected")
+
+    def pytube_callback(self, stream, chunk, bytes_remaining):
+        metrics.add_bytes('upstream', len(chunk))
+        self.update(stream.filesize - bytes_remaining, stream.filesize)
+
+    def ytdlp_hook(self, status):
+        if status.get('status') == 'downloading':
+            self.update(
+                status.get('downloaded_bytes') or 0,
+                status.get('total_bytes') or status.get('total_bytes_estimate'),
+                status.get('tmpfilename') or status.get('filename')
+            )
+
+    def write_from(self, chunks):
+        """Write an iterable of upstream chunks to path, for backends that only hand over a response body"""
+        written = 0
+        try:
+            with open(self.path, 'wb') as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    # Readers open the same file, so each chunk must reach it before it is announced
+                    f.flush()
+                    written += len(chunk)
+                    self.update(written)
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def _finish(self, error=None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self.started.set()
+            self._cond.notify_all()
+        self._maybe_complete()
+
+    def start(self, fn, timeout=START_TIMEOUT):
+        """Run fn() in the background and wait until it writes its first bytes
+
+        Raises the backend's error if it fails before producing anything, so the
+        caller can still fall back to another backend.
+        """
+        token = cancellation.current()
+        labels = metrics.current_labels()
+
+        def run():
+            # Carry the caller's hedging token so the background download can be abandoned too
+            cancellation.bind(token)
+            metrics.bind(labels)
+            try:
+                fn()
+                self._finish()
+            except Exception as e:
+                if not isinstance(e, (StreamCancelled, cancellation.Cancelled)):
+                    logger.error(f"Streaming download failed: {str(e)}")
+                self._finish(e)
+
+        threading.Thread(target=run, name='neobyte-stream', daemon=True).start()
+        self.started.wait(timeout)
+        if self.done and self.error is not None and self.written == 0:
+            raise self.error
+        return self
+
+    # Consumer side
+
+    def __iter__(self):
+        try:
+            yield from self._read(track=True)
+        finally:
+            self.close()
+
+    def follow(self):
+        """Read the same file for another client without pacing the backend"""
+        return self._read(track=False)
+
+    def _read(self, track):
+        f = None
+        while f is None:
+            with self._cond:
+                if self.path and os.path.exists(self.path):
+                    f = open(self.path, 'rb')
+                elif self.done:
+                    if self.error is not None:
+                        raise self.error
+                    return
+                else:
+                    self._cond.wait(POLL_INTERVAL)
+        with f:
+            while True:
+                data = f.read(self.chunk_size)
+                if data:
+                    if track:
+                        with self._cond:
+                            self.sent += len(data)
+                            self._cond.notify_all()
+                    yield data
+                    continue
+                with self._cond:
+                    if self.done:
+                        finished = True
+                    else:
+                        finished = False
+                        self._cond.wait(POLL_INTERVAL)
+                if finished:
+                    # Drain anything written between the last read and completion
+                    data = f.read()
+                    if data:
+                        yield data
+                    if self.error is not None:
+                        # Headers are already sent, so abort the body to signal failure
+                        raise self.error
+                    return
+
+    @property
+    def succeeded(self):
+        return self.done and self.error is None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        self._maybe_complete()
+
+    # Cleanup once both sides are finished
+
+    def on_complete(self, fn):
+        """Call fn once the backend has stopped and the client response is closed"""
+        self._on_complete.append(fn)
+        self._maybe_complete()
+
+    def _maybe_complete(self):
+        with self._cond:
+            if not (self.done and self.closed):
+                return
+            callbacks, self._on_complete = self._on_complete, []
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception as e:
+                logger.error(f"Error in stream completion callback: {str(e)}")
+
+    def wait(self, timeout=None):
+        """Block until the backend has finished writing"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while not self.done:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+
+def can_stream_ytdlp(info, ydl_opts):
+    """True when yt-dlp selected one progressive file that needs no merge or postprocessing"""
+    if not info or ydl_opts.get('postprocessors'):
+        return False
+    if info.get('requested_formats'):
+        return False
+    return info.get('protocol') in ('http', 'https')
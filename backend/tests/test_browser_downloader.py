@@ -0,0 +1,63 @@
+import json
+import browser_downloader
+
+
+def response_entry(url, mime_type):
+    message = {"method": "Network.responseReceived", "params": {"response": {"url": url, "mimeType": mime_type}}}
+    return {"message": json.dumps({"message": message})}
+
+
+def test_dash_tracks_are_kept_apart_from_complete_files():
+    found = browser_downloader._instagram_media_responses([
+        response_entry("https://cdn.example/v.mp4?bytestart=0&byteend=999&efg=1", "video/mp4"),
+        response_entry("https://cdn.example/a.mp4?bytestart=0&byteend=99", "audio/mp4"),
+    ], {})
+    assert found == {"video": "https://cdn.example/v.mp4?efg=1", "audio": "https://cdn.example/a.mp4"}
+    assert "progressive" not in found
+
+
+def test_plain_video_response_is_a_complete_file():
+    found = browser_downloader._instagram_media_responses([response_entry("https://cdn.example/full.mp4", "video/mp4")], {})
+    assert found == {"progressive": "https://cdn.example/full.mp4"}
+
+
+SCRAPED = [
+    {"quality": "720p", "format": "WEBM", "size": "40 MB", "key": "720p_WEBM"},
+    {"quality": "160kbps", "format": "WEBM", "size": "4 MB", "key": "160kbps_WEBM"},
+    {"quality": "128kbps", "format": "M4A", "size": "3 MB", "key": "128kbps_M4A"},
+]
+
+
+def test_native_audio_skips_video_entries_and_prefers_m4a():
+    assert browser_downloader.select_format(SCRAPED, "highest", True, native_audio=True)["key"] == "128kbps_M4A"
+
+
+def test_native_audio_falls_back_to_conversion_when_only_video_is_native():
+    scraped = [SCRAPED[0], {"quality": "128kbps", "format": "MP3", "size": "3 MB", "key": "128kbps_MP3"}]
+    assert browser_downloader.select_format(scraped, "highest", True, native_audio=True)["key"] == "128kbps_MP3"
+
+
+def test_refused_cached_link_is_extracted_again_once(monkeypatch, tmp_path):
+    import requests
+    import extraction_cache
+
+    url = "https://www.instagram.com/reel/ABC123/"
+    key = (browser_downloader.media_ids.canonical_media_id(url), "http")
+    extraction_cache.cache.put(key, {"media_url": "https://cdn.example/old.mp4", "title": "t", "headers": {}})
+    fetched = []
+
+    def extract(page_url):
+        info = extraction_cache.cache.get(key)
+        return info or {"media_url": "https://cdn.example/new.mp4", "title": "t", "headers": {}}
+
+    def download(media_url, output_path, headers=None):
+        fetched.append(media_url)
+        if media_url.endswith("old.mp4"):
+            response = requests.Response()
+            response.status_code = 403
+            raise requests.HTTPError("403 Forbidden", response=response)
+
+    monkeypatch.setattr(browser_downloader.segmented_download, "download", download)
+    path, title, error = browser_downloader.download_instagram_content(url, str(tmp_path), "out.mp4", extract=extract)
+    assert error is None and path == str(tmp_path / "out.mp4")
+    assert fetched == ["https://cdn.example/old.mp4", "https://cdn.example/new.mp4"]
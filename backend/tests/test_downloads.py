@@ -0,0 +1,78 @@
+import downloads
+
+
+class StubYoutubeDL:
+    """Records which download call was used; process_info rejects playlists like yt-dlp does"""
+
+    def __init__(self):
+        self.calls = []
+
+    def process_info(self, info):
+        assert info.get('_type', 'video') == 'video'
+        self.calls.append(('process_info', info['id']))
+
+    def process_ie_result(self, info, download=True):
+        self.calls.append(('process_ie_result', info['id'], download))
+        return dict(info, processed=True)
+
+
+PLAYLIST = {
+    '_type': 'playlist',
+    'id': 'post',
+    'entries': [
+        {'_type': 'video', 'id': 'post-1', 'url': 'https://video.example/1.mp4'},
+        {'_type': 'video', 'id': 'post-2', 'url': 'https://video.example/2.mp4'},
+    ],
+}
+
+
+def test_playlist_results_are_downloaded_through_process_ie_result():
+    ydl = StubYoutubeDL()
+    info = downloads._download_resolved(ydl, PLAYLIST)
+    assert ydl.calls == [('process_ie_result', 'post', True)]
+    assert info['processed']
+
+
+def test_single_videos_are_downloaded_through_process_info():
+    ydl = StubYoutubeDL()
+    video = {'id': 'clip', 'url': 'https://video.example/clip.mp4'}
+    assert downloads._download_resolved(ydl, video) is video
+    assert ydl.calls == [('process_info', 'clip')]
+
+
+class StubResponse:
+    def __init__(self, status_code, body=b''):
+        self.status_code = status_code
+        self.body = body
+        self.closed = False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise OSError(f"{self.status_code} error")
+
+    def iter_content(self, chunk_size):
+        yield self.body
+
+    def close(self):
+        self.closed = True
+
+
+def test_mp3_source_with_an_error_status_is_closed_and_never_encoded(monkeypatch, tmp_path):
+    response = StubResponse(403, b'<html>Forbidden</html>')
+    monkeypatch.setattr(downloads.http_client.session, 'get', lambda *args, **kwargs: response)
+    encoded = []
+    monkeypatch.setattr(downloads.transcode.pool, 'run', lambda source, *args, **kwargs: encoded.append(source))
+
+    artifact = downloads._pipe_to_mp3(
+        lambda: downloads._open_http_chunks('https://media.example/audio'),
+        str(tmp_path / 'out.mp3'), 'song.mp3'
+    )
+    assert artifact is None and not encoded
+    assert response.closed
+
+
+def test_mp3_source_closes_its_response_once_drained(monkeypatch):
+    response = StubResponse(200, b'audio')
+    monkeypatch.setattr(downloads.http_client.session, 'get', lambda *args, **kwargs: response)
+    assert list(downloads._open_http_chunks('https://media.example/audio')) == [b'audio']
+    assert response.closed
@@ -0,0 +1,54 @@
+import formats
+
+
+def ytdlp_format(format_id, height, ext='mp4', acodec='mp4a', **fields):
+    return dict(format_id=format_id, height=height, ext=ext, vcodec='avc1', acodec=acodec, protocol='https', **fields)
+
+
+AUDIO = {'format_id': '140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a', 'abr': 128, 'tbr': 128, 'filesize': 480_000}
+
+
+def test_progressive_format_without_size_is_estimated_from_its_bitrate():
+    # A 30 s clip: the progressive 720p format only reports its bitrate
+    candidates = formats.ytdlp_candidates([
+        ytdlp_format('22', 720, tbr=1500),
+        ytdlp_format('136', 720, acodec='none', filesize=6_000_000),
+        AUDIO,
+    ])
+    progressive = next(c for c in candidates if c.audio is None)
+    assert progressive.size == 1500 * 125 * 30
+
+
+def test_progressive_wins_at_the_target_height_even_when_a_merge_looks_cheaper():
+    candidates = formats.ytdlp_candidates([
+        ytdlp_format('22', 720, filesize=90_000_000),
+        ytdlp_format('136', 720, acodec='none', filesize=6_000_000),
+        AUDIO,
+    ])
+    assert formats.choose(candidates, '720p').source['format_id'] == '22'
+
+
+def test_merge_is_used_when_no_progressive_format_reaches_the_height():
+    candidates = formats.ytdlp_candidates([
+        ytdlp_format('18', 360, filesize=10_000_000),
+        ytdlp_format('137', 1080, acodec='none', filesize=60_000_000),
+        AUDIO,
+    ])
+    chosen = formats.choose(candidates, '1080p')
+    assert chosen.source['format_id'] == '137' and chosen.audio['format_id'] == '140'
+
+
+def test_resolution_labels_are_normalised():
+    assert formats.resolution_label('1080') == '1080p'
+    assert formats.resolution_label(None) == 'highest'
+    assert formats.resolution_label('lowest') == 'lowest'
+
+
+def test_taller_webm_does_not_beat_a_format_that_stays_mp4():
+    candidates = formats.ytdlp_candidates([
+        dict(ytdlp_format('271', 1440, ext='webm', acodec='none', filesize=80_000_000), vcodec='vp9'),
+        ytdlp_format('137', 1080, acodec='none', filesize=60_000_000),
+        AUDIO,
+    ])
+    chosen = formats.choose(candidates, 'highest')
+    assert chosen.source['format_id'] == '137' and chosen.audio['format_id'] == '140'
@@ -0,0 +1,56 @@
+import time
+import router
+
+
+def test_cancelled_half_open_trial_can_be_probed_again(monkeypatch):
+    monkeypatch.setattr(router, 'COOLDOWN', 0.05)
+    r = router.Router()
+    for _ in range(router.FAILURE_THRESHOLD):
+        r.record('youtube', 'pytube', False, 1)
+    assert r.order('youtube', ['browser', 'pytube']) == ['browser']
+    time.sleep(0.1)
+
+    def backend(result, seconds):
+        def fn():
+            time.sleep(seconds)
+            return result
+        return fn
+
+    # browser is slow enough to be hedged with pytube's half-open trial, which then loses and is cancelled
+    result = r.run('youtube', [('browser', backend('ok', 0.15)), ('pytube', backend('late', 0.5))], hedge_delay=0.05)
+    assert result == 'ok'
+    assert 'pytube' in r.order('youtube', ['browser', 'pytube'])
+
+
+def test_content_error_from_a_hedge_waits_for_the_running_primary():
+    r = router.Router()
+
+    def primary():
+        time.sleep(0.5)
+        return 'ok'
+
+    def hedge():
+        raise ValueError('login required')
+
+    result = r.run('instagram', [('browser', primary), ('ytdlp', hedge)],
+                   is_final=lambda e: isinstance(e, ValueError), hedge_delay=0.1)
+    assert result == 'ok'
+
+
+def test_content_error_is_raised_when_nothing_else_succeeds():
+    r = router.Router()
+
+    def primary():
+        time.sleep(0.3)
+        return None
+
+    def hedge():
+        raise ValueError('not found')
+
+    try:
+        r.run('instagram', [('browser', primary), ('ytdlp', hedge), ('http', lambda: 'unreached')],
+              is_final=lambda e: isinstance(e, ValueError), hedge_delay=0.1)
+    except ValueError as e:
+        assert str(e) == 'not found'
+    else:
+        raise AssertionError('content error was not raised')
@@ -0,0 +1,179 @@
+import os
+import time
+import shutil
+import logging
+import threading
+import subprocess
+from collections import deque
+import cancellation
+import metrics
+
+logger = logging.getLogger('neobyte')
+
+# Path to ffmpeg from the YoutubeDownloaderApp folder
+FFMPEG_PATH = os.path.join(os.getcwd(), 'YoutubeDownloaderApp', 'ffmpeg.exe')
+if not os.path.exists(FFMPEG_PATH):
+    FFMPEG_PATH = 'ffmpeg'  # Use system ffmpeg if not found
+
+# Concurrent ffmpeg processes; each encode is CPU bound, so more than the core count only adds contention
+WORKERS = int(os.environ.get('NEOBYTE_TRANSCODE_WORKERS', os.cpu_count() or 2))
+CHUNK_SIZE = 256 * 1024
+MP3_ARGS = ['-vn', '-ab', '192k', '-ar', '44100', '-f', 'mp3']
+
+
+def mux_args(audio_path):
+    """TranscodePool.run args that combine the input's video with audio_path's audio as an mp4, without re-encoding"""
+    # Fragmented, since the output goes to a pipe and ffmpeg cannot seek back to write the index
+    return ['-i', audio_path, '-map', '0:v:0', '-map', '1:a:0', '-c', 'copy',
+            '-movflags', 'frag_keyframe+empty_moov', '-f', 'mp4']
+
+
+class TranscodeError(Exception):
+    """ffmpeg exited with an error"""
+
+
+class TranscodePool:
+    """Caps how many ffmpeg processes run at once; extra requests wait for a slot"""
+
+    def __init__(self, workers=WORKERS):
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(workers)
+        self._lock = threading.Lock()
+        self.running = 0
+        self.waiting = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _acquire(self):
+        with self._lock:
+            self.waiting += 1
+        self._slots.acquire()
+        with self._lock:
+            self.waiting -= 1
+            self.running += 1
+
+    def _release(self, ok):
+        with self._lock:
+            self.running -= 1
+            if ok:
+                self.completed += 1
+            else:
+                self.failed += 1
+        self._slots.release()
+
+    def run(self, source, output_path, args=MP3_ARGS, live=None):
+        """Encode source into output_path, reporting progress to live as output is written
+
+        source is either a path or an iterable of byte chunks; chunks are fed to
+        ffmpeg's stdin as they arrive, so encoding overlaps with the download
+        instead of starting after it, and closed (if they can be) once fed.
+        Returns the number of bytes written.
+        """
+        from_pipe = not isinstance(source, str)
+        cmd = [FFMPEG_PATH, '-hide_banner', '-loglevel', 'error',
+               '-i', 'pipe:0' if from_pipe else source] + list(args) + ['pipe:1']
+
+        with metrics.stage('ffmpeg_queue'):
+            self._acquire()
+        ok = False
+        proc = None
+        feeding = False
+        start = time.monotonic()
+        try:
+            proc = subprocess.Popen(
+                cmd,
+                stdin=subprocess.PIPE if from_pipe else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            stderr_tail = deque(maxlen=20)
+            feed_errors = []
+            threads = [threading.Thread(target=_drain, args=(proc.stderr, stderr_tail), daemon=True)]
+            if from_pipe:
+                threads.append(threading.Thread(target=_feed, args=(source, proc.stdin, feed_errors, metrics.current_labels()), daemon=True))
+            for thread in threads:
+                thread.start()
+            feeding = from_pipe
+
+            written = 0
+            with cancellation.guard(proc.kill), open(output_path, 'wb') as out:
+                while True:
+                    data = proc.stdout.read1(CHUNK_SIZE)
+                    if not data:
+                        break
+                    cancellation.progress()
+                    out.write(data)
+                    out.flush()
+                    written += len(data)
+                    if live is not None:
+                        live.update(written)
+
+            returncode = proc.wait()
+            for thread in threads:
+                thread.join()
+            if feed_errors:
+                raise feed_errors[0]
+            if returncode != 0:
+                message = b''.join(stderr_tail).decode('utf-8', 'replace').strip()
+                raise TranscodeError(f"ffmpeg exited with {returncode}: {message}")
+            ok = True
+            return written
+        finally:
+            if proc is not None and proc.poll() is None:
+                # Client went away or the source failed; stop encoding
+                proc.kill()
+                proc.wait()
+            if from_pipe and not feeding:
+                _close(source)
+            self._release(ok)
+            metrics.observe_stage('ffmpeg', time.monotonic() - start, 'ok' if ok else 'error')
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "running": self.running,
+                "waiting": self.waiting,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+
+def _feed(chunks, stdin, errors, labels):
+    metrics.bind(labels)
+    try:
+        for chunk in chunks:
+            if chunk:
+                metrics.add_bytes('upstream', len(chunk))
+                stdin.write(chunk)
+    except BrokenPipeError:
+        # ffmpeg exited early; its exit status carries the reason
+        pass
+    except Exception as e:
+        errors.append(e)
+    finally:
+        # Release the upstream connection even when ffmpeg stopped reading early
+        _close(chunks)
+        try:
+            stdin.close()
+        except OSError:
+            pass
+
+
+def _close(chunks):
+    close = getattr(chunks, 'close', None)
+    if close is not None:
+        close()
+
+
+def _drain(stream, tail):
+    for line in stream:
+        tail.append(line)
+
+
+def available():
+    """True when an ffmpeg binary can be found"""
+    return os.path.exists(FFMPEG_PATH) or shutil.which(FFMPEG_PATH) is not None
+
+
+pool = TranscodePool()
@@ -0,0 +1,210 @@
+import os
+import time
+import uuid
+import shutil
+import logging
+import threading
+import metrics
+
+logger = logging.getLogger('neobyte')
+
+WORKSPACE_ROOT = os.environ.get('NEOBYTE_WORKSPACE_DIR', os.path.join(os.getcwd(), 'temp'))
+# Idle workspaces older than this are removed by the janitor
+MAX_AGE = float(os.environ.get('NEOBYTE_WORKSPACE_MAX_AGE', 2 * 3600))
+# Workspaces still marked in use are only removed past this age, in case a release was missed
+HARD_MAX_AGE = float(os.environ.get('NEOBYTE_WORKSPACE_HARD_MAX_AGE', 24 * 3600))
+# Total bytes allowed under WORKSPACE_ROOT before the oldest idle workspaces are evicted
+QUOTA_BYTES = int(os.environ.get('NEOBYTE_WORKSPACE_QUOTA_BYTES', 10 * 1024 ** 3))
+SWEEP_INTERVAL = float(os.environ.get('NEOBYTE_JANITOR_INTERVAL', 60))
+
+_active = set()
+_lock = threading.Lock()
+_janitor = None
+_slot_file = None
+_hooks = []
+_stats = {"sweeps": 0, "removed": 0, "removed_bytes": 0, "last_total_bytes": 0}
+
+
+def create(workspace_id=None):
+    """Create a private scratch directory for one download and mark it in use"""
+    start_janitor()
+    path = os.path.join(WORKSPACE_ROOT, workspace_id or str(uuid.uuid4()))
+    os.makedirs(path, exist_ok=True)
+    with _lock:
+        _active.add(path)
+    return path
+
+
+def release(path):
+    """Delete a workspace and everything in it"""
+    with _lock:
+        _active.discard(path)
+    with metrics.stage('cleanup'):
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def _remove(path, reason):
+    size = _size(path)
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    with _lock:
+        _active.discard(path)
+        _stats["removed"] += 1
+        _stats["removed_bytes"] += size
+    logger.info(f"Janitor removed {path} ({size} bytes, {reason})")
+    return size
+
+
+def register_hook(fn):
+    """Run fn at the start of every sweep, e.g. to release expired job workspaces"""
+    _hooks.append(fn)
+
+
+def sweep():
+    """Enforce the age limits and the byte quota once"""
+    for hook in _hooks:
+        try:
+            hook()
+        except Exception as e:
+            logger.error(f"Janitor hook failed: {str(e)}")
+    if not os.path.isdir(WORKSPACE_ROOT):
+        return
+    now = time.time()
+    entries = []
+    for name in os.listdir(WORKSPACE_ROOT):
+        path = os.path.join(WORKSPACE_ROOT, name)
+        try:
+            age = now - os.path.getmtime(path)
+        except OSError:
+            continue
+        with _lock:
+            in_use = path in _active
+        if age > HARD_MAX_AGE or (not in_use and age > MAX_AGE):
+            _remove(path, "expired")
+            continue
+        entries.append((age, path, in_use, _size(path)))
+
+    total = sum(entry[3] for entry in entries)
+    if total > QUOTA_BYTES:
+        # Evict the oldest idle workspaces first
+        for age, path, in_use, size in sorted(entries, reverse=True):
+            if total <= QUOTA_BYTES:
+                break
+            if in_use:
+                continue
+            total -= _remove(path, "over quota")
+        if total > QUOTA_BYTES:
+            logger.warning(f"Workspace usage {total} bytes exceeds quota of {QUOTA_BYTES} bytes")
+
+    with _lock:
+        _stats["sweeps"] += 1
+        _stats["last_total_bytes"] = total
+
+
+def _run_janitor():
+    while True:
+        time.sleep(SWEEP_INTERVAL)
+        try:
+            sweep()
+        except Exception as e:
+            logger.error(f"Janitor sweep failed: {str(e)}")
+
+
+def use_root(path, quota_bytes=None):
+    """Move new workspaces (and the janitor's sweeps) to path, e.g. a per-worker directory"""
+    global WORKSPACE_ROOT, QUOTA_BYTES
+    WORKSPACE_ROOT = path
+    if quota_bytes is not None:
+        QUOTA_BYTES = quota_bytes
+
+
+def _lock_slot(root, slot):
+    """Open and exclusively lock worker-<slot>.lock under root; None when another process holds it"""
+    import fcntl
+
+    f = open(os.path.join(root, f'worker-{slot}.lock'), 'a')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return None
+    return f
+
+
+def claim_slot(root):
+    """Lock the lowest free worker slot under root for the rest of this process's life
+
+    A worker draining after a reload and its replacement, or workers added
+    with TTIN, never hold the same slot, so each process owns its
+    worker-<slot> directories outright. The lock goes away with the process.
+    """
+    global _slot_file
+    os.makedirs(root, exist_ok=True)
+    slot = 0
+    while True:
+        f = _lock_slot(root, slot)
+        if f is not None:
+            _slot_file = f
+            return slot
+        slot += 1
+
+
+def unclaimed_slots(root, first):
+    """Slots from first upwards that no live process holds, locked while the caller clears them"""
+    for name in os.listdir(root):
+        if not (name.startswith('worker-') and name.endswith('.lock')):
+            continue
+        try:
+            slot = int(name[len('worker-'):-len('.lock')])
+        except ValueError:
+            continue
+        if slot < first:
+            continue
+        f = _lock_slot(root, slot)
+        if f is None:
+            continue
+        try:
+            yield slot
+        finally:
+            f.close()
+
+
+def start_janitor():
+    """Start the background sweeper once per process
+
+    Called on every create(), so a forked worker starts its own sweeper with
+    its first download rather than relying on the parent's thread.
+    """
+    global _janitor
+    with _lock:
+        if _janitor is not None and _janitor.is_alive():
+            return
+        _janitor = threading.Thread(target=_run_janitor, name='neobyte-janitor', daemon=True)
+        _janitor.start()
+
+
+def stats():
+    with _lock:
+        data = dict(_stats)
+        data["active"] = len(_active)
+    data["quota_bytes"] = QUOTA_BYTES
+    data["max_age"] = MAX_AGE
+    return data
@@ -0,0 +1,203 @@
+import os
+import logging
+import threading
+from contextlib import contextmanager
+import cancellation
+import formats
+import metrics
+import request_log
+import transcode
+
+logger = logging.getLogger('neobyte')
+
+# Idle YoutubeDL instances kept per profile, and how many jobs one serves before it is rebuilt
+POOL_SIZE = int(os.environ.get('NEOBYTE_YTDLP_POOL_SIZE', 4))
+MAX_USES = int(os.environ.get('NEOBYTE_YTDLP_MAX_USES', 100))
+
+DESKTOP_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+BASE_OPTIONS = {
+    'quiet': True,
+    'no_warnings': True,
+    'logger': request_log.ytdlp_logger,
+    'ffmpeg_location': transcode.FFMPEG_PATH,
+}
+
+PROFILES = {
+    'youtube': {
+        # Try to bypass bot detection
+        'extractor_args': {
+            'youtube': {
+                'player_client': ['android', 'web'],
+                'player_skip': ['js', 'configs', 'webpage']
+            }
+        },
+        # Use a mobile user agent
+        'http_headers': {
+            'User-Agent': 'Mozilla/5.0 (Android 12; Mobile; rv:68.0) Gecko/68.0 Firefox/96.0',
+            'Accept-Language': 'en-US,en;q=0.5'
+        }
+    },
+    'instagram': {
+        'format': formats.YtdlpSelector('1080p'),  # Limit to 1080p to avoid issues
+        'extract_flat': False,
+        'ignoreerrors': True,
+        'no_check_certificate': True,
+        'user_agent': DESKTOP_USER_AGENT,
+        'referer': 'https://www.instagram.com/',
+        'http_headers': {
+            'User-Agent': DESKTOP_USER_AGENT,
+            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+            'Accept-Language': 'en-us,en;q=0.5',
+            'Accept-Encoding': 'gzip,deflate',
+            'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.7',
+            'Keep-Alive': '300',
+            'Connection': 'keep-alive',
+        }
+    },
+    'twitter': {
+        'format': formats.YtdlpSelector('highest'),  # Get the best quality for Twitter
+        'no_warnings': not request_log.YTDLP_VERBOSE,
+        'extract_flat': False,
+        'ignoreerrors': True,  # Skip any errors
+        # Full yt-dlp debug output only when running at DEBUG
+        'verbose': request_log.YTDLP_VERBOSE,
+    },
+}
+
+# Options that are baked into an instance when it is built (postprocessor
+# objects, the cookie jar); jobs that set them get a private, unpooled instance
+# so one user's cookies never reach another request
+CONSTRUCTION_OPTIONS = ('postprocessors', 'cookiefile', 'cookiesfrombrowser')
+
+
+def options(profile, **job):
+    """Full option dict for a profile plus job-specific settings (outtmpl, format, ...)"""
+    return {**BASE_OPTIONS, **PROFILES[profile], **job}
+
+
+class _Entry:
+    """A YoutubeDL instance with the option snapshot it is reset to before each job"""
+
+    def __init__(self, profile, job):
+        import yt_dlp
+
+        self.profile = profile
+        self.hooks = []
+        self.uses = 0
+        opts = options(profile, **job)
+        opts['progress_hooks'] = [self._progress]
+        self.ydl = yt_dlp.YoutubeDL(opts)
+        self.defaults = dict(self.ydl.params)
+
+    def _progress(self, status):
+        if status.get('status') == 'finished':
+            metrics.add_bytes('upstream', status.get('total_bytes') or status.get('downloaded_bytes'))
+        # Lets a hedged attempt that lost the race be abandoned mid-download
+        cancellation.progress()
+        for hook in self.hooks:
+            hook(status)
+
+    def configure(self, job):
+        """Reset params to the profile and apply one job's outtmpl, format and other settings"""
+        ydl = self.ydl
+        self.hooks = list(job.pop('progress_hooks', []))
+        params = dict(self.defaults, **job)
+        if isinstance(params.get('outtmpl'), str):
+            # Keep the per-type defaults yt-dlp filled in; only the main template is per job
+            params['outtmpl'] = dict(self.defaults['outtmpl'], default=params['outtmpl'])
+        ydl.params.clear()
+        ydl.params.update(params)
+        fmt = params.get('format')
+        if isinstance(fmt, formats.YtdlpSelector):
+            # Pairs that need merging are built through this instance, and only when ffmpeg is there
+            fmt = fmt.bind(ydl, transcode.available())
+        ydl.format_selector = fmt if fmt in (None, '-') or callable(fmt) else ydl.build_format_selector(fmt)
+
+
+class YoutubeDLPool:
+    """Reuses configured YoutubeDL instances per profile
+
+    Extractors are initialised once per instance and keep their HTTP
+    connections, so repeat jobs skip yt-dlp's setup. Each instance serves one
+    job at a time.
+    """
+
+    def __init__(self, size=POOL_SIZE, max_uses=MAX_USES):
+        self.size = max(0, size)
+        self.max_uses = max(1, max_uses)
+        self._idle = {}
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+        self.private = 0
+
+    def acquire(self, profile, **job):
+        if profile not in PROFILES:
+            raise ValueError(f"Unknown yt-dlp profile: {profile}")
+        construction = {name: job[name] for name in CONSTRUCTION_OPTIONS if job.get(name) is not None}
+        if construction:
+            entry = _Entry(profile, construction)
+            # Used once, then closed
+            entry.uses = self.max_uses
+            with self._lock:
+                self.private += 1
+        else:
+            with self._lock:
+                idle = self._idle.get(profile)
+                entry = idle.pop() if idle else None
+                if entry is not None:
+                    self.reused += 1
+            if entry is None:
+                entry = _Entry(profile, {})
+                with self._lock:
+                    self.created += 1
+        entry.configure(job)
+        with self._lock:
+            self._entries[id(entry.ydl)] = entry
+        return entry.ydl
+
+    def release(self, ydl, discard=False):
+        with self._lock:
+            entry = self._entries.pop(id(ydl))
+        entry.uses += 1
+        entry.hooks = []
+        if not discard and entry.uses < self.max_uses:
+            with self._lock:
+                idle = self._idle.setdefault(entry.profile, [])
+                if len(idle) < self.size:
+                    idle.append(entry)
+                    return
+        try:
+            ydl.close()
+        except Exception as e:
+            logger.warning(f"Error closing yt-dlp instance: {str(e)}")
+
+    @contextmanager
+    def session(self, profile, **job):
+        """Check out a YoutubeDL configured for profile and this job for a with-block"""
+        ydl = self.acquire(profile, **job)
+        discard = False
+        try:
+            yield ydl
+        except BaseException:
+            # A failed or cancelled job may leave the instance mid-download; start the next one fresh
+            discard = True
+            raise
+        finally:
+            self.release(ydl, discard=discard)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": sum(len(entries) for entries in self._idle.values()),
+                "in_use": len(self._entries),
+                "created": self.created,
+                "reused": self.reused,
+                "private": self.private,
+            }
+
+
+pool = YoutubeDLPool()